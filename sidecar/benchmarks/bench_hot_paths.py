@@ -0,0 +1,125 @@
+"""Micro-benchmarks for the CPU work done on every upload.
+
+Covers analyzers.deterministic.analyze, the parsers, parsers.validation.
+validate_questions, the chunkers and PDF text extraction, on the synthetic
+Dutch corpus from benchmarks/corpus.py at 100 and 1000 questions, and DOCX
+parsing and extraction on documents of more than 200 pages. Uses
+pytest-benchmark; the file is not collected by the regular test run.
+
+Run from the sidecar directory:
+
+    python -m pytest benchmarks/bench_hot_paths.py --benchmark-autosave
+    python -m pytest benchmarks/bench_hot_paths.py --benchmark-compare
+"""
+
+import io
+
+import docx
+import pytest
+
+from analyzers.deterministic import analyze
+from analyzers.schemas import QuestionInput
+from benchmarks import corpus
+from benchmarks.fake_encoder import WordTokenizer
+from parsers.csv_parser import parse_csv
+from parsers.docx_parser import parse_docx
+from parsers.validation import validate_questions
+from parsers.xlsx_parser import parse_xlsx
+from rag.chunker import chunk_text, chunk_text_by_tokens
+from rag.extractor import extract_docx, extract_pdf
+
+SIZES = [100, 1000]
+# Pages of course material per benchmark; ~350 words each
+PAGES = 40
+# Token budget of multilingual-e5-base minus special and "passage: " tokens
+MAX_TOKENS = 506
+# Long Word documents: ~5 questions per page, one material page per page
+DOCX_QUESTIONS = 1200
+DOCX_PAGES = 220
+
+
+@pytest.fixture(scope="module", params=SIZES, ids=lambda n: f"{n}q")
+def size(request) -> int:
+    return request.param
+
+
+@pytest.fixture(scope="module")
+def question_inputs(size) -> list[QuestionInput]:
+    return [
+        QuestionInput(
+            stem=q.stem,
+            options=[o.text for o in q.options],
+            correct_index=next(o.position for o in q.options if o.is_correct),
+        )
+        for q in corpus.parsed_questions(size)
+    ]
+
+
+@pytest.fixture(scope="module")
+def pages() -> list[str]:
+    return corpus.material_pages(PAGES)
+
+
+class TestDeterministic:
+    def test_analyze(self, benchmark, question_inputs):
+        results = benchmark(lambda: [analyze(q) for q in question_inputs])
+        assert len(results) == len(question_inputs)
+
+
+class TestParsers:
+    def test_parse_csv(self, benchmark, size):
+        content = corpus.questions_csv(size)
+        assert len(benchmark(parse_csv, content)) == size
+
+    def test_parse_xlsx(self, benchmark, size):
+        content = corpus.questions_xlsx(size)
+        assert len(benchmark(parse_xlsx, content)) == size
+
+    def test_parse_docx(self, benchmark, size):
+        content = corpus.questions_docx(size)
+        assert len(benchmark(parse_docx, content)) == size
+
+    def test_validate_questions(self, benchmark, size):
+        questions = corpus.parsed_questions(size)
+        assert benchmark(validate_questions, questions).total_questions == size
+
+
+class TestChunking:
+    def test_chunk_text(self, benchmark, pages):
+        text = "\n\n".join(pages)
+        assert benchmark(chunk_text, text)
+
+    def test_chunk_text_by_tokens(self, benchmark, pages):
+        tokenizer = WordTokenizer()
+        text = "\n\n".join(pages)
+        assert benchmark(chunk_text_by_tokens, text, tokenizer, MAX_TOKENS)
+
+    def test_extract_pdf(self, benchmark, pages):
+        pdf = corpus.material_pdf(pages)
+        assert len(benchmark.pedantic(extract_pdf, (pdf,), rounds=3)) == PAGES
+
+
+def _walk_document(content: bytes) -> int:
+    """Reference: the python-docx object model walk parse_docx did before streaming."""
+    bold_runs = 0
+    for paragraph in docx.Document(io.BytesIO(content)).paragraphs:
+        if paragraph.text.strip():
+            bold_runs += sum(1 for run in paragraph.runs if run.bold and run.text.strip())
+    return bold_runs
+
+
+class TestLongDocx:
+    @pytest.fixture(scope="class")
+    def questions_docx(self) -> bytes:
+        return corpus.questions_docx(DOCX_QUESTIONS, bold=True)
+
+    def test_parse_docx(self, benchmark, questions_docx):
+        questions = benchmark.pedantic(parse_docx, (questions_docx,), rounds=5)
+        assert len(questions) == DOCX_QUESTIONS
+
+    def test_object_model_reference(self, benchmark, questions_docx):
+        benchmark.pedantic(_walk_document, (questions_docx,), rounds=5)
+
+    def test_extract_docx(self, benchmark):
+        material = corpus.material_docx(corpus.material_pages(DOCX_PAGES))
+        assert benchmark.pedantic(extract_docx, (material,), rounds=5)
@@ -0,0 +1,71 @@
+"""Per-call overhead of building LLM request arguments.
+
+Compares rebuilding the tools/tool_choice dicts (including the pydantic JSON
+schema) on every call with the shared request templates in
+llm/request_templates.py. No API calls are made.
+
+Run from the sidecar directory:
+
+    python -m benchmarks.bench_request_templates
+"""
+
+import timeit
+
+from llm.request_templates import (
+    GENERATION_TEMPLATE,
+    REPAIR_TEMPLATE,
+    VALIDATION_TEMPLATE,
+    RequestTemplate,
+)
+
+ITERATIONS = 2000
+SYSTEM = "Systeemprompt"
+USER = "Gebruikersbericht"
+
+
+def _rebuild(template: RequestTemplate) -> dict:
+    """Request arguments as they were built before the templates existed."""
+    return {
+        "model": "model",
+        "max_tokens": template.max_tokens,
+        "temperature": template.temperature,
+        "system": SYSTEM,
+        "messages": [{"role": "user", "content": USER}],
+        "tools": [
+            {
+                "name": template.tool_name,
+                "description": template.tools[0]["description"],
+                "input_schema": template.output_model.model_json_schema(),
+            }
+        ],
+        "tool_choice": {"type": "tool", "name": template.tool_name},
+    }
+
+
+def main() -> None:
+    print(f"{'operation':<12} {'rebuilt (us)':>14} {'template (us)':>14} {'speed-up':>9}")
+    for name, template in [
+        ("validation", VALIDATION_TEMPLATE),
+        ("generation", GENERATION_TEMPLATE),
+        ("repair", REPAIR_TEMPLATE),
+    ]:
+        before = min(
+            timeit.repeat(lambda: _rebuild(template), number=ITERATIONS, repeat=5)
+        )
+        after = min(
+            timeit.repeat(
+                lambda: template.request("model", SYSTEM, USER),
+                number=ITERATIONS,
+                repeat=5,
+            )
+        )
+        before_us = before / ITERATIONS * 1e6
+        after_us = after / ITERATIONS * 1e6
+        print(
+            f"{name:<12} {before_us:>14.1f} {after_us:>14.2f} "
+            f"{before_us / after_us:>8.0f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
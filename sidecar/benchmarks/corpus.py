@@ -0,0 +1,274 @@
+"""Synthetic Dutch exam material for benchmarks.
+
+Everything is generated from a fixed seed, so two runs of a benchmark see
+exactly the same questions and pages.
+"""
+
+import csv
+import io
+import random
+import uuid
+
+from docx import Document
+from openpyxl import Workbook
+
+from parsers.schemas import ParsedOption, ParsedQuestion
+
+SEED = 20261019
+
+TOPICS = [
+    ("bedrijfseconomie", ["kostprijs", "dekkingsbijdrage", "break-evenpunt", "vaste kosten", "variabele kosten"]),
+    ("marketing", ["marktsegmentatie", "positionering", "prijselasticiteit", "merkbekendheid", "distributiekanaal"]),
+    ("recht", ["overeenkomst", "aansprakelijkheid", "wanprestatie", "rechtspersoon", "verjaringstermijn"]),
+    ("statistiek", ["steekproef", "standaardafwijking", "betrouwbaarheidsinterval", "nulhypothese", "correlatie"]),
+    ("logistiek", ["voorraadbeheer", "doorlooptijd", "bestelniveau", "veiligheidsvoorraad", "leverbetrouwbaarheid"]),
+    ("organisatiekunde", ["span of control", "matrixorganisatie", "besluitvorming", "cultuur", "verandermanagement"]),
+]
+
+STEM_TEMPLATES = [
+    "Wat wordt binnen de {topic} bedoeld met {concept}?",
+    "Welke uitspraak over {concept} is juist?",
+    "Een organisatie wil meer inzicht in {concept}. Welke aanpak past het best?",
+    "Wat is het belangrijkste verschil tussen {concept} en {other}?",
+    "In welke situatie is {concept} het meest relevant voor de {topic}?",
+    "Waarom is {concept} van belang bij het nemen van beslissingen over {other}?",
+]
+
+OPTION_TEMPLATES = [
+    "Het begrip {concept} beschrijft de samenhang tussen {other} en de resultaten.",
+    "{Concept} is vooral een administratieve handeling zonder gevolgen voor {other}.",
+    "{Concept} speelt alleen een rol wanneer {other} buiten beschouwing blijft.",
+    "Bij {concept} gaat het uitsluitend om wettelijke verplichtingen.",
+    "{Concept} wordt bepaald door de omvang van {other} in de vorige periode.",
+    "Er bestaat geen verband tussen {concept} en {other}.",
+]
+
+SENTENCE_TEMPLATES = [
+    "In de {topic} is {concept} een kernbegrip dat nauw samenhangt met {other}.",
+    "Wanneer een onderneming {concept} verkeerd inschat, heeft dat directe gevolgen voor {other}.",
+    "Volgens de gangbare literatuur moet {concept} altijd in samenhang met {other} worden geanalyseerd.",
+    "Een praktijkvoorbeeld laat zien dat {concept} in de loop van het jaar sterk kan variëren.",
+    "Studenten verwarren {concept} regelmatig met {other}, hoewel beide begrippen verschillend zijn.",
+    "De berekening van {concept} vraagt om betrouwbare gegevens over {other}.",
+    "Artikel 6:162 BW wordt in dit verband vaak genoemd, al is de toepassing beperkt.",
+    "Samengevat bepaalt {concept} in belangrijke mate hoe succesvol de {topic} in de praktijk is.",
+]
+
+BLOOM_LEVELS = ["onthouden", "begrijpen", "toepassen", "analyseren"]
+OPTION_LABELS = ["A", "B", "C", "D"]
+
+
+def _fill(template: str, rng: random.Random) -> str:
+    topic, concepts = rng.choice(TOPICS)
+    concept, other = rng.sample(concepts, 2)
+    return template.format(
+        topic=topic, concept=concept, Concept=concept.capitalize(), other=other
+    )
+
+
+def make_stem(rng: random.Random) -> str:
+    """One question stem; stems from different draws are rarely near-duplicates."""
+    context = rng.sample([c for _, cs in TOPICS for c in cs], 3)
+    return (
+        f"{_fill(rng.choice(STEM_TEMPLATES), rng)} "
+        f"Ga uit van {context[0]}, {context[1]} en {context[2]}."
+    )
+
+
+def make_questions(count: int, seed: int = SEED) -> list[dict]:
+    """Questions as rows of the upload format (stam, optie_a.., correct, ...)."""
+    rng = random.Random(seed)
+    rows = []
+    for i in range(count):
+        topic, concepts = TOPICS[i % len(TOPICS)]
+        row = {
+            "vraag_id": f"V{i + 1:04d}",
+            "stam": _fill(rng.choice(STEM_TEMPLATES), rng),
+            "correct": rng.choice(OPTION_LABELS),
+            "categorie": topic,
+            "bloom_niveau": rng.choice(BLOOM_LEVELS),
+            "leerdoel": f"De student kan {rng.choice(concepts)} uitleggen en toepassen.",
+        }
+        for label, template in zip(
+            OPTION_LABELS, rng.sample(OPTION_TEMPLATES, len(OPTION_LABELS))
+        ):
+            row[f"optie_{label.lower()}"] = _fill(template, rng)
+        rows.append(row)
+    return rows
+
+
+def parsed_questions(count: int, seed: int = SEED) -> list[ParsedQuestion]:
+    """The same questions as ParsedQuestion objects (as after /parse)."""
+    return [
+        ParsedQuestion(
+            stem=row["stam"],
+            options=[
+                ParsedOption(
+                    text=row[f"optie_{label.lower()}"],
+                    position=i,
+                    is_correct=label == row["correct"],
+                )
+                for i, label in enumerate(OPTION_LABELS)
+            ],
+            question_id=row["vraag_id"],
+            category=row["categorie"],
+            bloom_level=row["bloom_niveau"],
+            learning_goal=row["leerdoel"],
+        )
+        for row in make_questions(count, seed)
+    ]
+
+
+def question_records(count: int, exam_id: str, seed: int = SEED) -> list[dict]:
+    """The same questions as rows of the questions table."""
+    return [
+        {
+            "id": str(uuid.uuid4()),
+            "exam_id": exam_id,
+            "position": i + 1,
+            "version": 1,
+            "stem": q.stem,
+            "options": [o.model_dump() for o in q.options],
+            "correct_option": next(o.position for o in q.options if o.is_correct),
+            "bloom_level": q.bloom_level,
+            "learning_goal": q.learning_goal,
+            "source": "imported",
+        }
+        for i, q in enumerate(parsed_questions(count, seed))
+    ]
+
+
+_FIELDS = [
+    "vraag_id", "stam", "optie_a", "optie_b", "optie_c", "optie_d",
+    "correct", "categorie", "bloom_niveau", "leerdoel",
+]
+
+
+def questions_csv(count: int, seed: int = SEED) -> bytes:
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=_FIELDS, delimiter=";")
+    writer.writeheader()
+    writer.writerows(make_questions(count, seed))
+    return out.getvalue().encode("utf-8")
+
+
+def questions_xlsx(count: int, seed: int = SEED) -> bytes:
+    wb = Workbook()
+    ws = wb.active
+    ws.append(_FIELDS)
+    for row in make_questions(count, seed):
+        ws.append([row[f] for f in _FIELDS])
+    out = io.BytesIO()
+    wb.save(out)
+    return out.getvalue()
+
+
+def questions_docx(count: int, seed: int = SEED, bold: bool = False) -> bytes:
+    """Numbered questions with lettered options.
+
+    The correct option ends in '*', or with ``bold`` is set in a bold run.
+    About five questions fit on a page.
+    """
+    doc = Document()
+    for i, row in enumerate(make_questions(count, seed), start=1):
+        doc.add_paragraph(f"{i}. {row['stam']}")
+        for label in OPTION_LABELS:
+            text = f"{label}. {row[f'optie_{label.lower()}']}"
+            if label != row["correct"]:
+                doc.add_paragraph(text)
+            elif bold:
+                doc.add_paragraph().add_run(text).bold = True
+            else:
+                doc.add_paragraph(f"{text} *")
+    out = io.BytesIO()
+    doc.save(out)
+    return out.getvalue()
+
+
+def material_docx(pages: list[str]) -> bytes:
+    """A Word document with one page per entry, separated by page breaks."""
+    doc = Document()
+    for page in pages:
+        for paragraph in page.split("\n\n"):
+            doc.add_paragraph(paragraph)
+        doc.add_page_break()
+    out = io.BytesIO()
+    doc.save(out)
+    return out.getvalue()
+
+
+def material_pages(count: int, words_per_page: int = 350, seed: int = SEED) -> list[str]:
+    """Pages of Dutch course text, in paragraphs of a few sentences."""
+    rng = random.Random(seed)
+    pages = []
+    for _ in range(count):
+        paragraphs: list[str] = []
+        words = 0
+        while words < words_per_page:
+            paragraph = " ".join(
+                _fill(rng.choice(SENTENCE_TEMPLATES), rng)
+                for _ in range(rng.randint(3, 6))
+            )
+            paragraphs.append(paragraph)
+            words += len(paragraph.split())
+        pages.append("\n\n".join(paragraphs))
+    return pages
+
+
+def _pdf_escape(line: str) -> bytes:
+    text = line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+    return text.encode("cp1252", errors="replace")
+
+
+def _wrap(text: str, width: int = 95) -> list[str]:
+    lines: list[str] = []
+    for paragraph in text.split("\n\n"):
+        line = ""
+        for word in paragraph.split():
+            if line and len(line) + 1 + len(word) > width:
+                lines.append(line)
+                line = word
+            else:
+                line = f"{line} {word}".strip()
+        lines.extend([line, ""])
+    return lines
+
+
+def material_pdf(pages: list[str]) -> bytes:
+    """A minimal text PDF (Helvetica, one page per entry) that pdfplumber reads."""
+    objects: list[bytes] = []
+    page_ids = [4 + 2 * i for i in range(len(pages))]
+    objects.append(b"<< /Type /Catalog /Pages 2 0 R >>")
+    kids = " ".join(f"{pid} 0 R" for pid in page_ids).encode()
+    objects.append(b"<< /Type /Pages /Kids [" + kids + b"] /Count " + str(len(pages)).encode() + b" >>")
+    objects.append(
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>"
+    )
+    for page_id, text in zip(page_ids, pages):
+        content = b"BT /F1 9 Tf 11 TL 40 800 Td\n" + b"".join(
+            b"(" + _pdf_escape(line) + b") '\n" for line in _wrap(text)
+        ) + b"ET"
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents "
+            + str(page_id + 1).encode()
+            + b" 0 R >>"
+        )
+        objects.append(
+            b"<< /Length " + str(len(content)).encode() + b" >>\nstream\n" + content + b"\nendstream"
+        )
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(f"{number} 0 obj\n".encode() + body + b"\nendobj\n")
+    xref = out.tell()
+    out.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode())
+    for offset in offsets:
+        out.write(f"{offset:010d} 00000 n \n".encode())
+    out.write(
+        f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    )
+    return out.getvalue()
@@ -0,0 +1,58 @@
+"""Offline stand-in for the multilingual-e5-base encoder and its tokenizer.
+
+Benchmarks measure the pipelines around the model; the real encoder (and
+its download) is only used with ``--real-encoder``.
+"""
+
+import hashlib
+import re
+
+import numpy as np
+
+from rag.embedder import EMBEDDING_DIMENSIONS
+
+
+class WordTokenizer:
+    """Fast-tokenizer stand-in: one token per word or punctuation mark."""
+
+    _pattern = re.compile(r"\w+|[^\w\s]")
+
+    def num_special_tokens_to_add(self, pair: bool = False) -> int:
+        return 2
+
+    def _encode(self, text: str) -> tuple[list[int], list[tuple[int, int]]]:
+        spans = [m.span() for m in self._pattern.finditer(text)]
+        return list(range(len(spans))), spans
+
+    def __call__(self, text, add_special_tokens=True, return_offsets_mapping=False):
+        texts = [text] if isinstance(text, str) else text
+        encodings = [self._encode(t) for t in texts]
+        result = {"input_ids": [ids for ids, _ in encodings]}
+        if return_offsets_mapping:
+            result["offset_mapping"] = [spans for _, spans in encodings]
+        if isinstance(text, str):
+            result = {k: v[0] for k, v in result.items()}
+        return result
+
+
+class HashingEncoder:
+    """Deterministic bag-of-words embeddings (feature hashing), normalized.
+
+    Texts sharing words get similar vectors, so retrieval and near-duplicate
+    detection behave plausibly without the real model.
+    """
+
+    tokenizer = WordTokenizer()
+
+    def encode(self, sentences, batch_size=32, normalize_embeddings=True, convert_to_numpy=True):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        vectors = np.zeros((len(texts), EMBEDDING_DIMENSIONS), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in re.findall(r"\w+", text.lower()):
+                digest = hashlib.blake2b(word.encode(), digest_size=8).digest()
+                bucket = int.from_bytes(digest[:4], "little") % EMBEDDING_DIMENSIONS
+                vectors[row, bucket] += 1.0 if digest[4] & 1 else -1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors /= np.where(norms == 0, 1.0, norms)
+        return vectors[0] if single else vectors
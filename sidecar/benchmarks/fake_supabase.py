@@ -0,0 +1,270 @@
+"""In-memory stand-in for the Supabase client (PostgREST, RPC and Storage).
+
+Covers the query builder calls the sidecar makes: select/eq/neq/in_/gte/
+order/limit/range/single, insert/update/upsert/delete and the
+``increment_questions_analyzed`` and ``match_chunks`` functions. Each
+``execute()`` can sleep for a configurable round-trip time, and calls are
+counted per table and operation.
+"""
+
+import copy
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+import numpy as np
+
+from rag.embedder import EMBEDDING_DIMENSIONS
+from rag.local_index import MATCH_THRESHOLD
+from rag.vectors import from_pgvectors
+
+# Column defaults from the migrations that the pipelines rely on
+COLUMN_DEFAULTS = {
+    "questions": {"version": 1},
+    "validation_run_items": {"attempts": 0},
+}
+
+
+@dataclass
+class FakeResponse:
+    data: Any
+    count: int | None = None
+
+
+class _Query:
+    def __init__(self, db: "FakeSupabase", table: str):
+        self._db = db
+        self._table = table
+        self._op = "select"
+        self._columns: list[str] | None = None
+        self._filters: list = []
+        self._order: tuple[str, bool] | None = None
+        self._limit: int | None = None
+        self._offset = 0
+        self._single = False
+        self._payload: Any = None
+        self._on_conflict: list[str] = []
+
+    # -- builders ---------------------------------------------------------
+    def select(self, columns: str = "*", count: str | None = None) -> "_Query":
+        if self._op == "select":
+            self._columns = None if columns.strip() == "*" else [
+                c.strip() for c in columns.split(",")
+            ]
+        return self
+
+    def eq(self, column: str, value: Any) -> "_Query":
+        self._filters.append(lambda row: row.get(column) == value)
+        return self
+
+    def neq(self, column: str, value: Any) -> "_Query":
+        self._filters.append(lambda row: row.get(column) != value)
+        return self
+
+    def in_(self, column: str, values: list) -> "_Query":
+        allowed = set(values)
+        self._filters.append(lambda row: row.get(column) in allowed)
+        return self
+
+    def gte(self, column: str, value: Any) -> "_Query":
+        self._filters.append(
+            lambda row: row.get(column) is not None and row[column] >= value
+        )
+        return self
+
+    def order(self, column: str, desc: bool = False) -> "_Query":
+        self._order = (column, desc)
+        return self
+
+    def limit(self, count: int) -> "_Query":
+        self._limit = count
+        return self
+
+    def range(self, start: int, end: int) -> "_Query":
+        self._offset = start
+        self._limit = end - start + 1
+        return self
+
+    def single(self) -> "_Query":
+        self._single = True
+        return self
+
+    def insert(self, rows: dict | list[dict]) -> "_Query":
+        self._op, self._payload = "insert", rows
+        return self
+
+    def update(self, fields: dict) -> "_Query":
+        self._op, self._payload = "update", fields
+        return self
+
+    def upsert(self, rows: dict | list[dict], on_conflict: str = "id") -> "_Query":
+        self._op, self._payload = "upsert", rows
+        self._on_conflict = [c.strip() for c in on_conflict.split(",")]
+        return self
+
+    def delete(self) -> "_Query":
+        self._op = "delete"
+        return self
+
+    # -- execution --------------------------------------------------------
+    def _matches(self, row: dict) -> bool:
+        return all(f(row) for f in self._filters)
+
+    def execute(self) -> FakeResponse:
+        self._db._round_trip(self._table, self._op)
+        with self._db._lock:
+            rows = self._db.tables[self._table]
+            if self._op == "insert":
+                data = [self._db._insert(self._table, r) for r in _as_list(self._payload)]
+            elif self._op == "upsert":
+                data = [self._upsert(rows, r) for r in _as_list(self._payload)]
+            elif self._op == "update":
+                data = []
+                for row in rows:
+                    if self._matches(row):
+                        row.update(copy.deepcopy(self._payload))
+                        data.append(copy.deepcopy(row))
+            elif self._op == "delete":
+                data = [copy.deepcopy(r) for r in rows if self._matches(r)]
+                rows[:] = [r for r in rows if not self._matches(r)]
+            else:
+                data = self._select(rows)
+        if self._single:
+            return FakeResponse(data[0] if data else None)
+        return FakeResponse(data, len(data))
+
+    def _select(self, rows: list[dict]) -> list[dict]:
+        selected = [r for r in rows if self._matches(r)]
+        if self._order:
+            column, desc = self._order
+            selected.sort(key=lambda r: (r.get(column) is None, r.get(column)), reverse=desc)
+        end = None if self._limit is None else self._offset + self._limit
+        selected = selected[self._offset : end]
+        if self._columns:
+            selected = [{c: r.get(c) for c in self._columns} for r in selected]
+        return copy.deepcopy(selected)
+
+    def _upsert(self, rows: list[dict], new: dict) -> dict:
+        for row in rows:
+            if all(row.get(c) == new.get(c) for c in self._on_conflict):
+                row.update(copy.deepcopy(new))
+                return copy.deepcopy(row)
+        return self._db._insert(self._table, new)
+
+
+def _as_list(rows: dict | list[dict]) -> list[dict]:
+    return [rows] if isinstance(rows, dict) else list(rows)
+
+
+class _Rpc:
+    def __init__(self, db: "FakeSupabase", name: str, params: dict):
+        self._db, self._name, self._params = db, name, params
+
+    def execute(self) -> FakeResponse:
+        self._db._round_trip("rpc", self._name)
+        handler = getattr(self._db, f"_rpc_{self._name}", None)
+        if handler is None:
+            raise NotImplementedError(f"FakeSupabase has no function {self._name}")
+        with self._db._lock:
+            return FakeResponse(handler(**self._params))
+
+
+class _Bucket:
+    def __init__(self, db: "FakeSupabase", bucket: str):
+        self._db, self._bucket = db, bucket
+
+    def upload(self, path: str, file: bytes, *args, **kwargs) -> None:
+        self._db.files[(self._bucket, path)] = bytes(file)
+
+    def download(self, path: str) -> bytes:
+        self._db._round_trip("storage", "download")
+        return self._db.files[(self._bucket, path)]
+
+
+class _Storage:
+    def __init__(self, db: "FakeSupabase"):
+        self._db = db
+
+    def from_(self, bucket: str) -> _Bucket:
+        return _Bucket(self._db, bucket)
+
+
+class FakeSupabase:
+    """Thread-safe in-memory database with Supabase's client interface."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.tables: dict[str, list[dict]] = defaultdict(list)
+        self.files: dict[tuple[str, str], bytes] = {}
+        self.calls: Counter = Counter()
+        self.storage = _Storage(self)
+        self._lock = threading.Lock()
+        self._clock = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+    def table(self, name: str) -> _Query:
+        return _Query(self, name)
+
+    def rpc(self, name: str, params: dict | None = None) -> _Rpc:
+        return _Rpc(self, name, params or {})
+
+    def seed(self, table: str, rows: list[dict]) -> list[dict]:
+        """Insert rows without counting them as calls."""
+        with self._lock:
+            return [self._insert(table, r) for r in rows]
+
+    def _round_trip(self, table: str, op: str) -> None:
+        with self._lock:
+            self.calls[f"{table}.{op}"] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _insert(self, table: str, row: dict) -> dict:
+        # created_at increases strictly, so ordering by it is deterministic
+        self._clock += timedelta(microseconds=1)
+        stored = {
+            "id": str(uuid.uuid4()),
+            "created_at": self._clock.isoformat(),
+            **COLUMN_DEFAULTS.get(table, {}),
+            **copy.deepcopy(row),
+        }
+        self.tables[table].append(stored)
+        return copy.deepcopy(stored)
+
+    def _rpc_increment_questions_analyzed(self, p_exam_id: str) -> None:
+        for exam in self.tables["exams"]:
+            if exam["id"] == p_exam_id:
+                exam["questions_analyzed"] = (exam.get("questions_analyzed") or 0) + 1
+
+    def _rpc_match_chunks(
+        self,
+        query_embedding: str,
+        match_count: int,
+        filter_material_id: str,
+        match_threshold: float = MATCH_THRESHOLD,
+    ) -> list[dict]:
+        rows = [
+            r
+            for r in self.tables["chunks"]
+            if r.get("material_id") == filter_material_id and r.get("embedding")
+        ]
+        if not rows:
+            return []
+        matrix = from_pgvectors([r["embedding"] for r in rows], EMBEDDING_DIMENSIONS)
+        query = from_pgvectors([query_embedding], EMBEDDING_DIMENSIONS)[0]
+        scores = matrix @ query
+        order = np.argsort(-scores)[:match_count]
+        return [
+            {
+                "content": rows[i]["content"],
+                "page": rows[i].get("page"),
+                "position": rows[i].get("position", 0),
+                "metadata": rows[i].get("metadata") or {},
+                "similarity": float(scores[i]),
+            }
+            for i in order
+            if scores[i] > match_threshold
+        ]
@@ -0,0 +1,307 @@
+"""Local stand-in for the Anthropic Messages API.
+
+Serves ``POST /v1/messages`` (streaming and non-streaming) on localhost and
+answers every forced tool call with a valid tool input, so LLMClient works
+against it unchanged when ANTHROPIC_BASE_URL points to the server.
+
+Latency is modelled as time-to-first-token plus output tokens divided by
+a token rate. 429 responses are injected at random (``rate_limit_rate``)
+and when more than ``max_concurrent`` requests are in flight. Input and
+output tokens are counted with the same estimate the context packer uses,
+and responses larger than ``max_tokens`` are cut off with stop reason
+"max_tokens", as the real API does.
+"""
+
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+from benchmarks.corpus import make_stem
+from llm.context_packer import CHARS_PER_TOKEN, estimate_tokens
+
+# Number of input_json_delta events a streamed tool input is split into
+STREAM_DELTAS = 8
+
+
+@dataclass
+class MockConfig:
+    time_to_first_token: float = 0.05
+    output_tokens_per_second: float = 0.0  # 0 = no generation delay
+    rate_limit_rate: float = 0.0
+    max_concurrent: int = 0  # 0 = unlimited
+    retry_after_ms: int = 50
+    cache_read_ratio: float = 0.0  # share of input tokens reported as cache reads
+    seed: int = 0
+
+
+@dataclass
+class MockStats:
+    requests: int = 0
+    rate_limited: int = 0
+    truncated: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cache_read_input_tokens: int = 0
+    by_tool: Counter = field(default_factory=Counter)
+
+    def as_dict(self) -> dict:
+        return {
+            "requests": self.requests,
+            "rate_limited": self.rate_limited,
+            "truncated": self.truncated,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "cache_read_input_tokens": self.cache_read_input_tokens,
+            "by_tool": dict(self.by_tool),
+        }
+
+
+def _validation_result(_: str) -> dict:
+    return {
+        "bet_discriminatie": "gemiddeld",
+        "bet_ambiguiteit": "geen",
+        "bet_score": 4,
+        "bet_toelichting": "De afleiders zijn plausibel en de stam is eenduidig.",
+        "tech_kwal_stam_score": 4,
+        "tech_kwal_afleiders_score": 3,
+        "tech_kwal_score": 4,
+        "tech_problemen": [],
+        "tech_toelichting": "Geen technische problemen gevonden.",
+        "val_cognitief_niveau": "begrijpen",
+        "val_score": 4,
+        "val_toelichting": "De vraag sluit aan bij het leerdoel.",
+        "improvement_suggestions": [
+            {"dimensie": "technisch", "suggestie": "Maak afleider C iets korter."}
+        ],
+    }
+
+
+def _generation_result(prompt: str) -> dict:
+    match = re.search(r"<count>(\d+)</count>", prompt)
+    count = int(match.group(1)) if match else 5
+    rng = random.Random()
+    return {
+        "questions": [
+            {
+                "stem": make_stem(rng),
+                "options": [
+                    {"text": f"Uitspraak {j} bij vraag {i}", "position": j, "is_correct": j == 0}
+                    for j in range(4)
+                ],
+                "bloom_level": "begrijpen",
+                "chunk_ids": [str(i % 3)],
+            }
+            for i in range(count)
+        ]
+    }
+
+
+def _repair_plan(_: str) -> dict:
+    return {"proposals": [], "summary": "Geen herstel nodig."}
+
+
+RESPONDERS = {
+    "validation_result": _validation_result,
+    "generation_result": _generation_result,
+    "repair_plan": _repair_plan,
+}
+
+
+class MockAnthropicServer:
+    """Threaded HTTP server; use as a context manager or start()/stop()."""
+
+    def __init__(self, config: MockConfig | None = None, port: int = 0):
+        self.config = config or MockConfig()
+        self.stats = MockStats()
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._rng = random.Random(self.config.seed)
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._server.daemon_threads = True
+        self._thread: threading.Thread | None = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "MockAnthropicServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "MockAnthropicServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self.stats = MockStats()
+
+    # -- request handling ---------------------------------------------------
+    def _admit(self) -> bool:
+        """Count the request; False if it should get a 429."""
+        with self._lock:
+            self.stats.requests += 1
+            limited = self._rng.random() < self.config.rate_limit_rate or (
+                self.config.max_concurrent
+                and self._in_flight >= self.config.max_concurrent
+            )
+            if limited:
+                self.stats.rate_limited += 1
+                return False
+            self._in_flight += 1
+            return True
+
+    def _release(self) -> None:
+        with self._lock:
+            self._in_flight -= 1
+
+    def _respond(self, body: dict) -> tuple[dict, str, dict]:
+        """Build the message, the (possibly cut) tool JSON and usage."""
+        tool_name = body.get("tool_choice", {}).get("name", "")
+        prompt = body["messages"][-1]["content"]
+        tool_input = RESPONDERS.get(tool_name, lambda _: {})(prompt)
+        tool_json = json.dumps(tool_input, ensure_ascii=False)
+
+        input_tokens = estimate_tokens(
+            json.dumps(body.get("system", "")) + json.dumps(body["messages"]) + json.dumps(body.get("tools", []))
+        )
+        output_tokens = estimate_tokens(tool_json)
+        stop_reason = "tool_use"
+        if output_tokens > body["max_tokens"]:
+            tool_json = tool_json[: int(body["max_tokens"] * CHARS_PER_TOKEN)]
+            output_tokens = body["max_tokens"]
+            stop_reason = "max_tokens"
+
+        cache_read = int(input_tokens * self.config.cache_read_ratio)
+        usage = {
+            "input_tokens": input_tokens - cache_read,
+            "output_tokens": output_tokens,
+            "cache_read_input_tokens": cache_read,
+            "cache_creation_input_tokens": 0,
+        }
+        with self._lock:
+            self.stats.input_tokens += usage["input_tokens"]
+            self.stats.output_tokens += output_tokens
+            self.stats.cache_read_input_tokens += cache_read
+            self.stats.by_tool[tool_name] += 1
+            if stop_reason == "max_tokens":
+                self.stats.truncated += 1
+
+        message = {
+            "id": f"msg_{uuid.uuid4().hex[:24]}",
+            "type": "message",
+            "role": "assistant",
+            "model": body.get("model", "mock"),
+            "stop_reason": stop_reason,
+            "stop_sequence": None,
+            "usage": usage,
+        }
+        block = {
+            "type": "tool_use",
+            "id": f"toolu_{uuid.uuid4().hex[:24]}",
+            "name": tool_name,
+        }
+        return {**message, "content": [block]}, tool_json, usage
+
+    def _generation_delay(self, output_tokens: int) -> float:
+        rate = self.config.output_tokens_per_second
+        return output_tokens / rate if rate else 0.0
+
+    def _handler(self) -> type[BaseHTTPRequestHandler]:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format: str, *args: Any) -> None:
+                pass
+
+            def _send_json(self, status: int, payload: dict, headers: dict | None = None) -> None:
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("content-type", "application/json")
+                self.send_header("content-length", str(len(data)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _event(self, name: str, payload: dict) -> None:
+                chunk = f"event: {name}\ndata: {json.dumps(payload)}\n\n".encode()
+                self.wfile.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+                self.wfile.flush()
+
+            def do_POST(self) -> None:
+                length = int(self.headers.get("content-length", 0))
+                body = json.loads(self.rfile.read(length))
+                if not self.path.startswith("/v1/messages"):
+                    self._send_json(404, {"type": "error", "error": {"type": "not_found_error", "message": self.path}})
+                    return
+                if not server._admit():
+                    self._send_json(
+                        429,
+                        {"type": "error", "error": {"type": "rate_limit_error", "message": "Mock rate limit"}},
+                        {"retry-after-ms": str(server.config.retry_after_ms)},
+                    )
+                    return
+                try:
+                    message, tool_json, usage = server._respond(body)
+                    time.sleep(server.config.time_to_first_token)
+                    if body.get("stream"):
+                        self._stream(message, tool_json, usage)
+                    else:
+                        time.sleep(server._generation_delay(usage["output_tokens"]))
+                        message["content"][0]["input"] = json.loads(tool_json) if message["stop_reason"] == "tool_use" else {}
+                        self._send_json(200, message)
+                finally:
+                    server._release()
+
+            def _stream(self, message: dict, tool_json: str, usage: dict) -> None:
+                self.send_response(200)
+                self.send_header("content-type", "text/event-stream")
+                self.send_header("transfer-encoding", "chunked")
+                self.end_headers()
+
+                start = {**message, "content": [], "stop_reason": None, "usage": {**usage, "output_tokens": 1}}
+                self._event("message_start", {"type": "message_start", "message": start})
+                self._event(
+                    "content_block_start",
+                    {"type": "content_block_start", "index": 0, "content_block": {**message["content"][0], "input": {}}},
+                )
+                step = max(1, -(-len(tool_json) // STREAM_DELTAS))
+                delay = server._generation_delay(usage["output_tokens"]) / STREAM_DELTAS
+                for i in range(0, len(tool_json), step):
+                    time.sleep(delay)
+                    self._event(
+                        "content_block_delta",
+                        {"type": "content_block_delta", "index": 0, "delta": {"type": "input_json_delta", "partial_json": tool_json[i : i + step]}},
+                    )
+                self._event("content_block_stop", {"type": "content_block_stop", "index": 0})
+                self._event(
+                    "message_delta",
+                    {
+                        "type": "message_delta",
+                        "delta": {"stop_reason": message["stop_reason"], "stop_sequence": None},
+                        "usage": {"output_tokens": usage["output_tokens"]},
+                    },
+                )
+                self._event("message_stop", {"type": "message_stop"})
+                self.wfile.write(b"0\r\n\r\n")
+                self.wfile.flush()
+
+        return Handler
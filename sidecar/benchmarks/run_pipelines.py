@@ -0,0 +1,300 @@
+"""Offline throughput benchmarks for the sidecar pipelines.
+
+Runs run_validation, run_generation, run_embedding and POST /parse against
+a local mock of the Anthropic Messages API and an in-memory Supabase, at
+several sizes (questions, or pages for embedding). Nothing leaves the
+machine. Results are written as JSON; pass an earlier result file with
+``--compare`` to print the change per scenario.
+
+Run from the sidecar directory:
+
+    python -m benchmarks.run_pipelines --sizes 10 100 1000 --output bench.json
+    python -m benchmarks.run_pipelines --compare bench.json --output new.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+from contextlib import ExitStack
+from datetime import datetime, timezone
+from pathlib import Path
+from unittest.mock import patch
+
+from prometheus_client import REGISTRY
+
+from benchmarks import corpus
+from benchmarks.fake_encoder import HashingEncoder
+from benchmarks.fake_supabase import FakeSupabase
+from benchmarks.mock_anthropic import MockAnthropicServer, MockConfig
+from config.settings import settings
+
+SCENARIOS = ["validation", "generation", "embedding", "parse"]
+DEFAULT_SIZES = [10, 100, 1000]
+PARSE_FORMATS = {
+    "csv": ("vragen.csv", corpus.questions_csv, "text/csv"),
+    "xlsx": (
+        "vragen.xlsx",
+        corpus.questions_xlsx,
+        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    ),
+    "docx": (
+        "vragen.docx",
+        corpus.questions_docx,
+        "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    ),
+}
+MATERIAL_PAGES = 40
+
+
+def _stage_seconds() -> dict[str, float]:
+    """Cumulative seconds per pipeline stage from the Prometheus registry."""
+    totals = {}
+    for metric in REGISTRY.collect():
+        if metric.name != "sidecar_stage_duration_seconds":
+            continue
+        for sample in metric.samples:
+            if sample.name.endswith("_sum"):
+                key = f"{sample.labels['pipeline']}.{sample.labels['stage']}"
+                totals[key] = sample.value
+    return totals
+
+
+def _measure(run: Callable[[], None], mock: MockAnthropicServer, db: FakeSupabase | None) -> dict:
+    mock.reset_stats()
+    stages_before = _stage_seconds()
+    start = time.perf_counter()
+    run()
+    seconds = time.perf_counter() - start
+    stages_after = _stage_seconds()
+    return {
+        "seconds": round(seconds, 4),
+        "llm": mock.stats.as_dict(),
+        "supabase_calls": sum(db.calls.values()) if db else 0,
+        "stages": {
+            k: round(v - stages_before.get(k, 0.0), 4)
+            for k, v in sorted(stages_after.items())
+            if v - stages_before.get(k, 0.0) > 0
+        },
+    }
+
+
+def _seed_exam(db: FakeSupabase, size: int) -> str:
+    exam = db.seed("exams", [{"title": "Benchmark", "analysis_status": "pending"}])[0]
+    db.seed("questions", corpus.question_records(size, exam["id"]))
+    return exam["id"]
+
+
+def _seed_material(db: FakeSupabase, pages: int) -> dict:
+    pdf = corpus.material_pdf(corpus.material_pages(pages))
+    material = db.seed(
+        "materials",
+        [
+            {
+                "storage_path": "bench/materiaal.pdf",
+                "mime_type": "application/pdf",
+                "filename": "materiaal.pdf",
+                "chunk_generation": 0,
+            }
+        ],
+    )[0]
+    db.storage.from_("materials").upload("bench/materiaal.pdf", pdf)
+    return material
+
+
+def bench_validation(size: int, mock: MockAnthropicServer, supabase_latency: float) -> dict:
+    from llm.client import LLMClient
+    from services.validation_pipeline import run_validation
+
+    db = FakeSupabase(supabase_latency)
+    exam_id = _seed_exam(db, size)
+    result = _measure(
+        lambda: asyncio.run(run_validation(exam_id, db, LLMClient())),
+        mock,
+        db,
+    )
+    return {**result, "items_per_second": round(size / result["seconds"], 2)}
+
+
+def bench_embedding(size: int, mock: MockAnthropicServer, supabase_latency: float) -> dict:
+    from services.embedding_pipeline import run_embedding
+
+    db = FakeSupabase(supabase_latency)
+    material = _seed_material(db, size)
+    with patch("services.embedding_pipeline.get_supabase_client", return_value=db):
+        result = _measure(lambda: asyncio.run(run_embedding(material["id"])), mock, db)
+    return {
+        **result,
+        "items_per_second": round(size / result["seconds"], 2),
+        "chunks": len(db.tables["chunks"]),
+    }
+
+
+def bench_generation(size: int, mock: MockAnthropicServer, supabase_latency: float) -> dict:
+    """Generate ``size`` questions from a pre-embedded material, then validate."""
+    from services.embedding_pipeline import run_embedding
+    from services.generation_pipeline import run_generation
+
+    db = FakeSupabase(supabase_latency)
+    material = _seed_material(db, MATERIAL_PAGES)
+    with patch("services.embedding_pipeline.get_supabase_client", return_value=db):
+        asyncio.run(run_embedding(material["id"]))
+    exam = db.seed("exams", [{"title": "Gegenereerd", "analysis_status": "pending"}])[0]
+    job = db.seed(
+        "generation_jobs",
+        [
+            {
+                "material_id": material["id"],
+                "exam_id": exam["id"],
+                "status": "pending",
+                "specification": {
+                    "count": size,
+                    "bloom_level": "begrijpen",
+                    "learning_goal": "De student kan de dekkingsbijdrage en het break-evenpunt berekenen.",
+                    "num_options": 4,
+                },
+            }
+        ],
+    )[0]
+    db.calls.clear()
+    with patch("services.generation_pipeline.get_supabase_client", return_value=db):
+        result = _measure(lambda: asyncio.run(run_generation(job["id"])), mock, db)
+    generated = len(db.tables["questions"])
+    return {
+        **result,
+        "items_per_second": round(generated / result["seconds"], 2),
+        "questions_generated": generated,
+    }
+
+
+def bench_parse(size: int, mock: MockAnthropicServer, supabase_latency: float) -> dict:
+    from fastapi.testclient import TestClient
+
+    from main import app
+
+    client = TestClient(app)
+    formats = {}
+    for fmt, (filename, build, content_type) in PARSE_FORMATS.items():
+        content = build(size)
+        start = time.perf_counter()
+        response = client.post("/parse", files={"file": (filename, content, content_type)})
+        seconds = time.perf_counter() - start
+        response.raise_for_status()
+        formats[fmt] = {
+            "seconds": round(seconds, 4),
+            "bytes": len(content),
+            "items_per_second": round(len(response.json()) / seconds, 2),
+        }
+    return {
+        "seconds": round(sum(f["seconds"] for f in formats.values()), 4),
+        "formats": formats,
+    }
+
+
+BENCHMARKS = {
+    "validation": bench_validation,
+    "generation": bench_generation,
+    "embedding": bench_embedding,
+    "parse": bench_parse,
+}
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _compare(results: list[dict], baseline_path: str) -> None:
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {
+            (r["scenario"], r["size"]): r for r in json.load(f)["results"]
+        }
+    print(f"\n{'scenario':<12} {'size':>6} {'before (s)':>11} {'after (s)':>10} {'change':>8}")
+    for r in results:
+        before = baseline.get((r["scenario"], r["size"]))
+        if before is None:
+            continue
+        change = (r["seconds"] - before["seconds"]) / before["seconds"] * 100
+        print(
+            f"{r['scenario']:<12} {r['size']:>6} {before['seconds']:>11.3f} "
+            f"{r['seconds']:>10.3f} {change:>+7.1f}%"
+        )
+
+
+def main(argv: list[str] | None = None) -> dict:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--sizes", nargs="+", type=int, default=DEFAULT_SIZES)
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument("--compare", help="earlier result file to compare with")
+    parser.add_argument("--ttft", type=float, default=0.05, help="mock time to first token (s)")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="mock output rate, 0 = instant")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="share of requests answered with 429")
+    parser.add_argument("--max-concurrent", type=int, default=0, help="429 above this many requests in flight")
+    parser.add_argument("--cache-read-ratio", type=float, default=0.0)
+    parser.add_argument("--supabase-latency", type=float, default=0.0, help="seconds per PostgREST call")
+    parser.add_argument("--real-encoder", action="store_true", help="use multilingual-e5-base")
+    args = parser.parse_args(argv)
+
+    config = MockConfig(
+        time_to_first_token=args.ttft,
+        output_tokens_per_second=args.tokens_per_second,
+        rate_limit_rate=args.rate_limit_rate,
+        max_concurrent=args.max_concurrent,
+        cache_read_ratio=args.cache_read_ratio,
+    )
+
+    results = []
+    with ExitStack() as stack:
+        mock = stack.enter_context(MockAnthropicServer(config))
+        stack.enter_context(patch.dict(os.environ, {"ANTHROPIC_BASE_URL": mock.base_url}))
+        stack.enter_context(patch.object(settings, "anthropic_api_key", "bench"))
+        if not args.real_encoder:
+            stack.enter_context(patch("rag.embedder._model", HashingEncoder()))
+        # Keep local vector indexes of the run out of the regular index dir
+        from rag.local_index import local_index_cache
+
+        index_dir = stack.enter_context(tempfile.TemporaryDirectory())
+        stack.enter_context(patch.object(local_index_cache, "index_dir", Path(index_dir)))
+
+        for scenario in args.scenarios:
+            for size in args.sizes:
+                print(f"{scenario} x {size} ...", end=" ", flush=True)
+                result = BENCHMARKS[scenario](size, mock, args.supabase_latency)
+                results.append({"scenario": scenario, "size": size, **result})
+                print(f"{result['seconds']:.3f}s")
+
+    report = {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "git_commit": _git_commit(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "encoder": "multilingual-e5-base" if args.real_encoder else "hashing",
+            "mock": vars(config),
+            "supabase_latency": args.supabase_latency,
+        },
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        _compare(results, args.compare)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,45 @@ class Settings(BaseSettings):
     supabase_service_role_key: str = ""
     anthropic_api_key: str = ""
 
+    # Worker processes for extracting long PDFs (rag/extractor.py), capped
+    # further by the CPUs available to the process
+    extract_max_workers: int = 4
+
+    # In-process vector index for retrieval (rag/local_index.py)
+    local_index_enabled: bool = True
+    local_index_dir: str = ""
+    local_index_max_materials: int = 32
+    # Fuse BM25 keyword hits with the vector hits (needs the local index)
+    hybrid_retrieval: bool = True
+
+    # Retrieval result cache (rag/retrieval_cache.py)
+    retrieval_cache_ttl_seconds: float = 900
+    retrieval_cache_max_entries: int = 512
+
+    # Input tokens for the generation prompt, source material included
+    generation_input_token_budget: int = 12000
+
+    # OpenTelemetry exporter: "" (off), "console", "otlp_file" or "otlp"
+    tracing_exporter: str = ""
+    tracing_file_path: str = "traces.otlp.jsonl"
+
+    # Admission control for /analyze, /generate and /repair
+    # (services/admission.py); 0 disables a limit or budget
+    admission_max_inflight_tokens: int = 4_000_000
+    admission_user_max_inflight_tokens: int = 1_000_000
+    admission_user_daily_budget_usd: float = 0
+    admission_exam_daily_budget_usd: float = 0
+    # How long /repair waits for capacity before answering 503
+    admission_queue_timeout_seconds: float = 60
+    # How long a queued /analyze or /generate job waits before it is failed
+    admission_job_queue_timeout_seconds: float = 900
+
+    # cProfile per request (observability/profiling.py): "" (off), "header"
+    # (requests with X-Profile: 1) or "all"; only slow requests are dumped
+    profiling_mode: str = ""
+    profiling_dir: str = "profiles"
+    profiling_min_seconds: float = 1.0
+
     model_config = {"env_file": ".env", "extra": "ignore"}
 
 
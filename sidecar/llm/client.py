@@ -1,10 +1,41 @@
+import logging
+import time
+from collections.abc import Iterator
+from typing import Any
+
 import anthropic
+from opentelemetry import trace
+from pydantic import ValidationError
 
 from config.settings import settings
-from llm.prompts.generation import build_generation_prompt
+from llm.context_packer import MAX_OUTPUT_TOKENS, generation_max_tokens
+from llm.prompts.generation import build_generation_prompt_with_sources
 from llm.prompts.repair import build_repair_prompt
 from llm.prompts.validation import build_validation_prompt
-from llm.schemas import GenerationResult, RepairPlan, ValidationResult
+from llm.schemas import (
+    GeneratedQuestion,
+    GenerationResult,
+    RepairPlan,
+    RepairProposal,
+    ValidationResult,
+)
+from llm.request_templates import (
+    GENERATION_TEMPLATE,
+    REPAIR_TEMPLATE,
+    VALIDATION_TEMPLATE,
+    RequestTemplate,
+)
+from llm.streaming import ToolArrayStreamParser, complete_array_items
+from observability.metrics import record_llm_response, stage
+from observability.tracing import tracer
+from services.usage_ledger import ledger
+
+logger = logging.getLogger(__name__)
+
+# Retries for a response without a usable tool block
+MALFORMED_RETRIES = 1
+# How often a truncated batch may be split into smaller requests
+MAX_BATCH_SPLITS = 3
 
 
 class LLMValidationError(Exception):
@@ -13,6 +44,17 @@ class LLMValidationError(Exception):
     pass
 
 
+class LLMTruncatedError(LLMValidationError):
+    """Raised when a response stays truncated at the largest max_tokens.
+
+    ``partial_json`` holds the tool input received before the cut-off.
+    """
+
+    def __init__(self, message: str, partial_json: str = ""):
+        super().__init__(message)
+        self.partial_json = partial_json
+
+
 class LLMClient:
     """Client for Claude API calls with structured output."""
 
@@ -25,6 +67,7 @@ class LLMClient:
             api_key=api_key or settings.anthropic_api_key,
         )
 
+    @tracer.start_as_current_span("llm.validate_question")
     def validate_question(
         self,
         question: dict,
@@ -44,42 +87,21 @@ class LLMClient:
         Raises:
             LLMValidationError: If the LLM refuses or hits max tokens.
         """
-        messages = build_validation_prompt(question, deterministic_results)
+        with stage("validation", "prompt_build"):
+            messages = build_validation_prompt(question, deterministic_results)
         system_msg = messages[0]["content"]
         user_msg = messages[1]["content"]
 
-        response = self.client.messages.create(
-            model=model or self.MODEL_HAIKU,
-            max_tokens=2048,
-            temperature=0.0,
-            system=system_msg,
-            messages=[{"role": "user", "content": user_msg}],
-            tools=[
-                {
-                    "name": "validation_result",
-                    "description": "Output the validation result for the MC question.",
-                    "input_schema": ValidationResult.model_json_schema(),
-                }
-            ],
-            tool_choice={"type": "tool", "name": "validation_result"},
-        )
-
-        if response.stop_reason == "max_tokens":
-            raise LLMValidationError(
-                "LLM response was truncated (max_tokens reached). "
-                "The question may be too complex for the current token limit."
-            )
-
-        # Extract tool use block
-        for block in response.content:
-            if block.type == "tool_use" and block.name == "validation_result":
-                return ValidationResult.model_validate(block.input)
-
-        raise LLMValidationError(
-            f"Unexpected response structure from LLM. "
-            f"Stop reason: {response.stop_reason}"
+        tool_input = self._call_tool(
+            VALIDATION_TEMPLATE,
+            model or self.MODEL_HAIKU,
+            system_msg,
+            user_msg,
+            truncated_hint="The question may be too complex for the current token limit.",
         )
+        return ValidationResult.model_validate(tool_input)
 
+    @tracer.start_as_current_span("llm.generate_questions")
     def generate_questions(
         self,
         specification: dict,
@@ -94,51 +116,148 @@ class LLMClient:
             model: Model to use (defaults to Sonnet).
 
         Returns:
-            GenerationResult with generated questions.
+            GenerationResult with generated questions, whose chunk_ids are
+            indices into ``chunks``. If the response stays truncated, the
+            questions that were complete are kept and the remainder is
+            requested in a follow-up call.
 
         Raises:
-            LLMValidationError: If the LLM refuses or hits max tokens.
+            LLMValidationError: If the LLM refuses, or is truncated before
+                any question is complete.
         """
-        messages = build_generation_prompt(specification, chunks)
-        system_msg = messages[0]["content"]
-        user_msg = messages[1]["content"]
+        return self._generate(specification, chunks, model, MAX_BATCH_SPLITS)
 
-        response = self.client.messages.create(
-            model=model or self.MODEL_SONNET,
-            max_tokens=4096,
-            temperature=0.5,
-            system=system_msg,
-            messages=[{"role": "user", "content": user_msg}],
-            tools=[
-                {
-                    "name": "generation_result",
-                    "description": "Output the generated MC questions.",
-                    "input_schema": GenerationResult.model_json_schema(),
-                }
-            ],
-            tool_choice={"type": "tool", "name": "generation_result"},
-        )
+    def _generate(
+        self,
+        specification: dict,
+        chunks: list,
+        model: str | None,
+        splits_left: int,
+    ) -> GenerationResult:
+        request, sources = self._generation_request(specification, chunks, model)
+        try:
+            tool_input = self._call_tool(
+                GENERATION_TEMPLATE,
+                request["model"],
+                request["system"],
+                request["messages"][0]["content"],
+                max_tokens=request["max_tokens"],
+                truncated_hint="Try generating fewer questions or reducing source material.",
+            )
+            result = GenerationResult.model_validate(tool_input)
+            return GenerationResult(
+                questions=[_source_chunk_ids(q, sources) for q in result.questions]
+            )
+        except LLMTruncatedError as e:
+            # Keep the questions that were complete and ask for the rest
+            salvaged = [
+                _source_chunk_ids(q, sources)
+                for q in _salvage(e.partial_json, "questions", GeneratedQuestion)
+            ]
+            remaining = specification.get("count", 5) - len(salvaged)
+            if not salvaged or splits_left == 0:
+                raise
+            logger.warning(
+                f"Generation truncated; salvaged {len(salvaged)} questions, "
+                f"requesting {remaining} more"
+            )
+            if remaining > 0:
+                rest = self._generate(
+                    {**specification, "count": remaining},
+                    chunks,
+                    model,
+                    splits_left - 1,
+                )
+                salvaged.extend(rest.questions)
+            return GenerationResult(questions=salvaged)
+
+    def stream_generate_questions(
+        self,
+        specification: dict,
+        chunks: list,
+        model: str | None = None,
+    ) -> Iterator[GeneratedQuestion]:
+        """Generate MC questions, yielding each one as soon as it is complete.
+
+        Uses the streaming Messages API and parses the tool input JSON
+        incrementally, so the first question is available long before the
+        response has finished.
+
+        Raises:
+            LLMValidationError: If the response is truncated (after yielding
+                the questions that were complete) or has no tool block.
+        """
+        parser = ToolArrayStreamParser("questions")
+        with tracer.start_as_current_span("llm.stream_generate_questions") as span:
+            request, sources = self._generation_request(specification, chunks, model)
+            _set_request_attributes(span, request["model"], request["max_tokens"])
+            start = time.perf_counter()
+            with self.client.messages.stream(**request) as stream:
+                for event in stream:
+                    if (
+                        event.type == "content_block_delta"
+                        and event.delta.type == "input_json_delta"
+                    ):
+                        for item in parser.feed(event.delta.partial_json):
+                            yield _source_chunk_ids(
+                                GeneratedQuestion.model_validate(item), sources
+                            )
+                response = stream.get_final_message()
+            record_llm_response("generation", request["model"], response)
+            ledger.record(
+                "generation",
+                request["model"],
+                response,
+                time.perf_counter() - start,
+                http_retries=_http_retries(stream),
+            )
+            _set_response_attributes(span, response)
 
         if response.stop_reason == "max_tokens":
             raise LLMValidationError(
                 "LLM response was truncated (max_tokens reached). "
                 "Try generating fewer questions or reducing source material."
             )
+        if not parser.done:
+            raise LLMValidationError(
+                f"Unexpected response structure from LLM. "
+                f"Stop reason: {response.stop_reason}"
+            )
 
-        for block in response.content:
-            if block.type == "tool_use" and block.name == "generation_result":
-                return GenerationResult.model_validate(block.input)
+    def _generation_request(
+        self,
+        specification: dict,
+        chunks: list,
+        model: str | None,
+    ) -> tuple[dict, list[int]]:
+        """Keyword arguments for a generation call to messages.create/stream.
 
-        raise LLMValidationError(
-            f"Unexpected response structure from LLM. "
-            f"Stop reason: {response.stop_reason}"
+        Also returns, per chunk id in the prompt, its index in ``chunks``.
+        """
+        with stage("generation", "prompt_build"):
+            messages, sources = build_generation_prompt_with_sources(
+                specification, chunks
+            )
+        system_msg = messages[0]["content"]
+        user_msg = messages[1]["content"]
+
+        request = GENERATION_TEMPLATE.request(
+            model or self.MODEL_SONNET,
+            system_msg,
+            user_msg,
+            max_tokens=generation_max_tokens(
+                specification.get("count", 5), specification.get("num_options", 4)
+            ),
         )
+        return request, sources
 
+    @tracer.start_as_current_span("llm.repair_questions")
     def repair_questions(
         self,
         questions: list[dict],
         validation: dict,
         model: str | None = None,
+        _splits_left: int = MAX_BATCH_SPLITS,
     ) -> RepairPlan:
         """Generate repair proposals for questions with missing fields.
 
@@ -148,42 +267,198 @@ class LLMClient:
             model: Model to use (defaults to Haiku for cost efficiency).
 
         Returns:
-            RepairPlan with proposals for filling missing fields.
+            RepairPlan with proposals for filling missing fields. A batch
+            that stays truncated is split in halves; a single question keeps
+            the proposals that were complete.
 
         Raises:
-            LLMValidationError: If the LLM refuses or hits max tokens.
+            LLMValidationError: If the LLM refuses, or is truncated before
+                any proposal is complete.
         """
-        messages = build_repair_prompt(questions, validation)
+        with stage("repair", "prompt_build"):
+            messages = build_repair_prompt(questions, validation)
         system_msg = messages[0]["content"]
         user_msg = messages[1]["content"]
 
-        response = self.client.messages.create(
-            model=model or self.MODEL_HAIKU,
-            max_tokens=4096,
-            temperature=0.3,
-            system=system_msg,
-            messages=[{"role": "user", "content": user_msg}],
-            tools=[
-                {
-                    "name": "repair_plan",
-                    "description": "Output the repair plan with proposals for missing fields.",
-                    "input_schema": RepairPlan.model_json_schema(),
-                }
-            ],
-            tool_choice={"type": "tool", "name": "repair_plan"},
-        )
+        try:
+            tool_input = self._call_tool(
+                REPAIR_TEMPLATE,
+                model or self.MODEL_HAIKU,
+                system_msg,
+                user_msg,
+                truncated_hint="Try repairing fewer questions at a time.",
+            )
+            return RepairPlan.model_validate(tool_input)
+        except LLMTruncatedError as e:
+            invalid = [
+                r
+                for r in validation.get("results", [])
+                if not r.get("is_valid", True)
+            ]
+            if len(invalid) > 1 and _splits_left > 0:
+                # Split the batch; proposals keep their global question_index
+                half = len(invalid) // 2
+                plans = [
+                    self.repair_questions(
+                        questions,
+                        {**validation, "results": part},
+                        model,
+                        _splits_left=_splits_left - 1,
+                    )
+                    for part in (invalid[:half], invalid[half:])
+                ]
+                return RepairPlan(
+                    proposals=[p for plan in plans for p in plan.proposals],
+                    summary=" ".join(plan.summary for plan in plans if plan.summary),
+                )
+            salvaged = _salvage(e.partial_json, "proposals", RepairProposal)
+            if not salvaged:
+                raise
+            return RepairPlan(
+                proposals=salvaged,
+                summary="Gedeeltelijk herstelplan: het antwoord van het taalmodel was afgekapt.",
+            )
 
-        if response.stop_reason == "max_tokens":
+    def _call_tool(
+        self,
+        template: RequestTemplate,
+        model: str,
+        system_msg: str,
+        user_msg: str,
+        max_tokens: int | None = None,
+        truncated_hint: str = "",
+    ) -> dict[str, Any]:
+        """Call the model with a forced tool and return the tool input.
+
+        The response is streamed so that the raw tool JSON is still available
+        when it gets cut off. A truncated response is retried with double the
+        max_tokens (up to MAX_OUTPUT_TOKENS); a response without the tool
+        block is retried MALFORMED_RETRIES times.
+
+        Raises:
+            LLMTruncatedError: If the response is still truncated at the
+                largest max_tokens; carries the partial tool JSON.
+            LLMValidationError: If no tool block arrives after the retries.
+        """
+        max_tokens = max_tokens or template.max_tokens
+        malformed_retries = MALFORMED_RETRIES
+        retries = 0
+        while True:
+            partial: list[str] = []
+            with stage(template.operation, "llm_call"):
+                span = trace.get_current_span()
+                _set_request_attributes(span, model, max_tokens)
+                start = time.perf_counter()
+                with self.client.messages.stream(
+                    **template.request(model, system_msg, user_msg, max_tokens)
+                ) as stream:
+                    for event in stream:
+                        if (
+                            event.type == "content_block_delta"
+                            and event.delta.type == "input_json_delta"
+                        ):
+                            partial.append(event.delta.partial_json)
+                    response = stream.get_final_message()
+                _set_response_attributes(span, response)
+            record_llm_response(template.operation, model, response)
+            ledger.record(
+                template.operation,
+                model,
+                response,
+                time.perf_counter() - start,
+                retries=retries,
+                http_retries=_http_retries(stream),
+            )
+            retries += 1
+
+            if response.stop_reason == "max_tokens":
+                if max_tokens < MAX_OUTPUT_TOKENS:
+                    max_tokens = min(max_tokens * 2, MAX_OUTPUT_TOKENS)
+                    logger.warning(
+                        f"{template.tool_name} truncated; retrying with "
+                        f"max_tokens={max_tokens}"
+                    )
+                    continue
+                raise LLMTruncatedError(
+                    f"LLM response was truncated (max_tokens reached). {truncated_hint}".strip(),
+                    "".join(partial),
+                )
+
+            for block in response.content:
+                if block.type == "tool_use" and block.name == template.tool_name:
+                    return block.input
+
+            if malformed_retries > 0:
+                malformed_retries -= 1
+                logger.warning(
+                    f"{template.tool_name} missing from response "
+                    f"(stop reason: {response.stop_reason}); retrying"
+                )
+                continue
             raise LLMValidationError(
-                "LLM response was truncated (max_tokens reached). "
-                "Try repairing fewer questions at a time."
+                f"Unexpected response structure from LLM. "
+                f"Stop reason: {response.stop_reason}"
             )
 
-        for block in response.content:
-            if block.type == "tool_use" and block.name == "repair_plan":
-                return RepairPlan.model_validate(block.input)
 
-        raise LLMValidationError(
-            f"Unexpected response structure from LLM. "
-            f"Stop reason: {response.stop_reason}"
-        )
+def _set_request_attributes(span: trace.Span, model: str, max_tokens: int) -> None:
+    span.set_attributes(
+        {
+            "gen_ai.system": "anthropic",
+            "gen_ai.request.model": model,
+            "gen_ai.request.max_tokens": max_tokens,
+        }
+    )
+
+
+def _set_response_attributes(span: trace.Span, response: Any) -> None:
+    """GenAI semantic-convention attributes for a Messages API response."""
+    span.set_attribute("gen_ai.response.finish_reasons", [str(response.stop_reason)])
+    usage = getattr(response, "usage", None)
+    for attribute, name in (
+        ("input_tokens", "gen_ai.usage.input_tokens"),
+        ("output_tokens", "gen_ai.usage.output_tokens"),
+        ("cache_read_input_tokens", "gen_ai.usage.cache_read_input_tokens"),
+        ("cache_creation_input_tokens", "gen_ai.usage.cache_creation_input_tokens"),
+    ):
+        tokens = getattr(usage, attribute, None)
+        if isinstance(tokens, int):
+            span.set_attribute(name, tokens)
+
+
+def _http_retries(stream: Any) -> int:
+    """Retries the Anthropic SDK made for this request (429s, 5xx, timeouts)."""
+    try:
+        count = stream.response.request.headers.get("x-stainless-retry-count")
+    except AttributeError:
+        return 0
+    return int(count) if isinstance(count, str) and count.isdigit() else 0
+
+
+def _source_chunk_ids(question: GeneratedQuestion, sources: list[int]) -> GeneratedQuestion:
+    """Translate prompt chunk ids into indices of the chunks passed in.
+
+    Ids that do not name a chunk in the prompt are dropped.
+    """
+    chunk_ids = []
+    for chunk_id in question.chunk_ids:
+        try:
+            index = int(chunk_id)
+        except ValueError:
+            index = -1
+        if 0 <= index < len(sources):
+            chunk_ids.append(str(sources[index]))
+        else:
+            logger.warning(f"Dropped unknown chunk id {chunk_id!r} from a generated question")
+    return question.model_copy(update={"chunk_ids": chunk_ids})
+
+
+def _salvage(partial_json: str, key: str, model: type) -> list:
+    """Validate the complete array elements of a truncated tool input."""
+    salvaged = []
+    for item in complete_array_items(partial_json, key):
+        try:
+            salvaged.append(model.model_validate(item))
+        except ValidationError:
+            continue
+    return salvaged
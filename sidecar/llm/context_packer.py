@@ -0,0 +1,102 @@
+from dataclasses import replace
+
+from rag.chunker import Chunk
+
+# Claude tokenizes Dutch prose at roughly 3.5 characters per token; erring on
+# the low side keeps the estimate conservative (it over-counts slightly).
+CHARS_PER_TOKEN = 3.5
+# Overlap between neighbouring chunks is at most CHUNK_OVERLAP (200 chars) or
+# TOKEN_OVERLAP (50 tokens); anything longer is not a chunker overlap.
+MAX_OVERLAP_CHARS = 1000
+MIN_OVERLAP_CHARS = 20
+
+# Output sizing for generate_questions
+OUTPUT_TOKENS_BASE = 256
+OUTPUT_TOKENS_PER_QUESTION = 350
+OUTPUT_TOKENS_PER_OPTION = 60
+MIN_OUTPUT_TOKENS = 1024
+MAX_OUTPUT_TOKENS = 16384
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the number of Claude tokens in a text."""
+    return int(len(text) / CHARS_PER_TOKEN) + 1
+
+
+def overlap_length(before: str, after: str) -> int:
+    """Length of the longest suffix of ``before`` that starts ``after``."""
+    tail = before[-MAX_OVERLAP_CHARS:]
+    for start in range(len(tail) - MIN_OVERLAP_CHARS + 1):
+        if after.startswith(tail[start:]):
+            return len(tail) - start
+    return 0
+
+
+def pack_context(chunks: list[Chunk], budget_tokens: int) -> list[Chunk]:
+    """Select the best chunks that fit in ``budget_tokens``.
+
+    See pack_context_indexed(); this returns the packed chunks only.
+    """
+    return [chunk for _, chunk in pack_context_indexed(chunks, budget_tokens)]
+
+
+def pack_context_indexed(
+    chunks: list[Chunk], budget_tokens: int
+) -> list[tuple[int, Chunk]]:
+    """Select the best chunks that fit in ``budget_tokens``.
+
+    Chunks are taken in order of score (retrieval order breaks ties; chunks
+    without a score keep their place after scored ones). When a chunk's
+    neighbour by position is already packed, the text they share through
+    chunking overlap is cut from the new chunk, so it is only sent once.
+    Chunks that do not fit are skipped in favour of smaller ones further
+    down; if even the best chunk is too large, it is truncated.
+
+    Returns (index in ``chunks``, packed chunk) pairs in packed order.
+    """
+    if budget_tokens <= 0:
+        return []
+
+    ranked = sorted(
+        enumerate(chunks),
+        key=lambda item: (item[1].score is None, -(item[1].score or 0.0), item[0]),
+    )
+
+    packed: dict[int, Chunk] = {}
+    order: list[tuple[int, int]] = []
+    remaining = budget_tokens
+    for index, chunk in ranked:
+        if chunk.position in packed:
+            continue
+        text = chunk.text
+        previous = packed.get(chunk.position - 1)
+        if previous is not None:
+            text = text[overlap_length(previous.text, text) :]
+        following = packed.get(chunk.position + 1)
+        if following is not None:
+            cut = overlap_length(text, following.text)
+            text = text[: len(text) - cut]
+        if not text.strip():
+            continue
+
+        cost = estimate_tokens(text)
+        if cost > remaining:
+            if packed:
+                continue
+            text = text[: int(remaining * CHARS_PER_TOKEN)]
+            cost = remaining
+        packed[chunk.position] = replace(chunk, text=text)
+        order.append((index, chunk.position))
+        remaining -= cost
+        if remaining <= 0:
+            break
+
+    return [(index, packed[p]) for index, p in order]
+
+
+def generation_max_tokens(count: int, num_options: int = 4) -> int:
+    """Size max_tokens for generating ``count`` questions."""
+    estimate = OUTPUT_TOKENS_BASE + count * (
+        OUTPUT_TOKENS_PER_QUESTION + num_options * OUTPUT_TOKENS_PER_OPTION
+    )
+    return max(MIN_OUTPUT_TOKENS, min(MAX_OUTPUT_TOKENS, estimate))
@@ -1,5 +1,9 @@
+import functools
 import os
 
+from config.settings import settings
+from llm.context_packer import estimate_tokens, pack_context_indexed
+
 SYSTEM_PROMPT_GENERATION = """Je bent een expert in het maken van multiple-choice toetsvragen voor het Nederlands hoger onderwijs.
 
 Je taak is om hoogwaardige MC-vragen te genereren op basis van het aangeleverde bronmateriaal. Elke vraag moet:
@@ -11,27 +15,59 @@ Je taak is om hoogwaardige MC-vragen te genereren op basis van het aangeleverde
 Gebruik de kwaliteitsregels als leidraad voor het maken van goede vragen."""
 
 
+@functools.lru_cache(maxsize=4)
+def _load_quality_rules(criteria_dir: str) -> tuple[str, ...]:
+    """Read the criteria files once per directory."""
+    quality_rules = []
+    for filename in ["technisch.md", "betrouwbaarheid.md", "validiteit.md"]:
+        filepath = os.path.join(criteria_dir, filename)
+        if os.path.exists(filepath):
+            with open(filepath, "r", encoding="utf-8") as f:
+                quality_rules.append(f.read())
+    return tuple(quality_rules)
+
+
 def build_generation_prompt(
     specification: dict,
     chunks: list,
     criteria_dir: str | None = None,
+    input_token_budget: int | None = None,
 ) -> list[dict]:
     """Build the 4-layer generation prompt.
 
+    The source material is packed into whatever is left of
+    ``input_token_budget`` (default: ``settings.generation_input_token_budget``)
+    after the fixed layers: best-scoring chunks first, chunk overlap removed.
+
     Returns a list of 2 dicts: [system_message, user_message].
     """
+    messages, _ = build_generation_prompt_with_sources(
+        specification, chunks, criteria_dir, input_token_budget
+    )
+    return messages
+
+
+def build_generation_prompt_with_sources(
+    specification: dict,
+    chunks: list,
+    criteria_dir: str | None = None,
+    input_token_budget: int | None = None,
+) -> tuple[list[dict], list[int]]:
+    """Build the generation prompt and map its chunk ids back to ``chunks``.
+
+    Packing reorders, deduplicates and drops chunks, so the id a chunk gets
+    in the prompt is not its index in ``chunks``. Returns the messages and,
+    per prompt chunk id, the index of its source in ``chunks``.
+    """
     if criteria_dir is None:
         criteria_dir = os.path.join(
             os.path.dirname(__file__), "..", "..", "criteria"
         )
+    if input_token_budget is None:
+        input_token_budget = settings.generation_input_token_budget
 
     # Load criteria files for quality rules
-    quality_rules = []
-    for filename in ["technisch.md", "betrouwbaarheid.md", "validiteit.md"]:
-        filepath = os.path.join(criteria_dir, filename)
-        if os.path.exists(filepath):
-            with open(filepath, "r", encoding="utf-8") as f:
-                quality_rules.append(f.read())
+    quality_rules = _load_quality_rules(os.path.normpath(criteria_dir))
 
     # Build specification XML
     spec_xml = f"""<specification>
@@ -41,6 +77,25 @@ def build_generation_prompt(
 <num_options>{specification.get('num_options', 4)}</num_options>
 </specification>"""
 
+    # Build quality rules XML
+    rules_xml = "<quality_rules>\n"
+    for rule in quality_rules:
+        rules_xml += rule + "\n\n"
+    rules_xml += "</quality_rules>"
+
+    instruction = f"""Genereer exact {specification.get('count', 5)} MC-vragen op Bloom-niveau "{specification.get('bloom_level', 'begrijpen')}" over het leerdoel: "{specification.get('learning_goal', '')}".
+
+Elke vraag moet {specification.get('num_options', 4)} antwoordopties hebben, waarvan precies 1 correct is.
+Verwijs in chunk_ids naar de chunk id's waarop de vraag is gebaseerd."""
+
+    # Fill the remaining input budget with source material
+    fixed_tokens = estimate_tokens(
+        SYSTEM_PROMPT_GENERATION + spec_xml + rules_xml + instruction
+    )
+    packed = pack_context_indexed(list(chunks), max(input_token_budget - fixed_tokens, 0))
+    sources = [index for index, _ in packed]
+    chunks = [chunk for _, chunk in packed]
+
     # Build source material XML with chunk references
     source_parts = ["<source_material>"]
     for i, chunk in enumerate(chunks):
@@ -51,24 +106,16 @@ def build_generation_prompt(
     source_parts.append("</source_material>")
     source_xml = "\n".join(source_parts)
 
-    # Build quality rules XML
-    rules_xml = "<quality_rules>\n"
-    for rule in quality_rules:
-        rules_xml += rule + "\n\n"
-    rules_xml += "</quality_rules>"
-
     user_content = f"""{spec_xml}
 
 {source_xml}
 
 {rules_xml}
 
-Genereer exact {specification.get('count', 5)} MC-vragen op Bloom-niveau "{specification.get('bloom_level', 'begrijpen')}" over het leerdoel: "{specification.get('learning_goal', '')}".
-
-Elke vraag moet {specification.get('num_options', 4)} antwoordopties hebben, waarvan precies 1 correct is.
-Verwijs in chunk_ids naar de chunk id's waarop de vraag is gebaseerd."""
+{instruction}"""
 
-    return [
+    messages = [
         {"role": "system", "content": SYSTEM_PROMPT_GENERATION},
         {"role": "user", "content": user_content},
     ]
+    return messages, sources
@@ -0,0 +1,108 @@
+from collections.abc import Mapping
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any
+
+from pydantic import BaseModel
+
+from llm.schemas import GenerationResult, RepairPlan, ValidationResult
+
+
+def _freeze(value: Any) -> Any:
+    """Recursively turn dicts into read-only mappings and lists into tuples."""
+    if isinstance(value, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+@dataclass(frozen=True)
+class RequestTemplate:
+    """The fixed part of a structured-output Messages API request.
+
+    The tool definition (including the pydantic JSON schema) and tool_choice
+    are built once and shared, read-only, by every call of the operation.
+    """
+
+    operation: str
+    tool_name: str
+    output_model: type[BaseModel]
+    max_tokens: int
+    temperature: float
+    tools: tuple[Mapping[str, Any], ...]
+    tool_choice: Mapping[str, Any]
+
+    @classmethod
+    def build(
+        cls,
+        operation: str,
+        tool_name: str,
+        description: str,
+        output_model: type[BaseModel],
+        max_tokens: int,
+        temperature: float,
+    ) -> "RequestTemplate":
+        return cls(
+            operation=operation,
+            tool_name=tool_name,
+            output_model=output_model,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            tools=_freeze(
+                [
+                    {
+                        "name": tool_name,
+                        "description": description,
+                        "input_schema": output_model.model_json_schema(),
+                    }
+                ]
+            ),
+            tool_choice=_freeze({"type": "tool", "name": tool_name}),
+        )
+
+    def request(
+        self,
+        model: str,
+        system: str,
+        user_message: str,
+        max_tokens: int | None = None,
+    ) -> dict[str, Any]:
+        """Keyword arguments for messages.create / messages.stream."""
+        return {
+            "model": model,
+            "max_tokens": max_tokens or self.max_tokens,
+            "temperature": self.temperature,
+            "system": system,
+            "messages": [{"role": "user", "content": user_message}],
+            "tools": self.tools,
+            "tool_choice": self.tool_choice,
+        }
+
+
+VALIDATION_TEMPLATE = RequestTemplate.build(
+    "validation",
+    "validation_result",
+    "Output the validation result for the MC question.",
+    ValidationResult,
+    max_tokens=2048,
+    temperature=0.0,
+)
+
+GENERATION_TEMPLATE = RequestTemplate.build(
+    "generation",
+    "generation_result",
+    "Output the generated MC questions.",
+    GenerationResult,
+    max_tokens=4096,
+    temperature=0.5,
+)
+
+REPAIR_TEMPLATE = RequestTemplate.build(
+    "repair",
+    "repair_plan",
+    "Output the repair plan with proposals for missing fields.",
+    RepairPlan,
+    max_tokens=4096,
+    temperature=0.3,
+)
@@ -0,0 +1,72 @@
+import json
+import re
+
+
+class ToolArrayStreamParser:
+    """Incrementally parse the elements of one array field in tool-use JSON.
+
+    Tool input arrives as ``input_json_delta`` fragments of a JSON document
+    such as ``{"questions": [{...}, {...}]}``. ``feed`` takes the next
+    fragment and returns the array elements that became complete with it,
+    so each can be processed before the rest of the document has arrived.
+    """
+
+    def __init__(self, key: str):
+        self._key_pattern = re.compile(rf'"{re.escape(key)}"\s*:\s*\[')
+        self._buffer = ""
+        self._pos = 0
+        self._in_array = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._item_start: int | None = None
+        self.done = False
+
+    def feed(self, fragment: str) -> list[dict]:
+        """Add a fragment; return the elements completed by it."""
+        self._buffer += fragment
+        if self.done:
+            return []
+
+        if not self._in_array:
+            match = self._key_pattern.search(self._buffer)
+            if match is None:
+                return []
+            self._in_array = True
+            self._pos = match.end()
+
+        items: list[dict] = []
+        buffer = self._buffer
+        for i in range(self._pos, len(buffer)):
+            ch = buffer[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+            if ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                if self._depth == 0:
+                    self._item_start = i
+                self._depth += 1
+            elif ch in "}]":
+                if self._depth == 0:
+                    # End of the array itself
+                    self.done = True
+                    self._pos = i + 1
+                    return items
+                self._depth -= 1
+                if self._depth == 0 and self._item_start is not None:
+                    items.append(json.loads(buffer[self._item_start : i + 1]))
+                    self._item_start = None
+        self._pos = len(buffer)
+        return items
+
+
+def complete_array_items(partial_json: str, key: str) -> list[dict]:
+    """Return the complete elements of ``key`` in possibly truncated JSON."""
+    return ToolArrayStreamParser(key).feed(partial_json)
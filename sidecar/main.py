@@ -1,19 +1,55 @@
 import asyncio
+import json
+import logging
+from collections.abc import AsyncIterator
+from functools import partial
 
-from fastapi import BackgroundTasks, FastAPI, File, HTTPException, UploadFile
+from fastapi import BackgroundTasks, FastAPI, File, HTTPException, Response, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
+from config.settings import settings
 from llm.client import LLMClient
+from llm.schemas import RepairPlan
+from observability.metrics import render as render_metrics
+from observability.profiling import ProfilingMiddleware
+from observability.tracing import configure_tracing, traced_job
 from parsers.csv_parser import parse_csv
 from parsers.docx_parser import parse_docx
 from parsers.schemas import ParsedQuestion
 from parsers.validation import ValidationResponse, validate_questions
 from parsers.xlsx_parser import parse_xlsx
+from services.admission import (
+    DEGRADE,
+    QUEUE,
+    REJECT,
+    admit_generation,
+    admit_repair,
+    admit_validation,
+    admitted,
+    fail_generation,
+    fail_validation,
+)
+from services.admission import controller as admission
+from services.batched_repair import invalid_results, iter_repair_batches, repair_batched
+from services.duplicate_index import (
+    BANK_WAIT_SECONDS,
+    check_near_duplicates,
+    question_banks,
+)
 from services.embedding_pipeline import run_embedding
 from services.generation_pipeline import run_generation
+from services.rule_repair import merge_plans, repair_with_rules
 from services.supabase_client import get_supabase_client
-from services.validation_pipeline import run_single_validation, run_validation
+from services.usage_ledger import usage_scope, usage_summary, usage_tagged
+from services.validation_pipeline import (
+    resume_validation,
+    run_single_validation,
+    run_validation,
+)
+
+logger = logging.getLogger(__name__)
 
 app = FastAPI(title="MC Toetsvalidatie Sidecar")
 
@@ -28,19 +64,35 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Opt-in cProfile dumps of slow requests (PROFILING_MODE)
+app.add_middleware(ProfilingMiddleware)
+
+# FastAPI's native telemetry opens a server span per request that continues
+# the caller's W3C traceparent; background pipelines join it via traced_job.
+configure_tracing()
+
 
 class ValidateRequest(BaseModel):
     questions: list[dict]
+    # Also compare with the question bank of the exam's owner
+    exam_id: str | None = None
 
 
 class RepairRequest(BaseModel):
     questions: list[dict]
     validation: dict
+    # Tags the LLM usage of the repair call
+    exam_id: str | None = None
+    # Stream proposals per batch as NDJSON
+    stream: bool = False
 
 
 class AnalyzeRequest(BaseModel):
     exam_id: str
     question_id: str | None = None
+    # Continue the latest unfinished validation run (or the given one)
+    resume: bool = False
+    run_id: str | None = None
 
 
 class EmbedRequest(BaseModel):
@@ -56,61 +108,237 @@ async def health():
     return {"status": "ok"}
 
 
+@app.get("/metrics")
+async def metrics():
+    """Stage latencies, LLM token usage and item counts for Prometheus."""
+    content, content_type = render_metrics()
+    return Response(content=content, media_type=content_type)
+
+
+@app.get("/usage")
+async def usage(exam_id: str | None = None, days: int = 30):
+    """LLM tokens, retries and estimated cost per day, exam and model."""
+    if not 1 <= days <= 366:
+        raise HTTPException(status_code=400, detail="days moet tussen 1 en 366 liggen")
+    return usage_summary(get_supabase_client(), exam_id=exam_id, days=days)
+
+
 @app.post("/analyze")
 async def analyze(request: AnalyzeRequest, background_tasks: BackgroundTasks):
     supabase = get_supabase_client()
     llm_client = LLMClient()
 
+    # Over budget, validation degrades to the deterministic layer only
+    decision = await asyncio.to_thread(
+        admit_validation, supabase, request.exam_id, request.question_id
+    )
+    deterministic_only = decision.action == DEGRADE
+
     if request.question_id:
-        background_tasks.add_task(
-            asyncio.run,
-            run_single_validation(
-                request.exam_id, request.question_id, supabase, llm_client
-            ),
+        name = "validation.single"
+        job = run_single_validation(
+            request.exam_id,
+            request.question_id,
+            supabase,
+            llm_client,
+            deterministic_only=deterministic_only,
         )
+        attributes = {"exam.id": request.exam_id, "question.id": request.question_id}
+        # Re-validating one question leaves the exam's status alone
+        on_timeout = None
+    elif request.resume or request.run_id:
+        name = "validation.resume"
+        job = resume_validation(
+            request.exam_id,
+            supabase,
+            llm_client,
+            run_id=request.run_id,
+            deterministic_only=deterministic_only,
+        )
+        attributes = {"exam.id": request.exam_id}
+        on_timeout = partial(fail_validation, supabase, request.exam_id)
     else:
-        background_tasks.add_task(
-            asyncio.run,
-            run_validation(request.exam_id, supabase, llm_client),
+        name = "validation.run"
+        job = run_validation(
+            request.exam_id, supabase, llm_client, deterministic_only=deterministic_only
         )
+        attributes = {"exam.id": request.exam_id}
+        on_timeout = partial(fail_validation, supabase, request.exam_id)
 
-    return {"status": "processing", "exam_id": request.exam_id}
+    background_tasks.add_task(
+        traced_job(
+            name,
+            usage_tagged(admitted(job, decision, on_timeout), exam_id=request.exam_id),
+            {**attributes, "admission.action": decision.action},
+        )
+    )
+    return {
+        "status": "queued" if decision.action == QUEUE else "processing",
+        "exam_id": request.exam_id,
+        "admission": decision.as_dict(),
+    }
 
 
 @app.post("/embed")
 async def embed(request: EmbedRequest, background_tasks: BackgroundTasks):
     background_tasks.add_task(
-        asyncio.run,
-        run_embedding(request.material_id),
+        traced_job(
+            "embedding.run",
+            run_embedding(request.material_id),
+            {"material.id": request.material_id},
+        )
     )
     return {"status": "processing", "material_id": request.material_id}
 
 
 @app.post("/generate")
 async def generate(request: GenerateRequest, background_tasks: BackgroundTasks):
+    supabase = get_supabase_client()
+    decision = await asyncio.to_thread(admit_generation, supabase, request.job_id)
+    if decision.action == REJECT:
+        raise HTTPException(status_code=429, detail=decision.reason)
+
     background_tasks.add_task(
-        asyncio.run,
-        run_generation(request.job_id),
+        traced_job(
+            "generation.run",
+            usage_tagged(
+                admitted(
+                    run_generation(request.job_id),
+                    decision,
+                    partial(fail_generation, supabase, request.job_id),
+                ),
+                job_id=request.job_id,
+            ),
+            {"generation_job.id": request.job_id, "admission.action": decision.action},
+        )
     )
-    return {"status": "processing", "job_id": request.job_id}
+    return {
+        "status": "queued" if decision.action == QUEUE else "processing",
+        "job_id": request.job_id,
+        "admission": decision.as_dict(),
+    }
 
 
 @app.post("/validate")
 async def validate(request: ValidateRequest) -> ValidationResponse:
-    """Validate parsed questions for completeness before saving."""
+    """Validate parsed questions for completeness before saving.
+
+    Near-duplicates within the upload are flagged as warnings; with an
+    exam_id the questions are also compared, lexically and semantically,
+    with the owner's question bank, if it is ready within BANK_WAIT_SECONDS.
+    """
     parsed = [ParsedQuestion.model_validate(q) for q in request.questions]
-    return validate_questions(parsed)
+    response = validate_questions(parsed)
+    bank = None
+    if request.exam_id:
+        try:
+            bank = await asyncio.wait_for(
+                question_banks.for_exam(get_supabase_client(), request.exam_id),
+                BANK_WAIT_SECONDS,
+            )
+        except TimeoutError:
+            logger.info(
+                f"Question bank of exam {request.exam_id} not ready, "
+                f"checking the upload only"
+            )
+        except Exception as e:
+            logger.warning(f"Question bank unavailable, checking the upload only: {e}")
+    return await check_near_duplicates(response, parsed, bank, request.exam_id)
 
 
 @app.post("/repair")
 async def repair(request: RepairRequest):
-    """Generate AI repair proposals for questions with missing fields."""
-    llm_client = LLMClient()
+    """Generate repair proposals for questions with missing fields.
+
+    Mechanical fixes (repeated IDs, asterisk-marked answers, categories of
+    neighbouring rows) are made by rules; the remaining invalid questions
+    are repaired by the LLM in concurrent batches. With ``stream`` the
+    response is NDJSON: one "proposals" (or "error") line for the rules and
+    per batch as it finishes, then a "done" line with the summary.
+    """
+    rules, remainder = repair_with_rules(request.questions, request.validation)
+    needs_llm = bool(invalid_results(remainder))
+
+    reservation = None
+    if needs_llm:
+        decision = await asyncio.to_thread(
+            admit_repair, request.questions, remainder, request.exam_id
+        )
+        if decision.action == REJECT:
+            raise HTTPException(status_code=429, detail=decision.reason)
+        acquired = await admission.wait(
+            decision.reservation, settings.admission_queue_timeout_seconds
+        )
+        if not acquired:
+            raise HTTPException(
+                status_code=503,
+                detail="Het taalmodel is op dit moment te druk. Probeer het later opnieuw.",
+            )
+        reservation = decision.reservation
+
+    if request.stream:
+        return StreamingResponse(
+            _stream_repair(request, rules, remainder, reservation),
+            media_type="application/x-ndjson",
+        )
+    if not needs_llm:
+        return rules.model_dump()
     try:
-        plan = llm_client.repair_questions(request.questions, request.validation)
-        return plan.model_dump()
+        with usage_scope(exam_id=request.exam_id):
+            plan = await repair_batched(LLMClient(), request.questions, remainder)
+        return merge_plans(rules, plan).model_dump()
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        admission.release(reservation)
+
+
+def _ndjson(line: dict) -> str:
+    return json.dumps(line, ensure_ascii=False) + "\n"
+
+
+async def _stream_repair(
+    request: RepairRequest, rules: RepairPlan, remainder: dict, reservation
+) -> AsyncIterator[str]:
+    proposals = len(rules.proposals)
+    summaries = [rules.summary] if rules.summary else []
+    covered = {(p.question_index, p.field) for p in rules.proposals}
+    try:
+        if rules.proposals:
+            yield _ndjson({
+                "type": "proposals",
+                "question_indices": sorted({p.question_index for p in rules.proposals}),
+                "proposals": [p.model_dump() for p in rules.proposals],
+            })
+        if reservation is not None:
+            with usage_scope(exam_id=request.exam_id):
+                async for batch, result in iter_repair_batches(
+                    LLMClient(), request.questions, remainder
+                ):
+                    indices = [r["question_index"] for r in batch]
+                    if isinstance(result, Exception):
+                        yield _ndjson(
+                            {"type": "error", "question_indices": indices, "detail": str(result)}
+                        )
+                        continue
+                    batch_proposals = [
+                        p for p in result.proposals
+                        if (p.question_index, p.field) not in covered
+                    ]
+                    proposals += len(batch_proposals)
+                    if result.summary:
+                        summaries.append(result.summary)
+                    yield _ndjson({
+                        "type": "proposals",
+                        "question_indices": indices,
+                        "proposals": [p.model_dump() for p in batch_proposals],
+                    })
+        yield _ndjson(
+            {"type": "done", "summary": " ".join(summaries), "proposal_count": proposals}
+        )
+    finally:
+        if reservation is not None:
+            admission.release(reservation)
 
 
 @app.post("/parse")
@@ -0,0 +1,112 @@
+import time
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+from typing import Any
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest
+
+from observability.tracing import tracer
+
+# Stages run from milliseconds (deterministic analysis) to minutes (embedding)
+STAGE_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300,
+)
+
+STAGE_SECONDS = Histogram(
+    "sidecar_stage_duration_seconds",
+    "Duration of a pipeline stage",
+    ["pipeline", "stage"],
+    buckets=STAGE_BUCKETS,
+)
+STAGE_ERRORS = Counter(
+    "sidecar_stage_errors_total",
+    "Pipeline stages that raised an exception",
+    ["pipeline", "stage"],
+)
+LLM_CALLS = Counter(
+    "sidecar_llm_calls_total",
+    "Messages API calls by operation, model and stop reason",
+    ["operation", "model", "stop_reason"],
+)
+LLM_TOKENS = Counter(
+    "sidecar_llm_tokens_total",
+    "Tokens reported in response.usage",
+    ["operation", "model", "kind"],
+)
+ITEMS = Counter(
+    "sidecar_items_processed_total",
+    "Items processed by a pipeline (questions, pages, chunks)",
+    ["pipeline", "item"],
+)
+
+# response.usage attribute -> "kind" label
+_USAGE_KINDS = {
+    "input_tokens": "input",
+    "output_tokens": "output",
+    "cache_read_input_tokens": "cache_read",
+    "cache_creation_input_tokens": "cache_creation",
+}
+
+
+@contextmanager
+def stage(pipeline: str, name: str) -> Iterator[None]:
+    """Time a block as one observation of the ``pipeline``/``name`` stage.
+
+    The block also runs in a ``pipeline.name`` span, so the same stages make
+    up the trace of a request.
+    """
+    start = time.perf_counter()
+    with tracer.start_as_current_span(f"{pipeline}.{name}"):
+        try:
+            yield
+        except BaseException:
+            STAGE_ERRORS.labels(pipeline, name).inc()
+            raise
+        finally:
+            STAGE_SECONDS.labels(pipeline, name).observe(time.perf_counter() - start)
+
+
+def observe_stage(pipeline: str, name: str, seconds: float) -> None:
+    STAGE_SECONDS.labels(pipeline, name).observe(max(seconds, 0.0))
+
+
+class IterTimer:
+    """Accumulate the time spent producing items of a (lazy) iterable.
+
+    Useful for generator stages that interleave with their consumers, such
+    as extraction and chunking in the streaming embedding pipeline.
+    """
+
+    def __init__(self) -> None:
+        self.seconds = 0.0
+        self.count = 0
+
+    def wrap(self, iterable: Iterable) -> Iterator:
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.seconds += time.perf_counter() - start
+                return
+            self.seconds += time.perf_counter() - start
+            self.count += 1
+            yield item
+
+
+def record_llm_response(operation: str, model: str, response: Any) -> None:
+    """Count a Messages API response and the tokens in its usage block."""
+    LLM_CALLS.labels(operation, model, str(response.stop_reason)).inc()
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return
+    for attribute, kind in _USAGE_KINDS.items():
+        tokens = getattr(usage, attribute, None)
+        if isinstance(tokens, int) and tokens:
+            LLM_TOKENS.labels(operation, model, kind).inc(tokens)
+
+
+def render() -> tuple[bytes, str]:
+    """Current metrics in the Prometheus text format, with its content type."""
+    return generate_latest(), CONTENT_TYPE_LATEST
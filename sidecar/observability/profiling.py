@@ -0,0 +1,88 @@
+import cProfile
+import logging
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Request header that asks for a profile when PROFILING_MODE is "header"
+PROFILE_HEADER = b"x-profile"
+
+# cProfile hooks the whole thread, so only one request is profiled at a time
+_profiler_lock = threading.Lock()
+
+
+def _wants_profile(scope: Scope) -> bool:
+    mode = settings.profiling_mode
+    if mode == "all":
+        return True
+    if mode == "header":
+        headers = dict(scope.get("headers") or [])
+        return headers.get(PROFILE_HEADER, b"").lower() in (b"1", b"true")
+    return False
+
+
+def _profile_path(scope: Scope, seconds: float) -> Path:
+    slug = re.sub(r"[^A-Za-z0-9]+", "_", scope.get("path", "")).strip("_") or "root"
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+    name = f"{stamp}-{scope.get('method', 'GET')}-{slug}-{seconds * 1000:.0f}ms.prof"
+    return Path(settings.profiling_dir) / name
+
+
+class ProfilingMiddleware:
+    """Profile requests with cProfile and dump the slow ones to disk.
+
+    Off unless PROFILING_MODE is "all" (every request) or "header" (requests
+    sending ``X-Profile: 1``). Profiles of requests that take at least
+    PROFILING_MIN_SECONDS are written as pstats files to PROFILING_DIR; open
+    them with ``python -m pstats`` or snakeviz.
+
+    The profiler sees everything on the event loop thread while the request
+    is in flight, including other requests interleaved with it. Work moved to
+    the thread pool (sync endpoints, background jobs) is not captured.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            scope["type"] != "http"
+            or not _wants_profile(scope)
+            or not _profiler_lock.acquire(blocking=False)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        profiler.enable()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            profiler.disable()
+            _profiler_lock.release()
+            seconds = time.perf_counter() - start
+            if seconds >= settings.profiling_min_seconds:
+                self._dump(profiler, scope, seconds)
+
+    @staticmethod
+    def _dump(profiler: cProfile.Profile, scope: Scope, seconds: float) -> None:
+        path = _profile_path(scope, seconds)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            profiler.dump_stats(path)
+        except OSError as e:
+            logger.warning(f"Could not write profile to {path}: {e}")
+            return
+        logger.info(
+            f"Profiled {scope.get('method')} {scope.get('path')} "
+            f"({seconds:.3f}s): {path}"
+        )
@@ -0,0 +1,151 @@
+import base64
+import json
+import logging
+import threading
+from collections.abc import Awaitable, Callable, Coroutine, Mapping, Sequence
+from typing import Any
+
+from google.protobuf.json_format import MessageToDict
+from opentelemetry import context, propagate, trace
+from opentelemetry.exporter.otlp.proto.common.trace_encoder import encode_spans
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import ReadableSpan, TracerProvider
+from opentelemetry.sdk.trace.export import (
+    BatchSpanProcessor,
+    ConsoleSpanExporter,
+    SpanExporter,
+    SpanExportResult,
+)
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = "mc-toetsgenerator-sidecar"
+# OTLP/JSON encodes these ids as hex strings, protobuf's JSON mapping as base64
+_HEX_ID_FIELDS = {"traceId", "spanId", "parentSpanId"}
+
+tracer = trace.get_tracer("sidecar")
+
+_provider: TracerProvider | None = None
+_provider_lock = threading.Lock()
+
+
+class OTLPFileSpanExporter(SpanExporter):
+    """Append spans to a file as OTLP/JSON, one export request per line.
+
+    This is the format read by the collector's ``otlpjsonfile`` receiver, so
+    traces recorded locally can be replayed into any backend later.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, spans: Sequence[ReadableSpan]) -> SpanExportResult:
+        request = MessageToDict(encode_spans(spans), use_integers_for_enums=True)
+        line = json.dumps(_hex_ids(request), separators=(",", ":"))
+        try:
+            with self._lock, open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+        except OSError as e:
+            logger.warning(f"Could not write spans to {self.path}: {e}")
+            return SpanExportResult.FAILURE
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self) -> None:
+        pass
+
+
+def _hex_ids(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {
+            k: (
+                base64.b64decode(v).hex()
+                if k in _HEX_ID_FIELDS and isinstance(v, str)
+                else _hex_ids(v)
+            )
+            for k, v in value.items()
+        }
+    if isinstance(value, list):
+        return [_hex_ids(v) for v in value]
+    return value
+
+
+def _exporter(name: str) -> SpanExporter:
+    if name == "console":
+        return ConsoleSpanExporter()
+    if name == "otlp_file":
+        return OTLPFileSpanExporter(settings.tracing_file_path)
+    if name == "otlp":
+        # Endpoint and headers come from the standard OTEL_EXPORTER_OTLP_* env vars
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import (
+            OTLPSpanExporter,
+        )
+
+        return OTLPSpanExporter()
+    raise ValueError(f"Unknown tracing exporter: {name!r}")
+
+
+def tracer_provider() -> TracerProvider:
+    """The process-wide SDK tracer provider, installed on first use."""
+    global _provider
+    with _provider_lock:
+        if _provider is None:
+            _provider = TracerProvider(
+                resource=Resource.create({"service.name": SERVICE_NAME})
+            )
+            trace.set_tracer_provider(_provider)
+        return _provider
+
+
+def configure_tracing(exporter: str | None = None) -> bool:
+    """Install the tracer provider and exporter named in settings.
+
+    ``exporter`` is one of "console", "otlp_file" or "otlp"; empty disables
+    tracing. Outgoing httpx requests (Supabase PostgREST and Storage) get a
+    client span each and carry the trace context.
+    """
+    exporter = settings.tracing_exporter if exporter is None else exporter
+    if not exporter:
+        return False
+
+    tracer_provider().add_span_processor(BatchSpanProcessor(_exporter(exporter)))
+
+    from opentelemetry.instrumentation.httpx import HTTPXClientInstrumentor
+
+    instrumentor = HTTPXClientInstrumentor()
+    if not instrumentor.is_instrumented_by_opentelemetry:
+        instrumentor.instrument()
+    logger.info(f"Tracing enabled with the {exporter} exporter")
+    return True
+
+
+def extract_context(headers: Mapping[str, str]) -> context.Context:
+    """Trace context from incoming W3C ``traceparent``/``tracestate`` headers."""
+    return propagate.extract(headers)
+
+
+def traced_job(
+    name: str,
+    coro: Coroutine[Any, Any, Any],
+    attributes: Mapping[str, Any] | None = None,
+) -> Callable[[], Awaitable[None]]:
+    """Wrap a pipeline coroutine for BackgroundTasks under the current trace.
+
+    The trace context is captured now, while the request span is active, so
+    the background run shows up in the caller's trace even though it starts
+    after the response has been sent. The wrapper is async, so the job runs
+    on the app's event loop rather than in a threadpool with its own loop.
+    """
+    parent = context.get_current()
+
+    async def run() -> None:
+        token = context.attach(parent)
+        try:
+            with tracer.start_as_current_span(name, attributes=dict(attributes or {})):
+                await coro
+        finally:
+            context.detach(token)
+
+    return run
@@ -1,8 +1,6 @@
 import re
 
-from docx import Document
-from docx.text.paragraph import Paragraph
-
+from .docx_xml import DocxParagraph, iter_paragraphs
 from .schemas import ParsedOption, ParsedQuestion
 
 # Pattern to match question numbers like "1." or "1)" or "Vraag 1:"
@@ -12,16 +10,16 @@ QUESTION_PATTERN = re.compile(r"^(?:Vraag\s+)?\d+[.):\s]")
 OPTION_PATTERN = re.compile(r"^([A-Da-d])[.)]\s*(.*)")
 
 
-def _is_bold(paragraph: Paragraph) -> bool:
+def _is_bold(paragraph: DocxParagraph) -> bool:
     """Check if the entire paragraph is bold."""
     if not paragraph.runs:
         return False
-    return all(run.bold for run in paragraph.runs if run.text.strip())
+    return all(bold for text, bold in paragraph.runs if text.strip())
 
 
-def _has_bold_runs(paragraph: Paragraph) -> bool:
+def _has_bold_runs(paragraph: DocxParagraph) -> bool:
     """Check if the paragraph contains any bold runs."""
-    return any(run.bold and run.text.strip() for run in paragraph.runs)
+    return any(bold and text.strip() for text, bold in paragraph.runs)
 
 
 def _text_has_asterisk(text: str) -> bool:
@@ -48,33 +46,35 @@ def parse_docx(content: bytes) -> list[ParsedQuestion]:
     Correct answer can be marked with:
     - Asterisk (*) at end of option text
     - Bold formatting on the option
-    """
-    import io
 
-    doc = Document(io.BytesIO(content))
+    Paragraphs are streamed from word/document.xml (see docx_xml) rather
+    than loaded into a python-docx Document.
+    """
 
     questions: list[ParsedQuestion] = []
     current_stem: str | None = None
-    current_options: list[tuple[str, str, bool]] = []  # (label, text, is_correct)
+    # (label, text, is_correct, marked_with)
+    current_options: list[tuple[str, str, bool, str | None]] = []
 
     def _flush_question():
         nonlocal current_stem, current_options
         if current_stem and current_options:
             # If no correct answer was marked, default to first option
-            has_correct = any(c for _, _, c in current_options)
+            has_correct = any(c for _, _, c, _ in current_options)
             options = [
                 ParsedOption(
                     text=text,
                     position=i,
                     is_correct=is_correct if has_correct else (i == 0),
+                    marked_with=marked_with,
                 )
-                for i, (_, text, is_correct) in enumerate(current_options)
+                for i, (_, text, is_correct, marked_with) in enumerate(current_options)
             ]
             questions.append(ParsedQuestion(stem=current_stem, options=options))
         current_stem = None
         current_options = []
 
-    for para in doc.paragraphs:
+    for para in iter_paragraphs(content):
         text = para.text.strip()
         if not text:
             continue
@@ -93,13 +93,14 @@ def parse_docx(content: bytes) -> list[ParsedQuestion]:
             label = option_match.group(1).upper()
             option_text = option_match.group(2).strip()
 
-            is_correct = (
-                _text_has_asterisk(option_text)
-                or _is_bold(para)
-                or _has_bold_runs(para)
-            )
+            if _text_has_asterisk(option_text):
+                marked_with = "asterisk"
+            elif _is_bold(para) or _has_bold_runs(para):
+                marked_with = "bold"
+            else:
+                marked_with = None
             option_text = _clean_text(option_text)
-            current_options.append((label, option_text, is_correct))
+            current_options.append((label, option_text, marked_with is not None, marked_with))
             continue
 
         # If we have a current stem and no option match, this might be
@@ -0,0 +1,124 @@
+import io
+import posixpath
+import zipfile
+from collections.abc import Iterator
+from dataclasses import dataclass
+
+from lxml import etree
+
+W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_RELATIONSHIPS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+_CONTENT_TYPES = "{http://schemas.openxmlformats.org/package/2006/content-types}"
+_OFFICE_DOCUMENT = "/officeDocument"
+_DOCUMENT_MAIN = "application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"
+
+# Text equivalents of run content other than w:t, as in python-docx
+_BREAKS = {f"{W}tab": "\t", f"{W}ptab": "\t", f"{W}cr": "\n", f"{W}noBreakHyphen": "-"}
+
+
+@dataclass
+class DocxParagraph:
+    """Text of a body paragraph and the (text, bold) of its direct runs.
+
+    ``text`` includes hyperlink text; ``runs`` only the paragraph's own
+    w:r children, matching python-docx's Paragraph.text and Paragraph.runs.
+    ``bold`` is None when the run does not set it.
+    """
+
+    text: str
+    runs: list[tuple[str, bool | None]]
+
+
+def _read_xml(archive: zipfile.ZipFile, name: str):
+    return etree.fromstring(archive.read(name), etree.XMLParser(resolve_entities=False))
+
+
+def _main_part(archive: zipfile.ZipFile) -> str:
+    """Path of the main document part, checked to be a Word document."""
+    rels = _read_xml(archive, "_rels/.rels")
+    target = next(
+        (
+            rel.get("Target")
+            for rel in rels.iter(f"{_RELATIONSHIPS}Relationship")
+            if rel.get("Type", "").endswith(_OFFICE_DOCUMENT)
+        ),
+        None,
+    )
+    if target is None:
+        raise ValueError("Bestand is geen Word-document")
+    part = posixpath.normpath(target.lstrip("/"))
+
+    types = _read_xml(archive, "[Content_Types].xml")
+    content_type = next(
+        (
+            o.get("ContentType")
+            for o in types.iter(f"{_CONTENT_TYPES}Override")
+            if o.get("PartName", "").lstrip("/") == part
+        ),
+        None,
+    )
+    if content_type != _DOCUMENT_MAIN:
+        raise ValueError(f"Bestand is geen Word-document (inhoudstype {content_type})")
+    return part
+
+
+def _run_text(run) -> str:
+    parts = []
+    for child in run:
+        if child.tag == f"{W}t":
+            parts.append(child.text or "")
+        elif child.tag == f"{W}br":
+            if child.get(f"{W}type", "textWrapping") == "textWrapping":
+                parts.append("\n")
+        elif child.tag in _BREAKS:
+            parts.append(_BREAKS[child.tag])
+    return "".join(parts)
+
+
+def _run_bold(run) -> bool | None:
+    properties = run.find(f"{W}rPr")
+    bold = properties.find(f"{W}b") if properties is not None else None
+    if bold is None:
+        return None
+    return bold.get(f"{W}val", "true") in ("1", "true", "on")
+
+
+def _paragraph(p) -> DocxParagraph:
+    texts: list[str] = []
+    runs: list[tuple[str, bool | None]] = []
+    for child in p:
+        if child.tag == f"{W}r":
+            text = _run_text(child)
+            texts.append(text)
+            runs.append((text, _run_bold(child)))
+        elif child.tag == f"{W}hyperlink":
+            texts.extend(_run_text(r) for r in child.iterchildren(f"{W}r"))
+    return DocxParagraph("".join(texts), runs)
+
+
+def iter_paragraphs(content: bytes) -> Iterator[DocxParagraph]:
+    """Stream the body paragraphs of a DOCX file, in document order.
+
+    Parses word/document.xml incrementally instead of building python-docx's
+    object model, and drops each body element once it has been read, so
+    memory stays flat on long documents. Like python-docx's
+    Document.paragraphs, paragraphs in tables and content controls are
+    skipped.
+    """
+    with zipfile.ZipFile(io.BytesIO(content)) as archive:
+        part = _main_part(archive)
+        with archive.open(part) as xml:
+            for _, element in etree.iterparse(
+                xml,
+                events=("end",),
+                tag=f"{W}p",
+                remove_blank_text=True,
+                resolve_entities=False,
+            ):
+                parent = element.getparent()
+                if parent is None or parent.tag != f"{W}body":
+                    continue
+                yield _paragraph(element)
+                element.clear()
+                while element.getprevious() is not None:
+                    del parent[0]
@@ -5,6 +5,8 @@ class ParsedOption(BaseModel):
     text: str
     position: int
     is_correct: bool
+    # How the source file marked the option as correct ("asterisk" or "bold")
+    marked_with: str | None = None
 
 
 class ParsedQuestion(BaseModel):
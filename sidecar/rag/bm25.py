@@ -0,0 +1,119 @@
+import math
+import re
+from collections import Counter, defaultdict
+
+import numpy as np
+
+from rag.chunker import Chunk
+
+# Words, numbers and compound identifiers such as "7:658", "art.3" or "e-learning"
+TOKEN_PATTERN = re.compile(r"\w+(?:[.:/-]\w+)*")
+
+DUTCH_STOPWORDS = frozenset(
+    """
+    aan al als bij dan dat de der deze die dit doch door een en er haar hem
+    het hier hij hoe hun ik in is je kan kon maar me meer men met mij na naar
+    niet nog nu of om omdat ons ook op over te tegen tot u uit van veel voor
+    want was wat we wel werd wie wij word wordt worden zal ze zich zij zijn zo
+    zonder zou
+    """.split()
+)
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+RRF_K = 60
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercase terms for BM25; compound identifiers also yield their parts."""
+    terms: list[str] = []
+    for match in TOKEN_PATTERN.finditer(text.lower()):
+        token = match.group()
+        if token in DUTCH_STOPWORDS:
+            continue
+        terms.append(token)
+        if not token.isalnum():
+            terms.extend(
+                part
+                for part in re.split(r"[.:/-]", token)
+                if part and part not in DUTCH_STOPWORDS
+            )
+    return terms
+
+
+class BM25Index:
+    """Okapi BM25 over a fixed list of documents (inverted index in NumPy)."""
+
+    def __init__(self, documents: list[str], k1: float = BM25_K1, b: float = BM25_B):
+        self.k1 = k1
+        self.b = b
+        self.size = len(documents)
+
+        doc_ids: dict[str, list[int]] = defaultdict(list)
+        term_freqs: dict[str, list[int]] = defaultdict(list)
+        lengths = np.zeros(self.size, dtype=np.float32)
+        for doc_id, text in enumerate(documents):
+            counts = Counter(tokenize(text))
+            lengths[doc_id] = sum(counts.values())
+            for term, tf in counts.items():
+                doc_ids[term].append(doc_id)
+                term_freqs[term].append(tf)
+
+        avg_length = float(lengths.mean()) if self.size and lengths.mean() > 0 else 1.0
+        self._length_norm = k1 * (1 - b + b * lengths / avg_length)
+        self._postings = {
+            term: (
+                np.array(ids, dtype=np.int32),
+                np.array(term_freqs[term], dtype=np.float32),
+                math.log(1 + (self.size - len(ids) + 0.5) / (len(ids) + 0.5)),
+            )
+            for term, ids in doc_ids.items()
+        }
+
+    def search(self, query: str, top_k: int) -> list[tuple[int, float]]:
+        """Return (document index, score) pairs for the best top_k matches."""
+        scores = np.zeros(self.size, dtype=np.float32)
+        for term in set(tokenize(query)):
+            posting = self._postings.get(term)
+            if posting is None:
+                continue
+            ids, tfs, idf = posting
+            scores[ids] += idf * tfs * (self.k1 + 1) / (tfs + self._length_norm[ids])
+
+        matched = np.flatnonzero(scores)
+        if not len(matched) or top_k < 1:
+            return []
+        k = min(top_k, len(matched))
+        top = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        top = top[np.argsort(-scores[top])]
+        return [(int(i), float(scores[i])) for i in top]
+
+
+def reciprocal_rank_fusion(
+    rankings: list[list[Chunk]],
+    top_k: int,
+    k: int = RRF_K,
+) -> list[Chunk]:
+    """Fuse ranked chunk lists with RRF: score = sum(1 / (k + rank)).
+
+    Chunks are identified by position within the material. The returned
+    chunks carry the fused score.
+    """
+    fused: dict[int, float] = defaultdict(float)
+    first_seen: dict[int, Chunk] = {}
+    for ranking in rankings:
+        for rank, chunk in enumerate(ranking, start=1):
+            fused[chunk.position] += 1.0 / (k + rank)
+            first_seen.setdefault(chunk.position, chunk)
+
+    best = sorted(fused, key=fused.__getitem__, reverse=True)[:top_k]
+    return [
+        Chunk(
+            text=first_seen[p].text,
+            position=p,
+            page=first_seen[p].page,
+            metadata=first_seen[p].metadata,
+            score=fused[p],
+        )
+        for p in best
+    ]
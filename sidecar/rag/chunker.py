@@ -1,3 +1,6 @@
+import re
+from bisect import bisect_left, bisect_right
+from collections.abc import Iterable, Iterator
 from dataclasses import dataclass, field
 
 
@@ -7,12 +10,43 @@ class Chunk:
     position: int
     page: int | None = None
     metadata: dict = field(default_factory=dict)
+    # Relevance score assigned by retrieval (cosine similarity or fused rank)
+    score: float | None = None
 
 
 # ~500 tokens ≈ 2000 characters; overlap ~50 tokens ≈ 200 characters
 CHUNK_SIZE = 2000
 CHUNK_OVERLAP = 200
 
+# Token-budgeted chunking (see chunk_text_by_tokens)
+TOKEN_OVERLAP = 50
+# Bump whenever chunk boundaries change (cutting rules, overlap, budget), so
+# materials.chunks_embedded markers from an older chunker are not resumed
+CHUNKER_VERSION = 2
+
+# Preferred cut points, strongest first: paragraph, sentence, line, word
+_BOUNDARY_PATTERNS = [
+    re.compile(r"\n\s*\n"),
+    re.compile(r"[.!?][\"')\]]*\s"),
+    re.compile(r"\n"),
+    re.compile(r"\s"),
+]
+
+
+@dataclass
+class TokenChunkStats:
+    """Counters collected while chunking by token budget."""
+
+    chunks: int = 0
+    tokens: int = 0
+    max_chunk_tokens: int = 0
+    # Diagnostic, off by default since it tokenizes every text twice: also
+    # chunk the text with chunk_text() and count how many of those chunks
+    # exceed the token budget and would be truncated by the encoder
+    compare_char_chunks: bool = False
+    char_chunks: int = 0
+    char_chunks_truncated: int = 0
+
 
 def chunk_text(
     text: str,
@@ -66,6 +100,31 @@ def chunk_text(
     return chunks
 
 
+def iter_page_chunks(
+    pages: Iterable,  # Iterable[PageText]
+    metadata: dict | None = None,
+    chunk_size: int = CHUNK_SIZE,
+    chunk_overlap: int = CHUNK_OVERLAP,
+) -> Iterator[Chunk]:
+    """Lazily chunk PageText objects, preserving page numbers.
+
+    Pages are consumed one at a time, so this can be fed straight from a
+    streaming extractor.
+    """
+    meta = metadata or {}
+    position = 0
+
+    for page in pages:
+        page_chunks = chunk_text(
+            page.text, metadata=meta, chunk_size=chunk_size, chunk_overlap=chunk_overlap
+        )
+        for chunk in page_chunks:
+            chunk.page = page.page_number
+            chunk.position = position
+            position += 1
+            yield chunk
+
+
 def chunk_pages(
     pages: list,  # list[PageText]
     metadata: dict | None = None,
@@ -73,18 +132,128 @@ def chunk_pages(
     chunk_overlap: int = CHUNK_OVERLAP,
 ) -> list[Chunk]:
     """Chunk a list of PageText objects, preserving page numbers."""
+    return list(
+        iter_page_chunks(
+            pages,
+            metadata=metadata,
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+        )
+    )
+
+
+def _boundary_positions(text: str) -> list[list[int]]:
+    """Character offsets right after each boundary, per boundary strength."""
+    return [[m.end() for m in pattern.finditer(text)] for pattern in _BOUNDARY_PATTERNS]
+
+
+def _cut_position(
+    boundaries: list[list[int]], lower: int, upper: int
+) -> int | None:
+    """Return the strongest boundary in (lower, upper], preferring the latest."""
+    for positions in boundaries:
+        i = bisect_right(positions, upper)
+        if i and positions[i - 1] > lower:
+            return positions[i - 1]
+    return None
+
+
+def chunk_text_by_tokens(
+    text: str,
+    tokenizer,
+    max_tokens: int,
+    overlap_tokens: int = TOKEN_OVERLAP,
+    metadata: dict | None = None,
+    stats: TokenChunkStats | None = None,
+) -> list[Chunk]:
+    """Split text into chunks of at most ``max_tokens`` tokens.
+
+    The whole text is tokenized once and the tokenizer's offset mapping is
+    used to translate token limits into character positions. Within each
+    window the cut is moved back to the last paragraph, sentence, line or
+    word boundary, as long as that keeps at least half of the budget.
+
+    Args:
+        text: The text to chunk (typically one page).
+        tokenizer: A Hugging Face fast tokenizer (offset mapping support).
+        max_tokens: Token budget per chunk, excluding special/prefix tokens.
+        overlap_tokens: Number of tokens repeated at the start of the next chunk.
+        metadata: Metadata attached to every chunk.
+        stats: Optional counters to update. With ``compare_char_chunks``
+            set, also counts how many chunks of the character-based chunker
+            would have exceeded the budget.
+    """
+    if not text.strip():
+        return []
+
+    meta = metadata or {}
+    encoding = tokenizer(
+        text, add_special_tokens=False, return_offsets_mapping=True
+    )
+    offsets = [(s, e) for s, e in encoding["offset_mapping"] if e > s]
+    token_starts = [s for s, _ in offsets]
+    boundaries = _boundary_positions(text)
+    overlap = min(overlap_tokens, max_tokens // 2)
+
+    chunks: list[Chunk] = []
+    start_tok = 0
+    while start_tok < len(offsets):
+        end_tok = min(start_tok + max_tokens, len(offsets))
+
+        if end_tok < len(offsets):
+            lower = offsets[start_tok + max_tokens // 2][0]
+            cut = _cut_position(boundaries, lower, offsets[end_tok][0])
+            if cut is not None:
+                end_tok = bisect_left(token_starts, cut, lo=start_tok + 1, hi=end_tok)
+
+        chunk_content = text[offsets[start_tok][0] : offsets[end_tok - 1][1]].strip()
+        if chunk_content:
+            chunks.append(
+                Chunk(text=chunk_content, position=len(chunks), metadata=meta)
+            )
+            if stats is not None:
+                stats.chunks += 1
+                stats.tokens += end_tok - start_tok
+                stats.max_chunk_tokens = max(stats.max_chunk_tokens, end_tok - start_tok)
+
+        if end_tok >= len(offsets):
+            break
+        start_tok = max(start_tok + 1, end_tok - overlap)
+
+    if stats is not None and stats.compare_char_chunks:
+        char_chunks = chunk_text(text)
+        lengths = tokenizer(
+            [c.text for c in char_chunks], add_special_tokens=False
+        )["input_ids"]
+        stats.char_chunks += len(char_chunks)
+        stats.char_chunks_truncated += sum(1 for ids in lengths if len(ids) > max_tokens)
+
+    return chunks
+
+
+def iter_page_chunks_by_tokens(
+    pages: Iterable,  # Iterable[PageText]
+    tokenizer,
+    max_tokens: int,
+    overlap_tokens: int = TOKEN_OVERLAP,
+    metadata: dict | None = None,
+    stats: TokenChunkStats | None = None,
+) -> Iterator[Chunk]:
+    """Lazily chunk PageText objects by token budget, preserving page numbers."""
     meta = metadata or {}
-    all_chunks: list[Chunk] = []
     position = 0
 
     for page in pages:
-        page_chunks = chunk_text(
-            page.text, metadata=meta, chunk_size=chunk_size, chunk_overlap=chunk_overlap
+        page_chunks = chunk_text_by_tokens(
+            page.text,
+            tokenizer,
+            max_tokens,
+            overlap_tokens=overlap_tokens,
+            metadata=meta,
+            stats=stats,
         )
         for chunk in page_chunks:
             chunk.page = page.page_number
             chunk.position = position
             position += 1
-            all_chunks.append(chunk)
-
-    return all_chunks
+            yield chunk
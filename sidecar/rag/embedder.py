@@ -1,8 +1,15 @@
+import asyncio
+
+import numpy as np
 from sentence_transformers import SentenceTransformer
 
 MODEL_NAME = "intfloat/multilingual-e5-base"
 EMBEDDING_DIMENSIONS = 768
 BATCH_SIZE = 100
+# E5 truncates everything beyond 512 tokens, including prefix and specials
+MAX_SEQ_TOKENS = 512
+PASSAGE_PREFIX = "passage: "
+QUERY_PREFIX = "query: "
 
 # Load model once at module level (cached across requests)
 _model: SentenceTransformer | None = None
@@ -15,20 +22,63 @@ def _get_model() -> SentenceTransformer:
     return _model
 
 
-async def embed_chunks(texts: list[str]) -> list[list[float]]:
+def get_tokenizer():
+    """Return the (fast) tokenizer of the embedding model."""
+    return _get_model().tokenizer
+
+
+def passage_token_budget(tokenizer=None) -> int:
+    """Number of tokens left for passage text within E5's sequence limit."""
+    tokenizer = tokenizer or get_tokenizer()
+    prefix_tokens = tokenizer(PASSAGE_PREFIX, add_special_tokens=False)["input_ids"]
+    return MAX_SEQ_TOKENS - tokenizer.num_special_tokens_to_add() - len(prefix_tokens)
+
+
+async def embed_chunks(texts: list[str]) -> np.ndarray:
     """Generate embeddings using multilingual-e5-base (in-container).
 
     The E5 model expects "passage: " prefix for documents.
-    Returns a list of 768-dimensional float vectors.
+    Returns a contiguous (len(texts), 768) float32 array.
+    """
+    model = _get_model()
+    prefixed = [f"{PASSAGE_PREFIX}{t}" for t in texts]
+    embeddings = model.encode(
+        prefixed,
+        batch_size=BATCH_SIZE,
+        normalize_embeddings=True,
+        convert_to_numpy=True,
+    )
+    return np.ascontiguousarray(embeddings, dtype=np.float32)
+
+
+async def embed_query(query: str) -> np.ndarray:
+    """Generate a single query embedding with the 'query: ' prefix.
+
+    Runs the encoder in a worker thread, so other retrieval work (such as
+    a keyword search) can proceed meanwhile. Returns a contiguous
+    768-dimensional float32 vector.
     """
     model = _get_model()
-    prefixed = [f"passage: {t}" for t in texts]
-    embeddings = model.encode(prefixed, batch_size=BATCH_SIZE, normalize_embeddings=True)
-    return [emb.tolist() for emb in embeddings]
+    embedding = await asyncio.to_thread(
+        model.encode,
+        f"{QUERY_PREFIX}{query}",
+        normalize_embeddings=True,
+        convert_to_numpy=True,
+    )
+    return np.ascontiguousarray(embedding, dtype=np.float32)
+
 
+async def embed_queries(queries: list[str]) -> np.ndarray:
+    """Embed several queries in one encoder batch (with the 'query: ' prefix).
 
-async def embed_query(query: str) -> list[float]:
-    """Generate a single query embedding with the 'query: ' prefix."""
+    Returns a contiguous (len(queries), 768) float32 array.
+    """
     model = _get_model()
-    embedding = model.encode(f"query: {query}", normalize_embeddings=True)
-    return embedding.tolist()
+    embeddings = await asyncio.to_thread(
+        model.encode,
+        [f"{QUERY_PREFIX}{q}" for q in queries],
+        batch_size=BATCH_SIZE,
+        normalize_embeddings=True,
+        convert_to_numpy=True,
+    )
+    return np.ascontiguousarray(embeddings, dtype=np.float32)
@@ -1,32 +1,155 @@
+import io
+import multiprocessing
+import os
+from collections import deque
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
+from itertools import islice
 
-import docx
 import pdfplumber
 
+from config.settings import settings
+from parsers.docx_xml import iter_paragraphs
+
+PDF_MIME_TYPES = ("application/pdf", "pdf")
+DOCX_MIME_TYPES = (
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    "docx",
+)
+TXT_MIME_TYPES = ("text/plain", "txt")
+
+# Parallel PDF extraction: documents shorter than PARALLEL_MIN_PAGES are
+# extracted in-process, since starting the worker pool costs more than it saves.
+PARALLEL_MIN_PAGES = 40
+PAGES_PER_TASK = 16
+
+
+def _extract_workers() -> int:
+    """Worker processes for PDF extraction.
+
+    Counts the CPUs this process may run on (not the host's), capped by
+    settings.extract_max_workers so the pool leaves room for the embedder.
+    """
+    try:
+        available = len(os.sched_getaffinity(0))
+    except AttributeError:  # not available on macOS
+        available = os.cpu_count() or 1
+    return max(1, min(available, settings.extract_max_workers))
+
+
+EXTRACT_WORKERS = _extract_workers()
+
+# Set once per worker process by the pool initializer
+_worker_pdf_bytes: bytes | None = None
+
 
 @dataclass
 class PageText:
-    page_number: int
+    page_number: int | None
     text: str
 
 
-def extract_pdf(file_bytes: bytes) -> list[PageText]:
-    """Extract text per page from a PDF file."""
-    pages: list[PageText] = []
-    with pdfplumber.open(file_bytes) as pdf:
+def _page_text(page) -> str:
+    """Extract the text of one pdfplumber page and release its caches.
+
+    Pages without any character objects (blank or scanned pages) skip the
+    word and line clustering of extract_text() altogether.
+    """
+    text = (page.extract_text() or "") if page.chars else ""
+    page.close()
+    return text
+
+
+def iter_pdf_pages(file_bytes: bytes) -> Iterator[PageText]:
+    """Yield the text of each non-empty PDF page, one page at a time.
+
+    Page layout caches are released after extraction, so memory stays
+    bounded by a single page regardless of document length.
+    """
+    with pdfplumber.open(io.BytesIO(file_bytes)) as pdf:
         for i, page in enumerate(pdf.pages):
-            text = page.extract_text() or ""
+            text = _page_text(page)
+            if text.strip():
+                yield PageText(page_number=i + 1, text=text)
+
+
+def _init_extract_worker(file_bytes: bytes) -> None:
+    global _worker_pdf_bytes
+    _worker_pdf_bytes = file_bytes
+
+
+def _extract_page_range(start: int, stop: int) -> list[PageText]:
+    """Worker task: open the PDF and extract pages [start, stop) (0-based)."""
+    pages: list[PageText] = []
+    page_numbers = list(range(start + 1, stop + 1))
+    with pdfplumber.open(io.BytesIO(_worker_pdf_bytes), pages=page_numbers) as pdf:
+        for page in pdf.pages:
+            text = _page_text(page)
             if text.strip():
-                pages.append(PageText(page_number=i + 1, text=text))
+                pages.append(PageText(page_number=page.page_number, text=text))
     return pages
 
 
+def iter_pdf_pages_parallel(
+    file_bytes: bytes,
+    max_workers: int | None = None,
+    pages_per_task: int = PAGES_PER_TASK,
+) -> Iterator[PageText]:
+    """Yield PDF pages in order, extracting page ranges in a process pool.
+
+    Each worker receives the document once (via the pool initializer) and
+    opens it itself; tasks are ranges of ``pages_per_task`` pages. Only
+    ``2 * workers`` ranges are in flight at a time, so a slow consumer
+    (the embedder) does not cause the whole document to pile up in memory.
+    Output is identical to iter_pdf_pages(), which is used directly for
+    short documents or when only one worker is available. Waiting for a
+    range blocks, so async callers consume this from a worker thread (see
+    embedding_pipeline).
+    """
+    with pdfplumber.open(io.BytesIO(file_bytes)) as pdf:
+        page_count = len(pdf.pages)
+
+    ranges = [
+        (start, min(start + pages_per_task, page_count))
+        for start in range(0, page_count, pages_per_task)
+    ]
+    workers = min(max_workers or EXTRACT_WORKERS, len(ranges))
+    if page_count < PARALLEL_MIN_PAGES or workers < 2:
+        yield from iter_pdf_pages(file_bytes)
+        return
+
+    pool = ProcessPoolExecutor(
+        max_workers=workers,
+        # Don't fork the sidecar process (threads, loaded embedding model)
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_extract_worker,
+        initargs=(file_bytes,),
+    )
+    try:
+        remaining = iter(ranges)
+        in_flight = deque(
+            pool.submit(_extract_page_range, start, stop)
+            for start, stop in islice(remaining, workers * 2)
+        )
+        while in_flight:
+            pages = in_flight.popleft().result()
+            next_range = next(remaining, None)
+            if next_range is not None:
+                in_flight.append(pool.submit(_extract_page_range, *next_range))
+            yield from pages
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def extract_pdf(file_bytes: bytes) -> list[PageText]:
+    """Extract text per page from a PDF file."""
+    return list(iter_pdf_pages(file_bytes))
+
+
 def extract_docx(file_bytes: bytes) -> str:
     """Extract all text from a DOCX file."""
-    import io
-
-    doc = docx.Document(io.BytesIO(file_bytes))
-    paragraphs = [p.text for p in doc.paragraphs if p.text.strip()]
+    paragraphs = [p.text for p in iter_paragraphs(file_bytes) if p.text.strip()]
     return "\n\n".join(paragraphs)
 
 
@@ -34,14 +157,27 @@ def extract_text(
     file_bytes: bytes, mime_type: str
 ) -> str | list[PageText]:
     """Dispatch to the correct extractor based on mime type."""
-    if mime_type in ("application/pdf", "pdf"):
+    if mime_type in PDF_MIME_TYPES:
         return extract_pdf(file_bytes)
-    elif mime_type in (
-        "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-        "docx",
-    ):
+    elif mime_type in DOCX_MIME_TYPES:
         return extract_docx(file_bytes)
-    elif mime_type in ("text/plain", "txt"):
+    elif mime_type in TXT_MIME_TYPES:
         return file_bytes.decode("utf-8")
     else:
         raise ValueError(f"Unsupported mime type: {mime_type}")
+
+
+def iter_pages(file_bytes: bytes, mime_type: str) -> Iterator[PageText]:
+    """Yield extracted text page by page.
+
+    PDFs are streamed per page (extracted in parallel for long documents);
+    DOCX and TXT have no page structure and are yielded as a single PageText
+    without a page number.
+    """
+    if mime_type in PDF_MIME_TYPES:
+        yield from iter_pdf_pages_parallel(file_bytes)
+        return
+
+    text = extract_text(file_bytes, mime_type)
+    if text.strip():
+        yield PageText(page_number=None, text=text)
@@ -0,0 +1,210 @@
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+
+import numpy as np
+
+from config.settings import settings
+from rag.bm25 import BM25Index
+from rag.chunker import Chunk
+from rag.embedder import EMBEDDING_DIMENSIONS
+from rag.vectors import from_pgvectors
+
+logger = logging.getLogger(__name__)
+
+# Same cut-off as the match_chunks() default, so both paths return the same hits
+MATCH_THRESHOLD = 0.7
+FETCH_PAGE_SIZE = 500
+
+
+@dataclass
+class LocalIndex:
+    """Flat in-memory index over one material's chunk embeddings.
+
+    ``embeddings`` is a memory-mapped (n, 768) float32 matrix of normalized
+    vectors, so a search is one matrix-vector product plus a partial sort.
+    A BM25 index over the chunk texts is built on first keyword search.
+    """
+
+    material_id: str
+    chunk_generation: int
+    embeddings: np.ndarray
+    chunks: list[Chunk]
+    _bm25: BM25Index | None = field(default=None, init=False, repr=False)
+    _rows: dict[int, int] | None = field(default=None, init=False, repr=False)
+
+    def search(
+        self,
+        query_embedding: np.ndarray,
+        top_k: int,
+        threshold: float = MATCH_THRESHOLD,
+    ) -> list[Chunk]:
+        """Return the top_k chunks by cosine similarity, best first."""
+        if not self.chunks or top_k < 1:
+            return []
+
+        scores = self.embeddings @ np.asarray(query_embedding, dtype=np.float32)
+        k = min(top_k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        return [
+            replace(self.chunks[i], score=float(scores[i]))
+            for i in top
+            if scores[i] > threshold
+        ]
+
+    def embeddings_at(self, positions: list[int]) -> np.ndarray:
+        """Return the embedding rows of the chunks at ``positions``."""
+        if self._rows is None:
+            self._rows = {c.position: i for i, c in enumerate(self.chunks)}
+        return np.asarray(self.embeddings[[self._rows[p] for p in positions]])
+
+    def keyword_search(self, query: str, top_k: int) -> list[Chunk]:
+        """Return the top_k chunks by BM25 score, best first."""
+        if self._bm25 is None:
+            self._bm25 = BM25Index([c.text for c in self.chunks])
+        return [
+            replace(self.chunks[i], score=score)
+            for i, score in self._bm25.search(query, top_k)
+        ]
+
+
+def _fetch_chunk_rows(supabase, material_id: str) -> list[dict]:
+    """Read all stored chunks of a material, ordered by position."""
+    rows: list[dict] = []
+    while True:
+        page = (
+            supabase.table("chunks")
+            .select("content,page,position,metadata,embedding")
+            .eq("material_id", material_id)
+            .order("position")
+            .range(len(rows), len(rows) + FETCH_PAGE_SIZE - 1)
+            .execute()
+        )
+        rows.extend(page.data or [])
+        if len(page.data or []) < FETCH_PAGE_SIZE:
+            return rows
+
+
+class LocalIndexCache:
+    """LRU cache of LocalIndex objects, persisted as .npy files on disk.
+
+    An entry is keyed by material and valid for one
+    ``materials.chunk_generation``, which every re-embed increments; on a new
+    generation the index is rebuilt from the chunks table. Indexes
+    evicted from memory stay on disk and are memory-mapped again on next use.
+    """
+
+    def __init__(
+        self,
+        index_dir: str | None = None,
+        max_materials: int | None = None,
+    ):
+        self.index_dir = Path(
+            index_dir
+            or settings.local_index_dir
+            or os.path.join(tempfile.gettempdir(), "mc-chunk-index")
+        )
+        self.max_materials = max_materials or settings.local_index_max_materials
+        self._entries: OrderedDict[str, LocalIndex] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, material_id: str, chunk_generation: int, supabase) -> LocalIndex:
+        """Return the index for a material, loading or building it if needed."""
+        with self._lock:
+            index = self._entries.get(material_id)
+            if index is not None and index.chunk_generation == chunk_generation:
+                self._entries.move_to_end(material_id)
+                return index
+
+        index = self._load(material_id, chunk_generation)
+        if index is None:
+            index = self._build(material_id, chunk_generation, supabase)
+
+        with self._lock:
+            self._entries[material_id] = index
+            self._entries.move_to_end(material_id)
+            while len(self._entries) > self.max_materials:
+                self._entries.popitem(last=False)
+        return index
+
+    def invalidate(self, material_id: str) -> None:
+        """Drop a material's index from memory and disk."""
+        with self._lock:
+            self._entries.pop(material_id, None)
+        shutil.rmtree(self.index_dir / material_id, ignore_errors=True)
+
+    def _path(self, material_id: str, chunk_generation: int) -> Path:
+        return self.index_dir / material_id / str(chunk_generation)
+
+    def _load(self, material_id: str, chunk_generation: int) -> LocalIndex | None:
+        path = self._path(material_id, chunk_generation)
+        try:
+            embeddings = np.load(path / "embeddings.npy", mmap_mode="r")
+            with open(path / "chunks.json", encoding="utf-8") as f:
+                chunks = [Chunk(**c) for c in json.load(f)]
+        except (OSError, ValueError):
+            return None
+        return LocalIndex(material_id, chunk_generation, embeddings, chunks)
+
+    def _build(self, material_id: str, chunk_generation: int, supabase) -> LocalIndex:
+        rows = [
+            row
+            for row in _fetch_chunk_rows(supabase, material_id)
+            if row.get("embedding")
+        ]
+        chunks = [
+            Chunk(
+                text=row["content"],
+                position=row.get("position", 0),
+                page=row.get("page"),
+                metadata=row.get("metadata") or {},
+            )
+            for row in rows
+        ]
+        embeddings = from_pgvectors(
+            [row["embedding"] for row in rows], EMBEDDING_DIMENSIONS
+        )
+
+        # Write to a temporary directory first so readers never see half an index
+        path = self._path(material_id, chunk_generation)
+        shutil.rmtree(self.index_dir / material_id, ignore_errors=True)
+        tmp_path = Path(f"{path}.tmp-{os.getpid()}-{threading.get_ident()}")
+        tmp_path.mkdir(parents=True, exist_ok=True)
+        np.save(tmp_path / "embeddings.npy", embeddings)
+        with open(tmp_path / "chunks.json", "w", encoding="utf-8") as f:
+            json.dump(
+                [
+                    {
+                        "text": c.text,
+                        "position": c.position,
+                        "page": c.page,
+                        "metadata": c.metadata,
+                    }
+                    for c in chunks
+                ],
+                f,
+                ensure_ascii=False,
+            )
+        try:
+            os.replace(tmp_path, path)
+        except OSError:
+            # Another worker finished the same build first
+            shutil.rmtree(tmp_path, ignore_errors=True)
+
+        logger.info(
+            f"Built local vector index for material {material_id}: {len(chunks)} chunks"
+        )
+        return self._load(material_id, chunk_generation) or LocalIndex(
+            material_id, chunk_generation, embeddings, chunks
+        )
+
+
+local_index_cache = LocalIndexCache()
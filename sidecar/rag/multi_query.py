@@ -0,0 +1,82 @@
+import numpy as np
+
+from rag.bm25 import tokenize
+
+# Sub-query per Bloom level: steer retrieval towards the kind of passage the
+# question needs (facts, explanations, cases or relations).
+BLOOM_QUERY_TEMPLATES = {
+    "onthouden": "Definities, begrippen en feiten over {goal}",
+    "begrijpen": "Uitleg en voorbeelden van {goal}",
+    "toepassen": "Toepassing van {goal} in een praktijksituatie of casus",
+    "analyseren": "Oorzaken, verbanden en verschillen bij {goal}",
+}
+MAX_SUB_QUERIES = 5
+KEYWORDS_PER_QUERY = 3
+MIN_KEYWORD_LENGTH = 4
+# Weight of relevance versus novelty in maximal marginal relevance
+MMR_LAMBDA = 0.7
+
+
+def expand_queries(
+    learning_goal: str,
+    bloom_level: str | None = None,
+    max_queries: int = MAX_SUB_QUERIES,
+) -> list[str]:
+    """Expand a learning goal into sub-queries for multi-query retrieval.
+
+    The first query is always the learning goal itself, followed by a Bloom
+    level variant and keyword queries built from the goal's content words.
+    """
+    goal = learning_goal.strip()
+    if not goal:
+        return []
+
+    queries = [goal]
+    template = BLOOM_QUERY_TEMPLATES.get(bloom_level or "")
+    if template:
+        queries.append(template.format(goal=goal))
+
+    keywords = list(
+        dict.fromkeys(
+            term
+            for term in tokenize(goal)
+            if len(term) >= MIN_KEYWORD_LENGTH or not term.isalpha()
+        )
+    )
+    for start in range(0, len(keywords), KEYWORDS_PER_QUERY):
+        queries.append(" ".join(keywords[start : start + KEYWORDS_PER_QUERY]))
+
+    return list(dict.fromkeys(queries))[:max_queries]
+
+
+def mmr_select(
+    embeddings: np.ndarray,
+    relevance: np.ndarray,
+    top_k: int,
+    mmr_lambda: float = MMR_LAMBDA,
+) -> list[int]:
+    """Pick top_k rows by maximal marginal relevance.
+
+    Each step takes the candidate with the best
+    ``lambda * relevance - (1 - lambda) * max_similarity_to_selected``.
+    Embeddings must be normalized; returns row indices in selection order.
+    """
+    count = len(relevance)
+    if count == 0 or top_k < 1:
+        return []
+
+    similarity = embeddings @ embeddings.T
+    redundancy = np.full(count, -np.inf, dtype=np.float32)
+    available = np.ones(count, dtype=bool)
+    selected: list[int] = []
+
+    for _ in range(min(top_k, count)):
+        penalty = np.where(np.isfinite(redundancy), redundancy, 0.0)
+        scores = mmr_lambda * relevance - (1 - mmr_lambda) * penalty
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        redundancy = np.maximum(redundancy, similarity[best])
+
+    return selected
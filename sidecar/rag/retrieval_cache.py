@@ -0,0 +1,67 @@
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Hashable
+
+from config.settings import settings
+from rag.chunker import Chunk
+
+
+class RetrievalCache:
+    """TTL + LRU cache of retrieval results.
+
+    Keys start with ``(material_id, chunk_generation)``, so results never
+    outlive the chunks they were computed from: a re-embedded material gets
+    a new generation and its old entries simply stop being hit (and age out).
+    ``invalidate`` drops them right away within this process.
+    """
+
+    def __init__(
+        self,
+        max_entries: int | None = None,
+        ttl_seconds: float | None = None,
+        clock=time.monotonic,
+    ):
+        self.max_entries = (
+            settings.retrieval_cache_max_entries if max_entries is None else max_entries
+        )
+        self.ttl_seconds = (
+            settings.retrieval_cache_ttl_seconds if ttl_seconds is None else ttl_seconds
+        )
+        self._clock = clock
+        self._entries: OrderedDict[tuple, tuple[float, list[Chunk]]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(material_id: str, chunk_generation: int, *params: Hashable) -> tuple:
+        return (material_id, chunk_generation, *params)
+
+    def get(self, key: tuple) -> list[Chunk] | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, chunks = entry
+            if expires_at <= self._clock():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return list(chunks)
+
+    def put(self, key: tuple, chunks: list[Chunk]) -> None:
+        if self.max_entries < 1 or self.ttl_seconds <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (self._clock() + self.ttl_seconds, list(chunks))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, material_id: str) -> None:
+        """Drop every cached result for a material."""
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == material_id]:
+                del self._entries[key]
+
+
+retrieval_cache = RetrievalCache()
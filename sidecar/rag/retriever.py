@@ -1,5 +1,44 @@
+import asyncio
+import logging
+from dataclasses import replace
+
+import numpy as np
+
+from config.settings import settings
+from rag.bm25 import reciprocal_rank_fusion
 from rag.chunker import Chunk
-from rag.embedder import embed_query
+from rag.embedder import EMBEDDING_DIMENSIONS, embed_queries, embed_query
+from rag.local_index import LocalIndex, local_index_cache
+from rag.multi_query import MMR_LAMBDA, mmr_select
+from rag.retrieval_cache import retrieval_cache
+from rag.vectors import from_pgvectors, to_pgvector
+
+logger = logging.getLogger(__name__)
+
+# Each leg of a hybrid search returns this many candidates per requested chunk
+HYBRID_CANDIDATE_FACTOR = 4
+
+
+async def _hybrid_search(
+    index: LocalIndex,
+    query: str,
+    top_k: int,
+    query_embedding: np.ndarray | None = None,
+) -> list[Chunk]:
+    """Run the vector and BM25 legs concurrently and fuse them with RRF."""
+    candidates = top_k * HYBRID_CANDIDATE_FACTOR
+
+    async def vector_leg() -> list[Chunk]:
+        embedding = query_embedding
+        if embedding is None:
+            embedding = await embed_query(query)
+        return index.search(embedding, candidates)
+
+    keyword_hits, vector_hits = await asyncio.gather(
+        asyncio.to_thread(index.keyword_search, query, candidates),
+        vector_leg(),
+    )
+    return reciprocal_rank_fusion([vector_hits, keyword_hits], top_k)
 
 
 async def retrieve_chunks(
@@ -7,32 +46,211 @@ async def retrieve_chunks(
     material_id: str,
     supabase,
     top_k: int = 5,
+    chunk_count: int | None = None,
+    hybrid: bool | None = None,
+    chunk_generation: int | None = None,
 ) -> list[Chunk]:
-    """Retrieve the most relevant chunks for a query using vector similarity.
+    """Retrieve the most relevant chunks for a query.
 
     Args:
         query: The search query text (e.g., a learning objective).
         material_id: The material to search within.
         supabase: Supabase client instance.
         top_k: Number of top results to return.
+        chunk_count: The material's current ``chunk_count``. When given
+            together with ``chunk_generation`` (and the local index is
+            enabled), the search runs against an in-process index of the
+            material instead of the match_chunks RPC.
+        hybrid: Fuse BM25 keyword hits with the vector hits (reciprocal rank
+            fusion). Defaults to ``settings.hybrid_retrieval``; only applies
+            to the local index path.
+        chunk_generation: The material's current ``chunk_generation``. When
+            given, results are served from and stored in the retrieval cache,
+            skipping the encoder and the search on a hit. It also keys the
+            in-process index.
 
     Returns:
-        List of Chunk objects sorted by similarity.
+        List of Chunk objects, best first. ``score`` is the cosine
+        similarity, or the fused RRF score for a hybrid search.
     """
+    if hybrid is None:
+        hybrid = settings.hybrid_retrieval
+
+    cache_key = None
+    if chunk_generation is not None:
+        cache_key = retrieval_cache.key(
+            material_id, chunk_generation, "single", query, top_k, hybrid
+        )
+        cached = retrieval_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    chunks = await _search(
+        query, material_id, supabase, top_k, chunk_count, chunk_generation, hybrid
+    )
+
+    if cache_key is not None:
+        retrieval_cache.put(cache_key, chunks)
+    return chunks
+
+
+async def _search(
+    query: str,
+    material_id: str,
+    supabase,
+    top_k: int,
+    chunk_count: int | None,
+    chunk_generation: int | None,
+    hybrid: bool,
+) -> list[Chunk]:
+    # Fast path: in-process index, no database round trip once loaded
+    index = await _load_local_index(material_id, chunk_count, chunk_generation, supabase)
+    if index is not None:
+        if hybrid:
+            return await _hybrid_search(index, query, top_k)
+        return index.search(await embed_query(query), top_k)
+
     # 13.1a: Generate embedding for the query (with "query: " prefix)
     query_embedding = await embed_query(query)
 
-    # 13.1b: Call match_chunks RPC
+    # 13.1b/c: Call match_chunks RPC and convert to Chunk objects
+    return _match_chunks(supabase, material_id, query_embedding, top_k)
+
+
+async def retrieve_chunks_multi(
+    queries: list[str],
+    material_id: str,
+    supabase,
+    top_k: int = 5,
+    chunk_count: int | None = None,
+    hybrid: bool | None = None,
+    mmr_lambda: float = MMR_LAMBDA,
+    chunk_generation: int | None = None,
+) -> list[Chunk]:
+    """Retrieve chunks for several sub-queries and pick a diverse top_k.
+
+    All queries are embedded in one encoder batch and searched concurrently.
+    The merged candidates are deduplicated by position and re-ranked with
+    maximal marginal relevance over their embeddings, so the result covers
+    more of the material than the top hits of a single query. Caching works
+    as in ``retrieve_chunks``.
+
+    Returns:
+        List of Chunk objects in MMR order. ``score`` is the best cosine
+        similarity of the chunk to any of the queries.
+    """
+    if not queries:
+        return []
+    if hybrid is None:
+        hybrid = settings.hybrid_retrieval
+
+    cache_key = None
+    if chunk_generation is not None:
+        cache_key = retrieval_cache.key(
+            material_id, chunk_generation, "multi", tuple(queries), top_k, hybrid,
+            mmr_lambda,
+        )
+        cached = retrieval_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    chunks = await _search_multi(
+        queries, material_id, supabase, top_k, chunk_count, chunk_generation, hybrid,
+        mmr_lambda,
+    )
+
+    if cache_key is not None:
+        retrieval_cache.put(cache_key, chunks)
+    return chunks
+
+
+async def _search_multi(
+    queries: list[str],
+    material_id: str,
+    supabase,
+    top_k: int,
+    chunk_count: int | None,
+    chunk_generation: int | None,
+    hybrid: bool,
+    mmr_lambda: float,
+) -> list[Chunk]:
+    query_embeddings = await embed_queries(queries)
+    index = await _load_local_index(material_id, chunk_count, chunk_generation, supabase)
+
+    if index is not None and hybrid:
+        searches = [
+            _hybrid_search(index, query, top_k, query_embedding=embedding)
+            for query, embedding in zip(queries, query_embeddings)
+        ]
+    elif index is not None:
+        searches = [
+            asyncio.to_thread(index.search, embedding, top_k)
+            for embedding in query_embeddings
+        ]
+    else:
+        searches = [
+            asyncio.to_thread(_match_chunks, supabase, material_id, embedding, top_k)
+            for embedding in query_embeddings
+        ]
+    results = await asyncio.gather(*searches)
+
+    candidates: dict[int, Chunk] = {}
+    for hits in results:
+        for chunk in hits:
+            candidates.setdefault(chunk.position, chunk)
+    if not candidates:
+        return []
+
+    positions = list(candidates)
+    if index is not None:
+        embeddings = index.embeddings_at(positions)
+    else:
+        embeddings = await asyncio.to_thread(
+            _fetch_embeddings, supabase, material_id, positions
+        )
+
+    relevance = (embeddings @ query_embeddings.T).max(axis=1)
+    selected = mmr_select(embeddings, relevance, top_k, mmr_lambda)
+    return [
+        replace(candidates[positions[i]], score=float(relevance[i]))
+        for i in selected
+    ]
+
+
+async def _load_local_index(
+    material_id: str,
+    chunk_count: int | None,
+    chunk_generation: int | None,
+    supabase,
+) -> LocalIndex | None:
+    """Return the material's in-process index, or None to use match_chunks."""
+    if not chunk_count or chunk_generation is None or not settings.local_index_enabled:
+        return None
+    try:
+        return await asyncio.to_thread(
+            local_index_cache.get, material_id, chunk_generation, supabase
+        )
+    except Exception as e:
+        logger.warning(
+            f"Local index unavailable for material {material_id}, "
+            f"falling back to match_chunks: {e}"
+        )
+        return None
+
+
+def _match_chunks(
+    supabase, material_id: str, query_embedding: np.ndarray, top_k: int
+) -> list[Chunk]:
+    """Search a material's chunks with the match_chunks RPC."""
     result = supabase.rpc(
         "match_chunks",
         {
-            "query_embedding": query_embedding,
+            "query_embedding": to_pgvector(query_embedding),
             "match_count": top_k,
             "filter_material_id": material_id,
         },
     ).execute()
 
-    # 13.1c: Convert to Chunk objects
     chunks = []
     for row in result.data or []:
         chunks.append(
@@ -41,7 +259,23 @@ async def retrieve_chunks(
                 position=row.get("position", 0),
                 page=row.get("page"),
                 metadata=row.get("metadata", {}),
+                score=row.get("similarity"),
             )
         )
 
     return chunks
+
+
+def _fetch_embeddings(supabase, material_id: str, positions: list[int]) -> np.ndarray:
+    """Read the stored embeddings of the chunks at ``positions``, in that order."""
+    result = (
+        supabase.table("chunks")
+        .select("position,embedding")
+        .eq("material_id", material_id)
+        .in_("position", positions)
+        .execute()
+    )
+    by_position = {row["position"]: row["embedding"] for row in result.data or []}
+    return from_pgvectors(
+        [by_position[p] for p in positions], EMBEDDING_DIMENSIONS
+    )
@@ -0,0 +1,37 @@
+import io
+
+import numpy as np
+
+# 6 significant digits keeps the cosine error of a normalized 768-d E5
+# vector far below 1e-5, at roughly half the size of json.dumps(list).
+VECTOR_FORMAT = "%.6g"
+
+
+def to_pgvectors(matrix: np.ndarray) -> list[str]:
+    """Serialize a (n, dims) matrix to pgvector text literals ('[0.1,0.2,...]').
+
+    All rows are formatted in a single pass over the float32 buffer, without
+    materializing a Python float per dimension.
+    """
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+    if matrix.shape[0] == 0:
+        return []
+
+    buf = io.StringIO()
+    np.savetxt(buf, matrix, fmt=VECTOR_FORMAT, delimiter=",")
+    return [f"[{line}]" for line in buf.getvalue().splitlines()]
+
+
+def to_pgvector(vector: np.ndarray) -> str:
+    """Serialize a single vector to a pgvector text literal."""
+    return to_pgvectors(np.asarray(vector, dtype=np.float32).reshape(1, -1))[0]
+
+
+def from_pgvectors(literals: list[str], dims: int) -> np.ndarray:
+    """Parse pgvector text literals (as returned by PostgREST) into a matrix."""
+    if not literals:
+        return np.empty((0, dims), dtype=np.float32)
+    joined = ",".join(literal.strip()[1:-1] for literal in literals)
+    return np.fromstring(joined, sep=",", dtype=np.float32).reshape(len(literals), dims)
@@ -0,0 +1,469 @@
+"""Admission control for the LLM-heavy endpoints (/analyze, /generate, /repair).
+
+Before work is accepted its token use and cost are estimated from the
+question count, the prompt templates and the generation input budget. The
+estimate is then checked against two things:
+
+- daily budgets per user and per exam, using the llm_usage_daily view plus
+  the cost of work still in flight. Over budget, validation is degraded to
+  the deterministic layer only, and generation and repair are rejected.
+- global and per-user limits on estimated tokens in flight. Work that does
+  not fit waits in a queue until earlier work finishes, or fails once
+  it has waited too long.
+
+A single job reserves at most the per-user limit, so one large upload keeps
+at most that share of the capacity and other users' work is still admitted
+next to it.
+"""
+
+import asyncio
+import json
+import logging
+import threading
+from collections import Counter
+from collections.abc import Callable, Coroutine, Iterator
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from datetime import date
+from functools import lru_cache
+from typing import Any
+
+from analyzers.deterministic import analyze
+from analyzers.schemas import QuestionInput
+from config.settings import settings
+from llm.client import LLMClient
+from llm.context_packer import estimate_tokens, generation_max_tokens
+from llm.prompts.repair import build_repair_prompt
+from llm.prompts.validation import build_validation_prompt
+from llm.request_templates import (
+    GENERATION_TEMPLATE,
+    REPAIR_TEMPLATE,
+    VALIDATION_TEMPLATE,
+    RequestTemplate,
+)
+from services.batched_repair import plan_batches
+from services.sharded_generation import plan_shards
+from services.supabase_client import get_supabase_client
+from services.usage_ledger import estimate_cost
+
+logger = logging.getLogger(__name__)
+
+# Typical size of a validation_result tool input (max_tokens is the ceiling)
+VALIDATION_OUTPUT_TOKENS = 600
+# Typical prompt size of one generated question when it is validated
+GENERATED_QUESTION_TOKENS = 250
+
+ADMIT = "admit"
+QUEUE = "queue"
+DEGRADE = "degrade"
+REJECT = "reject"
+
+
+@dataclass
+class Estimate:
+    """Estimated LLM work of a request."""
+
+    calls: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cost_usd: float = 0.0
+
+    @property
+    def tokens(self) -> int:
+        return self.input_tokens + self.output_tokens
+
+    def __add__(self, other: "Estimate") -> "Estimate":
+        return Estimate(
+            calls=self.calls + other.calls,
+            input_tokens=self.input_tokens + other.input_tokens,
+            output_tokens=self.output_tokens + other.output_tokens,
+            cost_usd=round(self.cost_usd + other.cost_usd, 6),
+        )
+
+
+def _estimate(model: str, calls: int, input_tokens: int, output_tokens: int) -> Estimate:
+    cost = estimate_cost(
+        model, {"input_tokens": input_tokens, "output_tokens": output_tokens}
+    )
+    return Estimate(calls, input_tokens, output_tokens, cost or 0.0)
+
+
+def _tool_tokens(template: RequestTemplate) -> int:
+    """Input tokens taken by the tool definition of a template."""
+    return estimate_tokens(json.dumps(template.tools, default=dict))
+
+
+@lru_cache(maxsize=1)
+def _validation_prompt_tokens() -> int:
+    """Input tokens of a validation prompt without the question itself."""
+    empty = QuestionInput(stem="", options=["", ""], correct_index=0)
+    messages = build_validation_prompt({}, analyze(empty).model_dump())
+    return sum(estimate_tokens(m["content"]) for m in messages) + _tool_tokens(
+        VALIDATION_TEMPLATE
+    )
+
+
+def _question_tokens(question: dict) -> int:
+    options = question.get("options") or []
+    text = " ".join(
+        [question.get("stem") or "", question.get("learning_objective") or ""]
+        + [o.get("text") or "" for o in options if isinstance(o, dict)]
+    )
+    # JSON keys and indentation around the question in the prompt
+    return estimate_tokens(text) + 20 * (len(options) + 2)
+
+
+def estimate_validation(questions: list[dict]) -> Estimate:
+    """One Haiku call per question (see validation_pipeline)."""
+    overhead = _validation_prompt_tokens()
+    return _estimate(
+        LLMClient.MODEL_HAIKU,
+        len(questions),
+        sum(overhead + _question_tokens(q) for q in questions),
+        VALIDATION_OUTPUT_TOKENS * len(questions),
+    )
+
+
+def estimate_generation(specification: dict) -> Estimate:
+    """Sharded generation calls plus validation of the generated questions."""
+    count = specification.get("count", 5)
+    num_options = specification.get("num_options", 4)
+    shards = [n for n, _ in plan_shards(count, [])]
+    input_per_call = settings.generation_input_token_budget + _tool_tokens(
+        GENERATION_TEMPLATE
+    )
+    generation = _estimate(
+        LLMClient.MODEL_SONNET,
+        len(shards),
+        input_per_call * len(shards),
+        sum(generation_max_tokens(n, num_options) for n in shards),
+    )
+    validation = _estimate(
+        LLMClient.MODEL_HAIKU,
+        count,
+        (_validation_prompt_tokens() + GENERATED_QUESTION_TOKENS) * count,
+        VALIDATION_OUTPUT_TOKENS * count,
+    )
+    return generation + validation
+
+
+def estimate_repair(questions: list[dict], validation: dict) -> Estimate:
+    """One Haiku call per repair batch (see batched_repair)."""
+    total = Estimate()
+    for batch in plan_batches(validation):
+        messages = build_repair_prompt(questions, {**validation, "results": batch})
+        total = total + _estimate(
+            LLMClient.MODEL_HAIKU,
+            1,
+            sum(estimate_tokens(m["content"]) for m in messages)
+            + _tool_tokens(REPAIR_TEMPLATE),
+            REPAIR_TEMPLATE.max_tokens,
+        )
+    return total
+
+
+@dataclass
+class Reservation:
+    """Estimated work holding a share of the in-flight capacity."""
+
+    estimate: Estimate
+    user_id: str | None = None
+    exam_id: str | None = None
+    tokens: int = 0
+
+    def __post_init__(self) -> None:
+        limit = settings.admission_user_max_inflight_tokens
+        # A job never holds more than one user's share of the capacity
+        self.tokens = min(self.estimate.tokens, limit) if limit else self.estimate.tokens
+
+
+class AdmissionController:
+    """Tracks work in flight and blocks new work until it fits.
+
+    ``acquire`` blocks the calling thread; ``wait`` is its counterpart for
+    the event loop and parks no thread while it waits.
+    """
+
+    def __init__(self) -> None:
+        self._cond = threading.Condition()
+        # (loop, future) of coroutines in wait(), woken on release
+        self._waiters: set[tuple[asyncio.AbstractEventLoop, asyncio.Future]] = set()
+        self._tokens = 0
+        self._user_tokens: Counter = Counter()
+        self._user_cost: Counter = Counter()
+        self._exam_cost: Counter = Counter()
+
+    def fits(self, reservation: Reservation) -> bool:
+        with self._cond:
+            return self._fits(reservation)
+
+    def _fits(self, r: Reservation) -> bool:
+        global_limit = settings.admission_max_inflight_tokens
+        user_limit = settings.admission_user_max_inflight_tokens
+        if global_limit and self._tokens and self._tokens + r.tokens > global_limit:
+            return False
+        user_tokens = self._user_tokens[r.user_id]
+        if user_limit and user_tokens and user_tokens + r.tokens > user_limit:
+            return False
+        return True
+
+    def acquire(self, reservation: Reservation, timeout: float | None = None) -> bool:
+        """Wait until the reservation fits; False if ``timeout`` passes first."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._fits(reservation), timeout):
+                return False
+            self._hold(reservation)
+            return True
+
+    async def wait(self, reservation: Reservation, timeout: float | None = None) -> bool:
+        """Like acquire(), but waits on the event loop instead of a thread."""
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        while True:
+            with self._cond:
+                if self._fits(reservation):
+                    self._hold(reservation)
+                    return True
+                waiter = (loop, loop.create_future())
+                self._waiters.add(waiter)
+            remaining = None if deadline is None else deadline - loop.time()
+            try:
+                if remaining is not None and remaining <= 0:
+                    return False
+                await asyncio.wait({waiter[1]}, timeout=remaining)
+            finally:
+                with self._cond:
+                    self._waiters.discard(waiter)
+
+    def _hold(self, reservation: Reservation) -> None:
+        self._tokens += reservation.tokens
+        self._user_tokens[reservation.user_id] += reservation.tokens
+        self._user_cost[reservation.user_id] += reservation.estimate.cost_usd
+        self._exam_cost[reservation.exam_id] += reservation.estimate.cost_usd
+
+    def release(self, reservation: Reservation) -> None:
+        with self._cond:
+            self._tokens -= reservation.tokens
+            self._user_tokens[reservation.user_id] -= reservation.tokens
+            self._user_cost[reservation.user_id] -= reservation.estimate.cost_usd
+            self._exam_cost[reservation.exam_id] -= reservation.estimate.cost_usd
+            self._cond.notify_all()
+            waiters, self._waiters = self._waiters, set()
+        # release() may run on another thread than the waiting coroutines
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_wake, future)
+
+    def reserved_cost(self, user_id: str | None, exam_id: str | None) -> tuple[float, float]:
+        """Estimated cost in flight for the user and for the exam."""
+        with self._cond:
+            return (
+                self._user_cost[user_id] if user_id else 0.0,
+                self._exam_cost[exam_id] if exam_id else 0.0,
+            )
+
+    @contextmanager
+    def slot(self, reservation: Reservation, timeout: float | None = None) -> Iterator[bool]:
+        """Hold the reservation for the block; yields False on timeout."""
+        acquired = self.acquire(reservation, timeout)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                self.release(reservation)
+
+
+def _wake(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+controller = AdmissionController()
+
+
+@dataclass
+class Decision:
+    action: str
+    reason: str
+    estimate: Estimate
+    reservation: Reservation
+
+    def as_dict(self) -> dict:
+        return {
+            "action": self.action,
+            "reason": self.reason,
+            "estimate": {**asdict(self.estimate), "tokens": self.estimate.tokens},
+        }
+
+
+def _spent_today(supabase, column: str, value: str) -> float:
+    rows = (
+        supabase.table("llm_usage_daily")
+        .select("cost_usd")
+        .eq("day", date.today().isoformat())
+        .eq(column, value)
+        .execute()
+    ).data or []
+    return sum(float(r.get("cost_usd") or 0) for r in rows)
+
+
+def _over_budget(
+    supabase, estimate: Estimate, user_id: str | None, exam_id: str | None
+) -> str | None:
+    """Reason text if the estimate exceeds a daily budget, else None."""
+    budgets = [
+        ("user_id", user_id, settings.admission_user_daily_budget_usd, "gebruiker"),
+        ("exam_id", exam_id, settings.admission_exam_daily_budget_usd, "toets"),
+    ]
+    in_flight = controller.reserved_cost(user_id, exam_id)
+    for (column, value, budget, label), reserved in zip(budgets, in_flight):
+        if not budget or not value:
+            continue
+        try:
+            spent = _spent_today(supabase, column, value)
+        except Exception as e:
+            # Admit when usage cannot be read; the ledger is not critical
+            logger.warning(f"Could not read LLM usage for {column}={value}: {e}")
+            continue
+        if spent + reserved + estimate.cost_usd > budget:
+            return (
+                f"Dagbudget voor deze {label} bereikt: ${spent + reserved:.2f} van "
+                f"${budget:.2f} gebruikt, deze opdracht kost naar schatting "
+                f"${estimate.cost_usd:.2f}."
+            )
+    return None
+
+
+def decide(
+    supabase,
+    estimate: Estimate,
+    user_id: str | None = None,
+    exam_id: str | None = None,
+    degradable: bool = False,
+) -> Decision:
+    """Admit, queue, degrade (deterministic only) or reject estimated work."""
+    reservation = Reservation(estimate, user_id, exam_id)
+    reason = _over_budget(supabase, estimate, user_id, exam_id)
+    if reason:
+        action = DEGRADE if degradable else REJECT
+    elif not controller.fits(reservation):
+        action = QUEUE
+        reason = "Wacht op capaciteit: er loopt al veel werk voor het taalmodel."
+    else:
+        action = ADMIT
+        reason = ""
+    logger.info(
+        f"Admission {action} for user={user_id} exam={exam_id}: "
+        f"~{estimate.tokens} tokens, ~${estimate.cost_usd:.4f} in {estimate.calls} calls"
+    )
+    return Decision(action, reason, estimate, reservation)
+
+
+async def admitted(
+    coro: Coroutine[Any, Any, Any],
+    decision: Decision,
+    on_timeout: Callable[[str], None] | None = None,
+) -> Any:
+    """Await ``coro`` once its reservation fits (for background jobs).
+
+    Degraded work makes no LLM calls and starts right away. Work still
+    queued after ``admission_job_queue_timeout_seconds`` is dropped and
+    ``on_timeout`` is called (in a thread) with the reason, to mark the job
+    failed.
+    """
+    if decision.action == DEGRADE:
+        return await coro
+    reservation = decision.reservation
+    timeout = settings.admission_job_queue_timeout_seconds or None
+    if not await controller.wait(reservation, timeout):
+        coro.close()
+        reason = (
+            "Het taalmodel is te druk: de opdracht heeft te lang op capaciteit "
+            "gewacht. Probeer het later opnieuw."
+        )
+        logger.warning(
+            f"Admission timed out for user={reservation.user_id} "
+            f"exam={reservation.exam_id} after {timeout}s in the queue"
+        )
+        if on_timeout is not None:
+            await asyncio.to_thread(on_timeout, reason)
+        return None
+    try:
+        return await coro
+    finally:
+        controller.release(reservation)
+
+
+def _fail_open(work: str, error: Exception) -> Decision:
+    # Admission must not take the endpoint down when its inputs are unreadable
+    logger.warning(f"Could not estimate {work}; admitting without limits: {error}")
+    estimate = Estimate()
+    return Decision(ADMIT, "", estimate, Reservation(estimate))
+
+
+def admit_validation(supabase, exam_id: str, question_id: str | None = None) -> Decision:
+    """Decide on validating an exam (or one of its questions)."""
+    try:
+        query = supabase.table("questions").select("stem,options,learning_objective")
+        if question_id:
+            query = query.eq("id", question_id)
+        else:
+            query = query.eq("exam_id", exam_id)
+        questions = query.execute().data or []
+        estimate = estimate_validation(questions)
+        user_id = _owner(supabase, "exams", exam_id)
+    except Exception as e:
+        return _fail_open(f"validation of exam {exam_id}", e)
+    return decide(supabase, estimate, user_id, exam_id, degradable=True)
+
+
+def admit_generation(supabase, job_id: str) -> Decision:
+    """Decide on a generation job; rejected jobs are marked failed."""
+    try:
+        job = (
+            supabase.table("generation_jobs")
+            .select("created_by,exam_id,specification")
+            .eq("id", job_id)
+            .single()
+            .execute()
+        ).data or {}
+        estimate = estimate_generation(job.get("specification") or {})
+    except Exception as e:
+        return _fail_open(f"generation job {job_id}", e)
+    decision = decide(supabase, estimate, job.get("created_by"), job.get("exam_id"))
+    if decision.action == REJECT:
+        fail_generation(supabase, job_id, decision.reason)
+    return decision
+
+
+def fail_generation(supabase, job_id: str, reason: str) -> None:
+    """Mark a generation job that was not admitted as failed."""
+    supabase.table("generation_jobs").update(
+        {"status": "failed", "error_message": reason}
+    ).eq("id", job_id).execute()
+
+
+def fail_validation(supabase, exam_id: str, reason: str) -> None:
+    """Mark the analysis of an exam that was not admitted as failed."""
+    supabase.table("exams").update({"analysis_status": "failed"}).eq(
+        "id", exam_id
+    ).execute()
+
+
+def admit_repair(questions: list[dict], validation: dict, exam_id: str | None) -> Decision:
+    """Decide on a repair call; budgets apply when the exam is known."""
+    estimate = estimate_repair(questions, validation)
+    supabase, user_id = None, None
+    if exam_id:
+        try:
+            supabase = get_supabase_client()
+            user_id = _owner(supabase, "exams", exam_id)
+        except Exception as e:
+            logger.warning(f"Could not read owner of exam {exam_id}: {e}")
+    return decide(supabase, estimate, user_id, exam_id)
+
+
+def _owner(supabase, table: str, row_id: str) -> str | None:
+    row = (
+        supabase.table(table).select("created_by").eq("id", row_id).single().execute()
+    )
+    return (row.data or {}).get("created_by")
@@ -0,0 +1,118 @@
+import asyncio
+import logging
+from collections.abc import AsyncIterator
+
+from llm.client import LLMClient
+from llm.schemas import RepairPlan, RepairProposal
+
+logger = logging.getLogger(__name__)
+
+REPAIR_BATCH_SIZE = 10
+MAX_CONCURRENT_BATCHES = 4
+
+
+def invalid_results(validation: dict) -> list[dict]:
+    return [r for r in validation.get("results", []) if not r.get("is_valid", True)]
+
+
+def plan_batches(validation: dict, batch_size: int = REPAIR_BATCH_SIZE) -> list[list[dict]]:
+    """Split the invalid validation results into batches, in question order."""
+    invalid = invalid_results(validation)
+    return [invalid[i : i + batch_size] for i in range(0, len(invalid), batch_size)]
+
+
+async def _repair_batch(
+    llm_client: LLMClient,
+    questions: list[dict],
+    validation: dict,
+    batch: list[dict],
+    semaphore: asyncio.Semaphore,
+) -> RepairPlan:
+    async with semaphore:
+        plan = await asyncio.to_thread(
+            llm_client.repair_questions, questions, {**validation, "results": batch}
+        )
+    # Proposals keep their global question_index; drop any outside the batch
+    indices = {r["question_index"] for r in batch}
+    proposals = [p for p in plan.proposals if p.question_index in indices]
+    if len(proposals) < len(plan.proposals):
+        logger.warning(
+            f"Dropped {len(plan.proposals) - len(proposals)} repair proposals "
+            f"for questions outside their batch"
+        )
+    return RepairPlan(proposals=proposals, summary=plan.summary)
+
+
+async def iter_repair_batches(
+    llm_client: LLMClient,
+    questions: list[dict],
+    validation: dict,
+    batch_size: int = REPAIR_BATCH_SIZE,
+    max_concurrency: int = MAX_CONCURRENT_BATCHES,
+) -> AsyncIterator[tuple[list[dict], RepairPlan | Exception]]:
+    """Repair batches concurrently, yielding (batch, plan or error) as each finishes."""
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def run(batch: list[dict]) -> tuple[list[dict], RepairPlan | Exception]:
+        try:
+            return batch, await _repair_batch(
+                llm_client, questions, validation, batch, semaphore
+            )
+        except Exception as e:
+            return batch, e
+
+    tasks = [asyncio.ensure_future(run(b)) for b in plan_batches(validation, batch_size)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def _failed_summary(failed: int) -> str:
+    return f"Voor {failed} vragen kon geen herstelvoorstel worden gemaakt."
+
+
+async def repair_batched(
+    llm_client: LLMClient,
+    questions: list[dict],
+    validation: dict,
+    batch_size: int = REPAIR_BATCH_SIZE,
+    max_concurrency: int = MAX_CONCURRENT_BATCHES,
+) -> RepairPlan:
+    """Repair invalid questions in concurrent batches and merge the plans.
+
+    Each batch is one repair_questions call with at most ``batch_size``
+    questions, so no prompt or response grows with the size of the import.
+    Proposals are merged in question order. A failing batch only costs its
+    own proposals; the call fails if every batch fails.
+    """
+    if not invalid_results(validation):
+        return RepairPlan(proposals=[], summary="Er zijn geen vragen om te herstellen.")
+
+    plans: list[tuple[int, RepairPlan]] = []
+    errors: list[tuple[list[dict], Exception]] = []
+    async for batch, result in iter_repair_batches(
+        llm_client, questions, validation, batch_size, max_concurrency
+    ):
+        if isinstance(result, Exception):
+            errors.append((batch, result))
+        else:
+            plans.append((batch[0]["question_index"], result))
+
+    if errors and not plans:
+        raise errors[0][1]
+    for batch, error in errors:
+        logger.warning(f"Repair batch of {len(batch)} questions failed: {error}")
+
+    plans.sort(key=lambda item: item[0])
+    proposals: list[RepairProposal] = [p for _, plan in plans for p in plan.proposals]
+    summaries = [plan.summary for _, plan in plans if plan.summary]
+    if errors:
+        summaries.append(_failed_summary(sum(len(batch) for batch, _ in errors)))
+    logger.info(
+        f"Batched repair: {len(plans) + len(errors)} batches, {len(errors)} failed, "
+        f"{len(proposals)} proposals"
+    )
+    return RepairPlan(proposals=proposals, summary=" ".join(summaries))
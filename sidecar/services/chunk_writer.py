@@ -0,0 +1,84 @@
+import asyncio
+import logging
+
+from supabase import Client
+
+logger = logging.getLogger(__name__)
+
+INSERT_BATCH_SIZE = 100
+MAX_RETRIES = 3
+RETRY_BACKOFF_SECONDS = 1.0
+
+
+class ChunkWriter:
+    """Write chunk rows for one material in batches, with a resume marker.
+
+    Every batch is inserted in its own request and retried with exponential
+    backoff. After a batch succeeds, ``materials.chunks_embedded`` is moved to
+    the position after the last stored chunk, so an interrupted run can pick
+    up from there instead of starting over. With ``chunker_version`` the
+    marker records which chunker cut the chunks it counts.
+    """
+
+    def __init__(
+        self,
+        supabase: Client,
+        material_id: str,
+        batch_size: int = INSERT_BATCH_SIZE,
+        max_retries: int = MAX_RETRIES,
+        retry_backoff: float = RETRY_BACKOFF_SECONDS,
+        chunker_version: int | None = None,
+    ):
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+        self.supabase = supabase
+        self.material_id = material_id
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.chunker_version = chunker_version
+        self.rows_written = 0
+
+    def discard_from(self, position: int) -> None:
+        """Delete chunks at or after ``position`` left behind by a failed batch."""
+        (
+            self.supabase.table("chunks")
+            .delete()
+            .eq("material_id", self.material_id)
+            .gte("position", position)
+            .execute()
+        )
+
+    async def write(self, rows: list[dict]) -> None:
+        """Insert rows (ordered by position) in batches of ``batch_size``."""
+        for start in range(0, len(rows), self.batch_size):
+            batch = rows[start : start + self.batch_size]
+            await self._insert_with_retry(batch)
+            self.rows_written += len(batch)
+            self._advance_marker(batch[-1]["position"] + 1)
+
+    async def _insert_with_retry(self, batch: list[dict]) -> None:
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.supabase.table("chunks").insert(batch).execute()
+                return
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self.retry_backoff * (2**attempt)
+                logger.warning(
+                    f"Chunk insert for material {self.material_id} failed "
+                    f"(attempt {attempt + 1}/{self.max_retries + 1}): {e}; "
+                    f"retrying in {delay:.1f}s"
+                )
+                # The failed request may have been applied partially
+                self.discard_from(batch[0]["position"])
+                await asyncio.sleep(delay)
+
+    def _advance_marker(self, next_position: int) -> None:
+        marker = {"chunks_embedded": next_position}
+        if self.chunker_version is not None:
+            marker["chunker_version"] = self.chunker_version
+        self.supabase.table("materials").update(marker).eq(
+            "id", self.material_id
+        ).execute()
@@ -0,0 +1,407 @@
+import asyncio
+import logging
+import re
+import threading
+import zlib
+from collections import OrderedDict
+from collections.abc import Iterable
+from dataclasses import dataclass
+
+import numpy as np
+
+from parsers.validation import FieldError, ValidationResponse
+from rag.embedder import EMBEDDING_DIMENSIONS, embed_queries
+
+logger = logging.getLogger(__name__)
+
+# MinHash over character 5-grams. Stems are bucketed in 32 LSH bands of 4
+# rows, making stems above ~0.4 Jaccard candidates; a candidate matches when
+# the weighted stem and option similarity reaches LEXICAL_SIMILARITY.
+NUM_PERM = 128
+LSH_BANDS = 32
+SHINGLE_SIZE = 5
+LEXICAL_SIMILARITY = 0.7
+# Shared options ("Geen van bovenstaande") alone do not make a duplicate
+STEM_WEIGHT = 0.75
+# Same cut-off as the stem deduplication of sharded generation
+SEMANTIC_SIMILARITY = 0.92
+# Mersenne prime 2^31 - 1: a * x + b stays within uint64
+_PRIME = (1 << 31) - 1
+_rng = np.random.default_rng(20261019)
+_A = _rng.integers(1, _PRIME, NUM_PERM, dtype=np.uint64)
+_B = _rng.integers(0, _PRIME, NUM_PERM, dtype=np.uint64)
+
+FETCH_PAGE_SIZE = 1000
+MAX_CACHED_BANKS = 16
+# How long /validate waits for the bank before checking the upload only;
+# a first build of a large bank carries on in the background
+BANK_WAIT_SECONDS = 3.0
+
+
+def _option_texts(options: Iterable) -> list[str]:
+    return sorted(
+        (o.get("text") if isinstance(o, dict) else o.text) or "" for o in options
+    )
+
+
+def question_text(stem: str, options: Iterable) -> str:
+    """Stem plus option texts; option order does not matter for duplicates."""
+    return "\n".join([stem or "", *_option_texts(options)])
+
+
+def _shingles(text: str) -> np.ndarray:
+    normalized = re.sub(r"\W+", " ", text.lower()).strip()
+    grams = {
+        normalized[i : i + SHINGLE_SIZE]
+        for i in range(max(1, len(normalized) - SHINGLE_SIZE + 1))
+    }
+    return np.array(
+        [zlib.crc32(g.encode()) % _PRIME for g in grams], dtype=np.uint64
+    )
+
+
+def minhash(text: str) -> np.ndarray:
+    """MinHash signature (NUM_PERM uint64 values) of the text's shingles."""
+    shingles = _shingles(text)
+    return ((_A[:, None] * shingles[None, :] + _B[:, None]) % _PRIME).min(axis=1)
+
+
+def _signature(stem: str, options: Iterable) -> tuple[np.ndarray, bool]:
+    """MinHash signatures of the stem and of the (unordered) option texts.
+
+    Returned as one 2 * NUM_PERM row, plus whether the question has options.
+    """
+    texts = [t for t in _option_texts(options) if t.strip()]
+    options_signature = minhash("\n".join(texts)) if texts else np.zeros(NUM_PERM, np.uint64)
+    return np.concatenate([minhash(stem or ""), options_signature]), bool(texts)
+
+
+def _grow(array: np.ndarray, count: int) -> np.ndarray:
+    """Return ``array`` with room for at least one row after ``count``."""
+    if count < len(array):
+        return array
+    grown = np.zeros((max(64, 2 * count), *array.shape[1:]), array.dtype)
+    grown[:count] = array[:count]
+    return grown
+
+
+@dataclass
+class DuplicateMatch:
+    """An indexed question that nearly repeats the one looked up."""
+
+    key: str
+    stem: str
+    exam_id: str | None
+    similarity: float
+    kind: str  # "lexical" or "semantic"
+
+
+class DuplicateIndex:
+    """Incremental near-duplicate index over questions (stem and options).
+
+    Lexical matches come from MinHash signatures bucketed per LSH band, so a
+    lookup only compares against colliding questions. Semantic matches are a
+    matrix-vector product over the normalized E5 embeddings, for questions
+    added with one.
+    """
+
+    def __init__(self):
+        self._keys: dict[str, int] = {}
+        self._entries: list[tuple[str, str, str | None]] = []
+        self._buckets: list[dict[bytes, list[int]]] = [{} for _ in range(LSH_BANDS)]
+        self._signatures = np.zeros((0, 2 * NUM_PERM), np.uint64)
+        self._has_options = np.zeros(0, bool)
+        self._vectors = np.zeros((0, EMBEDDING_DIMENSIONS), np.float32)
+        self._vector_rows: list[int] = []
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._keys
+
+    def add(
+        self,
+        key: str,
+        stem: str,
+        options: Iterable,
+        exam_id: str | None = None,
+        embedding: np.ndarray | None = None,
+    ) -> None:
+        """Index a question; keys that are already indexed are ignored."""
+        signature, has_options = _signature(stem, options)
+        with self._lock:
+            if key in self._keys:
+                return
+            row = len(self._entries)
+            self._keys[key] = row
+            self._entries.append((key, stem, exam_id))
+            self._signatures = _grow(self._signatures, row)
+            self._signatures[row] = signature
+            self._has_options = _grow(self._has_options, row)
+            self._has_options[row] = has_options
+            for band, bucket in zip(self._bands(signature), self._buckets):
+                bucket.setdefault(band, []).append(row)
+            if embedding is not None:
+                count = len(self._vector_rows)
+                self._vectors = _grow(self._vectors, count)
+                self._vectors[count] = np.asarray(embedding, dtype=np.float32)
+                self._vector_rows.append(row)
+
+    def find(
+        self,
+        stem: str,
+        options: Iterable,
+        embedding: np.ndarray | None = None,
+    ) -> list[DuplicateMatch]:
+        """Return the indexed near-duplicates of a question, most similar first."""
+        signature, has_options = _signature(stem, options)
+        best: dict[int, tuple[float, str]] = {}
+        with self._lock:
+            candidates = np.fromiter(
+                {
+                    row
+                    for band, bucket in zip(self._bands(signature), self._buckets)
+                    for row in bucket.get(band, ())
+                },
+                dtype=np.int64,
+            )
+            if len(candidates):
+                equal = self._signatures[candidates] == signature
+                stems = equal[:, :NUM_PERM].mean(axis=1)
+                both = self._has_options[candidates] & has_options
+                similarity = np.where(
+                    both,
+                    STEM_WEIGHT * stems + (1 - STEM_WEIGHT) * equal[:, NUM_PERM:].mean(axis=1),
+                    stems,
+                )
+                for i in np.flatnonzero(similarity >= LEXICAL_SIMILARITY):
+                    best[int(candidates[i])] = (float(similarity[i]), "lexical")
+
+            if embedding is not None and self._vector_rows:
+                count = len(self._vector_rows)
+                scores = self._vectors[:count] @ np.asarray(embedding, dtype=np.float32)
+                for i in np.flatnonzero(scores >= SEMANTIC_SIMILARITY):
+                    row = self._vector_rows[i]
+                    if row not in best or scores[i] > best[row][0]:
+                        best[row] = (float(scores[i]), "semantic")
+
+            matches = [
+                DuplicateMatch(*self._entries[row], similarity=similarity, kind=kind)
+                for row, (similarity, kind) in best.items()
+            ]
+        return sorted(matches, key=lambda m: -m.similarity)
+
+    @staticmethod
+    def _bands(signature: np.ndarray) -> list[bytes]:
+        """LSH band keys of the stem part of a signature."""
+        return [band.tobytes() for band in signature[:NUM_PERM].reshape(LSH_BANDS, -1)]
+
+
+async def embed_questions(questions: list[tuple[str, Iterable]]) -> np.ndarray:
+    """E5 embeddings of (stem, options) pairs, as used by the index."""
+    return await embed_queries([question_text(s, o) for s, o in questions])
+
+
+@dataclass
+class _Bank:
+    index: DuplicateIndex
+    watermark: str | None = None
+    # Refresh in progress; concurrent lookups wait for it instead of
+    # fetching and embedding the same questions again
+    refreshing: asyncio.Future | None = None
+
+
+class QuestionBankCache:
+    """LRU cache of near-duplicate indexes over each owner's question bank.
+
+    A bank covers the questions of all exams created by one user. It is
+    built on first use and then kept up to date incrementally: every lookup
+    adds the questions created since the last one (by created_at), and the
+    sidecar adds the questions it inserts itself. Questions edited or deleted
+    after they were indexed stay as they were until the bank is evicted or
+    invalidated.
+    """
+
+    def __init__(self, max_banks: int = MAX_CACHED_BANKS):
+        self.max_banks = max_banks
+        self._banks: OrderedDict[str, _Bank] = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def get(self, supabase, owner_id: str) -> DuplicateIndex:
+        """Return the owner's bank index, with all stored questions added.
+
+        The refresh runs as a task of its own: a caller that stops waiting
+        (see main's /validate) leaves it running for the next lookup.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            bank = self._banks.get(owner_id)
+            if bank is None:
+                bank = _Bank(DuplicateIndex())
+                self._banks[owner_id] = bank
+            self._banks.move_to_end(owner_id)
+            while len(self._banks) > self.max_banks:
+                self._banks.popitem(last=False)
+            refresh = bank.refreshing
+            if refresh is None or refresh.done() or refresh.get_loop() is not loop:
+                refresh = loop.create_task(self._refresh(supabase, owner_id, bank))
+                refresh.add_done_callback(_log_refresh_error)
+                bank.refreshing = refresh
+        await asyncio.shield(refresh)
+        return bank.index
+
+    async def _refresh(self, supabase, owner_id: str, bank: _Bank) -> None:
+        """Add the questions created since the bank's watermark."""
+        rows = await asyncio.to_thread(
+            _fetch_question_rows, supabase, owner_id, bank.watermark
+        )
+        new = [r for r in rows if r["id"] not in bank.index]
+        if new:
+            embeddings = await embed_questions([(r["stem"], r["options"]) for r in new])
+            await asyncio.to_thread(_add_rows, bank.index, new, embeddings)
+            logger.info(
+                f"Question bank of {owner_id}: added {len(new)}, {len(bank.index)} indexed"
+            )
+        # Only moved once the rows are indexed, so a failed refresh is retried
+        if rows:
+            bank.watermark = rows[-1].get("created_at") or bank.watermark
+
+    async def for_exam(self, supabase, exam_id: str) -> DuplicateIndex | None:
+        """Return the bank of the exam's owner, or None for an unknown exam."""
+        exam = await asyncio.to_thread(
+            supabase.table("exams").select("created_by").eq("id", exam_id).single().execute
+        )
+        owner_id = (exam.data or {}).get("created_by")
+        return await self.get(supabase, owner_id) if owner_id else None
+
+    def invalidate(self, owner_id: str) -> None:
+        with self._lock:
+            self._banks.pop(owner_id, None)
+
+
+def _add_rows(index: DuplicateIndex, rows: list[dict], embeddings: np.ndarray) -> None:
+    for row, embedding in zip(rows, embeddings):
+        index.add(row["id"], row["stem"], row["options"], row["exam_id"], embedding)
+
+
+def _log_refresh_error(refresh: asyncio.Future) -> None:
+    # Also retrieves the error when every caller stopped waiting
+    if not refresh.cancelled() and refresh.exception() is not None:
+        logger.warning(f"Question bank refresh failed: {refresh.exception()}")
+
+
+def _fetch_question_rows(supabase, owner_id: str, since: str | None) -> list[dict]:
+    """Read the owner's questions created at or after ``since``, oldest first.
+
+    Rows inserted together share a created_at, so the watermark itself is
+    read again; the caller skips the questions it already has.
+    """
+    exams = supabase.table("exams").select("id").eq("created_by", owner_id).execute()
+    exam_ids = [e["id"] for e in exams.data or []]
+    if not exam_ids:
+        return []
+
+    rows: list[dict] = []
+    while True:
+        query = (
+            supabase.table("questions")
+            .select("id,exam_id,stem,options,created_at")
+            .in_("exam_id", exam_ids)
+        )
+        if since:
+            query = query.gte("created_at", since)
+        page = (
+            query.order("created_at")
+            .range(len(rows), len(rows) + FETCH_PAGE_SIZE - 1)
+            .execute()
+        )
+        rows.extend(page.data or [])
+        if len(page.data or []) < FETCH_PAGE_SIZE:
+            return rows
+
+
+question_banks = QuestionBankCache()
+
+
+def _near_duplicate_warning(match: DuplicateMatch, label: str) -> FieldError:
+    return FieldError(
+        field="stem",
+        code="near_duplicate",
+        message=f"Lijkt sterk op {label} ({match.similarity:.0%} overeenkomst)",
+    )
+
+
+async def check_near_duplicates(
+    response: ValidationResponse,
+    questions: list,
+    bank: DuplicateIndex | None = None,
+    exam_id: str | None = None,
+) -> ValidationResponse:
+    """Add near_duplicate warnings to a validation response.
+
+    Questions are compared with the earlier questions of the same upload
+    (lexically) and, when a bank is given, also semantically and with the
+    stored questions of the owner.
+    """
+    embeddings = None
+    if bank is not None:
+        embeddings = await embed_questions([(q.stem, q.options) for q in questions])
+
+    upload = DuplicateIndex()
+    flagged = 0
+    for i, (question, result) in enumerate(zip(questions, response.results)):
+        if not question.stem or not question.stem.strip():
+            continue
+        embedding = embeddings[i] if embeddings is not None else None
+        warnings = [
+            _near_duplicate_warning(m, f"vraag {response.results[int(m.key)].question_id}")
+            for m in upload.find(question.stem, question.options, embedding)[:1]
+        ]
+        if bank is not None:
+            for match in bank.find(question.stem, question.options, embedding)[:1]:
+                where = "deze toets" if match.exam_id == exam_id else "de vraagbank"
+                warnings.append(
+                    _near_duplicate_warning(match, f'"{match.stem[:80]}" uit {where}')
+                )
+        upload.add(str(i), question.stem, question.options, embedding=embedding)
+        if warnings:
+            result.warnings.extend(warnings)
+            flagged += 1
+
+    if flagged:
+        response.warnings.append(
+            f"{flagged} van {len(questions)} vragen lijken sterk op een andere vraag"
+        )
+    return response
+
+
+async def drop_near_duplicates(
+    questions: list, bank: DuplicateIndex
+) -> tuple[list, np.ndarray]:
+    """Drop generated questions that nearly repeat the bank or each other.
+
+    Returns the kept questions and their embeddings, so that they can be
+    added to the bank once they are stored.
+    """
+    if not questions:
+        return questions, np.zeros((0, EMBEDDING_DIMENSIONS), np.float32)
+
+    embeddings = await embed_questions([(q.stem, q.options) for q in questions])
+    batch = DuplicateIndex()
+    kept: list[int] = []
+    for i, question in enumerate(questions):
+        if bank.find(question.stem, question.options, embeddings[i]) or batch.find(
+            question.stem, question.options, embeddings[i]
+        ):
+            continue
+        batch.add(str(i), question.stem, question.options, embedding=embeddings[i])
+        kept.append(i)
+
+    if len(kept) < len(questions):
+        logger.info(
+            f"Dropped {len(questions) - len(kept)} generated questions that "
+            f"repeat the question bank"
+        )
+    return [questions[i] for i in kept], embeddings[kept]
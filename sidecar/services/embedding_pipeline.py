@@ -1,82 +1,206 @@
-import json
+import asyncio
 import logging
+import time
+from collections.abc import Iterable, Iterator
 
-from rag.chunker import Chunk, chunk_pages, chunk_text
-from rag.embedder import embed_chunks
-from rag.extractor import PageText, extract_text
+from observability.metrics import ITEMS, IterTimer, observe_stage, stage
+from rag.chunker import (
+    CHUNKER_VERSION,
+    Chunk,
+    TokenChunkStats,
+    iter_page_chunks_by_tokens,
+)
+from rag.embedder import embed_chunks, get_tokenizer, passage_token_budget
+from rag.extractor import PageText, iter_pages
+from rag.local_index import local_index_cache
+from rag.retrieval_cache import retrieval_cache
+from rag.vectors import to_pgvectors
+from services.chunk_writer import INSERT_BATCH_SIZE, ChunkWriter
 from services.supabase_client import get_supabase_client
 
 logger = logging.getLogger(__name__)
 
+CONTENT_TEXT_LIMIT = 50000
 
-async def run_embedding(material_id: str) -> None:
-    """Full embedding pipeline: download -> extract -> chunk -> embed -> store."""
+
+def _collect_preview(
+    pages: Iterable[PageText], preview: list[str]
+) -> Iterator[PageText]:
+    """Pass pages through while keeping the leading text for content_text."""
+    size = 0
+    for page in pages:
+        if size < CONTENT_TEXT_LIMIT:
+            preview.append(page.text)
+            size += len(page.text) + 2
+        yield page
+
+
+def _next_batch(
+    chunks: Iterator[Chunk], size: int, resume_from: int
+) -> tuple[list[Chunk], int]:
+    """Pull up to ``size`` chunks at or after ``resume_from``.
+
+    Blocking: pulling chunks runs the extractor and chunker. Returns the
+    batch and the number of chunks pulled, including skipped ones.
+    """
+    batch: list[Chunk] = []
+    pulled = 0
+    for chunk in chunks:
+        pulled += 1
+        if chunk.position < resume_from:
+            continue
+        batch.append(chunk)
+        if len(batch) >= size:
+            break
+    return batch, pulled
+
+
+async def _embed_and_store(
+    batch: list[Chunk], material_id: str, writer: ChunkWriter
+) -> None:
+    """Embed one batch of chunks and hand the rows to the writer."""
+    with stage("embedding", "encode"):
+        embeddings = await embed_chunks([c.text for c in batch])
+    chunk_rows = [
+        {
+            "material_id": material_id,
+            "content": chunk.text,
+            "embedding": embedding,
+            "page": chunk.page,
+            "position": chunk.position,
+            "metadata": chunk.metadata,
+        }
+        for chunk, embedding in zip(batch, to_pgvectors(embeddings))
+    ]
+    with stage("embedding", "db_write"):
+        await writer.write(chunk_rows)
+
+
+async def run_embedding(
+    material_id: str,
+    batch_size: int = INSERT_BATCH_SIZE,
+) -> None:
+    """Full embedding pipeline: download -> extract -> chunk -> embed -> store.
+
+    The stages are chained as generators: pages are extracted one at a time,
+    chunked as they arrive, and every ``batch_size`` chunks are embedded and
+    stored before the next page is read. Peak memory is bounded by one page
+    plus one batch, and the first chunks are searchable long before the last
+    page is extracted.
+
+    The material's ``chunks_embedded`` marker records how far a previous run
+    got, so re-running after a failure only embeds and stores the remaining
+    chunks. A marker left by another chunker version is ignored, since its
+    positions no longer line up with the chunks; the material is then
+    re-embedded from the start.
+    """
     supabase = get_supabase_client()
+    started = time.perf_counter()
 
     # 12.4a: Download file from Supabase Storage
-    material = (
-        supabase.table("materials")
-        .select("*")
-        .eq("id", material_id)
-        .single()
-        .execute()
+    with stage("embedding", "supabase_fetch"):
+        material = (
+            supabase.table("materials")
+            .select("*")
+            .eq("id", material_id)
+            .single()
+            .execute()
+        )
+        if not material.data:
+            raise ValueError(f"Material {material_id} not found")
+
+        mat = material.data
+        storage_path = mat["storage_path"]
+        mime_type = mat["mime_type"]
+
+        file_data = supabase.storage.from_("materials").download(storage_path)
+
+    # 12.4b/c: Stream extracted pages straight into the token-budgeted chunker.
+    # Both stages run lazily inside the loop below, so they are timed per
+    # item; the chunker's time includes pulling pages from the extractor.
+    extract_timer = IterTimer()
+    chunk_timer = IterTimer()
+    preview: list[str] = []
+    pages = _collect_preview(
+        extract_timer.wrap(iter_pages(file_data, mime_type)), preview
+    )
+    tokenizer = get_tokenizer()
+    chunk_stats = TokenChunkStats(compare_char_chunks=logger.isEnabledFor(logging.DEBUG))
+    chunks = chunk_timer.wrap(
+        iter_page_chunks_by_tokens(
+            pages,
+            tokenizer,
+            passage_token_budget(tokenizer),
+            metadata={"material_id": material_id},
+            stats=chunk_stats,
+        )
     )
-    if not material.data:
-        raise ValueError(f"Material {material_id} not found")
-
-    mat = material.data
-    storage_path = mat["storage_path"]
-    mime_type = mat["mime_type"]
-
-    file_data = supabase.storage.from_("materials").download(storage_path)
-
-    # 12.4b: Extract text
-    extracted = extract_text(file_data, mime_type)
-
-    # 12.4c: Chunk the text
-    metadata = {"material_id": material_id}
-    if isinstance(extracted, list):
-        # list[PageText] from PDF
-        chunks = chunk_pages(extracted, metadata=metadata)
-        full_text = "\n\n".join(p.text for p in extracted)
-    else:
-        # str from DOCX or TXT
-        chunks = chunk_text(extracted, metadata=metadata)
-        full_text = extracted
-
-    if not chunks:
-        logger.warning(f"No chunks generated for material {material_id}")
-        return
 
-    # 12.4d: Generate embeddings
-    chunk_texts = [c.text for c in chunks]
-    embeddings = await embed_chunks(chunk_texts)
-
-    # 12.4e: Write chunks + embeddings to Supabase
-    chunk_rows = []
-    for chunk, embedding in zip(chunks, embeddings):
-        chunk_rows.append(
-            {
-                "material_id": material_id,
-                "content": chunk.text,
-                "embedding": json.dumps(embedding),
-                "page": chunk.page,
-                "position": chunk.position,
-                "metadata": chunk.metadata,
-            }
+    # 12.4d: Skip chunks that a previous (interrupted) run already stored
+    resume_from = mat.get("chunks_embedded") or 0
+    if resume_from and mat.get("chunker_version") != CHUNKER_VERSION:
+        logger.info(
+            f"Material {material_id} was chunked by chunker version "
+            f"{mat.get('chunker_version')}, not {CHUNKER_VERSION}; re-embedding "
+            f"from the start"
+        )
+        resume_from = 0
+    writer = ChunkWriter(
+        supabase, material_id, batch_size=batch_size, chunker_version=CHUNKER_VERSION
+    )
+    if resume_from:
+        logger.info(
+            f"Resuming embedding for material {material_id} at chunk {resume_from}"
         )
+    writer.discard_from(resume_from)
 
-    supabase.table("chunks").insert(chunk_rows).execute()
+    # 12.4e: Embed and write each batch as soon as it fills up. Extraction
+    # and chunking run in a worker thread, so they don't block the event loop.
+    chunk_count = 0
+    while True:
+        batch, pulled = await asyncio.to_thread(
+            _next_batch, chunks, batch_size, resume_from
+        )
+        chunk_count += pulled
+        if batch:
+            await _embed_and_store(batch, material_id, writer)
+        if len(batch) < batch_size:
+            break
 
-    # 12.4f: Update material record
-    supabase.table("materials").update(
-        {
-            "content_text": full_text[:50000],  # Truncate if very large
-            "chunk_count": len(chunks),
-        }
-    ).eq("id", material_id).execute()
+    observe_stage("embedding", "extract", extract_timer.seconds)
+    observe_stage("embedding", "chunk", chunk_timer.seconds - extract_timer.seconds)
+    ITEMS.labels("embedding", "pages").inc(extract_timer.count)
+    ITEMS.labels("embedding", "chunks").inc(chunk_count)
+
+    if chunk_count == 0:
+        logger.warning(f"No chunks generated for material {material_id}")
+        return
+
+    # 12.4f: Update material record. A new chunk_generation retires cached
+    # retrieval results for this material in every sidecar process.
+    update = {
+        "content_text": "\n\n".join(preview)[:CONTENT_TEXT_LIMIT],
+        "chunk_count": chunk_count,
+        "chunks_embedded": chunk_count,
+        "chunker_version": CHUNKER_VERSION,
+    }
+    if writer.rows_written:
+        update["chunk_generation"] = (mat.get("chunk_generation") or 0) + 1
+    supabase.table("materials").update(update).eq("id", material_id).execute()
+    if writer.rows_written:
+        local_index_cache.invalidate(material_id)
+        retrieval_cache.invalidate(material_id)
 
     logger.info(
         f"Embedding pipeline complete for material {material_id}: "
-        f"{len(chunks)} chunks"
+        f"{chunk_count} chunks ({writer.rows_written} written in this run), "
+        f"max {chunk_stats.max_chunk_tokens} tokens per chunk; "
+        f"{time.perf_counter() - started:.1f}s total "
+        f"(extract {extract_timer.seconds:.1f}s, "
+        f"chunk {chunk_timer.seconds - extract_timer.seconds:.1f}s)"
     )
+    if chunk_stats.compare_char_chunks:
+        logger.debug(
+            f"{chunk_stats.char_chunks_truncated} of {chunk_stats.char_chunks} "
+            f"character-based chunks would have been truncated"
+        )
@@ -1,15 +1,249 @@
 import asyncio
 import logging
+from collections.abc import AsyncIterator
 
 from supabase import Client
 
 from llm.client import LLMClient, LLMValidationError
-from rag.retriever import retrieve_chunks
+from llm.schemas import GeneratedQuestion
+from observability.metrics import ITEMS, stage
+from rag.multi_query import expand_queries
+from rag.retriever import retrieve_chunks, retrieve_chunks_multi
+from services.duplicate_index import (
+    DuplicateIndex,
+    drop_near_duplicates,
+    embed_questions,
+    question_banks,
+)
+from services.sharded_generation import SHARD_SIZE, generate_sharded
 from services.supabase_client import get_supabase_client
-from services.validation_pipeline import run_validation
+from services.usage_ledger import tag_usage
+from services.validation_pipeline import (
+    DEFAULT_RETRY_POLICY,
+    MAX_CONCURRENCY,
+    _now,
+    _validate_run_item,
+    run_validation,
+)
 
 logger = logging.getLogger(__name__)
 
+# specification["retrieval_mode"]: "single" (learning goal as the only query)
+# or "multi_query" (expanded sub-queries, diversified with MMR)
+DEFAULT_RETRIEVAL_MODE = "single"
+
+# specification["generation_mode"]: "stream" (insert and validate each
+# question as soon as it is generated), "sharded" (concurrent sub-requests)
+# or "single" (one request, then validate the exam). Without it, jobs of up
+# to SHARD_SIZE questions stream and larger jobs are sharded.
+GENERATION_MODES = ("stream", "sharded", "single")
+
+
+def _question_row(
+    gen_q: GeneratedQuestion, position: int, exam_id: str, specification: dict
+) -> dict:
+    """Build the questions table row for a generated question."""
+    options = [
+        {
+            "text": opt.text,
+            "position": opt.position,
+            "is_correct": opt.is_correct,
+        }
+        for opt in gen_q.options
+    ]
+    correct_index = next(
+        (j for j, opt in enumerate(gen_q.options) if opt.is_correct),
+        0,
+    )
+
+    return {
+        "exam_id": exam_id,
+        "position": position,
+        "stem": gen_q.stem,
+        "options": options,
+        "correct_option": correct_index,
+        "bloom_level": gen_q.bloom_level.value,
+        "learning_goal": specification.get("learning_goal", ""),
+        "source": "generated",
+    }
+
+
+async def _stream_questions(
+    llm_client: LLMClient, specification: dict, chunks: list
+) -> AsyncIterator[GeneratedQuestion]:
+    """Run the blocking streaming call in a thread and relay its questions."""
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    done = object()
+
+    def produce() -> None:
+        try:
+            for question in llm_client.stream_generate_questions(
+                specification, chunks
+            ):
+                loop.call_soon_threadsafe(queue.put_nowait, question)
+        except Exception as e:
+            loop.call_soon_threadsafe(queue.put_nowait, e)
+        finally:
+            loop.call_soon_threadsafe(queue.put_nowait, done)
+
+    producer = asyncio.ensure_future(asyncio.to_thread(produce))
+    try:
+        while (item := await queue.get()) is not done:
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        await producer
+
+
+async def _generate_streamed(
+    llm_client: LLMClient,
+    specification: dict,
+    chunks: list,
+    exam_id: str,
+    supabase: Client,
+    bank: DuplicateIndex | None = None,
+) -> list[str]:
+    """Insert and validate each question while the rest is still generated.
+
+    Only the generated questions are validated, as one validation run whose
+    items are added as the questions arrive, so an interrupted job can be
+    finished with resume_validation. The exam's progress counters cover these
+    questions; the run and the exam are marked failed if any validation
+    fails, after all started validations have finished. Questions that
+    nearly repeat the question bank are skipped.
+
+    A stream that is truncated or fails keeps the questions it delivered;
+    the rest is requested once through generate_questions, which escalates
+    max_tokens and salvages partial output. Returns the ids of all inserted
+    questions, so they end up on the job; raises only when the stream failed
+    and nothing was inserted.
+    """
+    supabase.table("exams").update(
+        {
+            "analysis_status": "processing",
+            "question_count": specification.get("count", 5),
+            "questions_analyzed": 0,
+        }
+    ).eq("id", exam_id).execute()
+    run = (
+        supabase.table("validation_runs")
+        .insert({"exam_id": exam_id, "status": "running"})
+        .execute()
+    )
+    run_id = run.data[0]["id"]
+
+    semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+    question_ids: list[str] = []
+    validations: list[asyncio.Task] = []
+
+    async def add(gen_q: GeneratedQuestion) -> None:
+        embedding = None
+        if bank is not None:
+            with stage("generation", "dedup"):
+                embedding = (await embed_questions([(gen_q.stem, gen_q.options)]))[0]
+                if bank.find(gen_q.stem, gen_q.options, embedding):
+                    logger.info(f"Skipped generated question repeating the bank: {gen_q.stem[:60]}")
+                    return
+        with stage("generation", "db_write"):
+            inserted = (
+                supabase.table("questions")
+                .insert(
+                    _question_row(gen_q, len(question_ids) + 1, exam_id, specification)
+                )
+                .execute()
+            )
+            question_row = inserted.data[0]
+            question_ids.append(question_row["id"])
+            supabase.table("validation_run_items").insert(
+                {
+                    "run_id": run_id,
+                    "question_id": question_row["id"],
+                    "question_version": question_row["version"],
+                    "status": "pending",
+                }
+            ).execute()
+        if bank is not None:
+            bank.add(question_row["id"], gen_q.stem, gen_q.options, exam_id, embedding)
+        validations.append(
+            asyncio.create_task(
+                _validate_run_item(
+                    run_id,
+                    question_row,
+                    llm_client,
+                    supabase,
+                    semaphore,
+                    DEFAULT_RETRY_POLICY,
+                )
+            )
+        )
+
+    generation_error: Exception | None = None
+    try:
+        async for gen_q in _stream_questions(llm_client, specification, chunks):
+            await add(gen_q)
+    except Exception as e:
+        generation_error = e
+        logger.warning(
+            f"Streamed generation stopped after {len(question_ids)} questions: {e}"
+        )
+
+    missing = specification.get("count", 5) - len(question_ids)
+    if generation_error is not None and missing > 0:
+        try:
+            rest = await asyncio.to_thread(
+                llm_client.generate_questions,
+                {**specification, "count": missing},
+                chunks,
+            )
+            for gen_q in rest.questions[:missing]:
+                await add(gen_q)
+        except Exception as e:
+            logger.warning(f"Topping up {missing} streamed questions failed: {e}")
+
+    results = await asyncio.gather(*validations, return_exceptions=True)
+    failures = [r for r in results if isinstance(r, Exception)]
+    failed = bool(failures) or (generation_error is not None and not question_ids)
+
+    supabase.table("validation_runs").update(
+        {
+            "status": "failed" if failed else "completed",
+            "updated_at": _now(),
+            "completed_at": None if failed else _now(),
+        }
+    ).eq("id", run_id).execute()
+
+    supabase.table("exams").update(
+        {
+            "analysis_status": "failed" if failed else "completed",
+            "question_count": len(question_ids),
+            "questions_analyzed": len(question_ids) - len(failures),
+        }
+    ).eq("id", exam_id).execute()
+
+    if generation_error is not None and not question_ids:
+        raise generation_error
+    if failures:
+        # The questions stay on the job; the run can be resumed
+        logger.warning(
+            f"{len(failures)} of {len(question_ids)} streamed questions failed "
+            f"validation in run {run_id}: {failures[0]}"
+        )
+    return question_ids
+
+
+async def _question_bank(supabase: Client, owner_id: str | None) -> DuplicateIndex | None:
+    """The owner's question bank, or None when it cannot be loaded."""
+    if not owner_id:
+        return None
+    try:
+        with stage("generation", "dedup"):
+            return await question_banks.get(supabase, owner_id)
+    except Exception as e:
+        logger.warning(f"Question bank unavailable, generating without it: {e}")
+        return None
+
 
 async def run_generation(job_id: str) -> None:
     """Full generation pipeline: retrieve chunks → generate questions → validate.
@@ -22,13 +256,14 @@ async def run_generation(job_id: str) -> None:
 
     try:
         # 13.4a: Read generation_jobs record
-        job = (
-            supabase.table("generation_jobs")
-            .select("*")
-            .eq("id", job_id)
-            .single()
-            .execute()
-        )
+        with stage("generation", "supabase_fetch"):
+            job = (
+                supabase.table("generation_jobs")
+                .select("*")
+                .eq("id", job_id)
+                .single()
+                .execute()
+            )
         if not job.data:
             raise ValueError(f"Generation job {job_id} not found")
 
@@ -36,79 +271,122 @@ async def run_generation(job_id: str) -> None:
         specification = job_data["specification"]
         material_id = job_data["material_id"]
         exam_id = job_data["exam_id"]
+        tag_usage(exam_id=exam_id)
+        bank = await _question_bank(supabase, job_data.get("created_by"))
 
         # Update status to processing
         supabase.table("generation_jobs").update(
             {"status": "processing"}
         ).eq("id", job_id).execute()
 
-        # 13.4b: Retrieve relevant chunks using the learning goal as query
+        # 13.4b: Retrieve relevant chunks using the learning goal as query.
+        # The material's chunk_generation keys the in-process vector index
+        # and the retrieval cache; a chunk_count of 0 means nothing to index.
+        with stage("generation", "supabase_fetch"):
+            material = (
+                supabase.table("materials")
+                .select("chunk_count,chunk_generation")
+                .eq("id", material_id)
+                .single()
+                .execute()
+            )
+        chunk_count = (material.data or {}).get("chunk_count")
+        chunk_generation = (material.data or {}).get("chunk_generation")
+
         learning_goal = specification.get("learning_goal", "")
         top_k = specification.get("top_k", 10)
-        chunks = await retrieve_chunks(
-            query=learning_goal,
-            material_id=material_id,
-            supabase=supabase,
-            top_k=top_k,
-        )
+        retrieval_mode = specification.get("retrieval_mode", DEFAULT_RETRIEVAL_MODE)
+        with stage("generation", "retrieval"):
+            if retrieval_mode == "multi_query":
+                chunks = await retrieve_chunks_multi(
+                    queries=expand_queries(
+                        learning_goal, specification.get("bloom_level")
+                    ),
+                    material_id=material_id,
+                    supabase=supabase,
+                    top_k=top_k,
+                    chunk_count=chunk_count,
+                    chunk_generation=chunk_generation,
+                )
+            else:
+                chunks = await retrieve_chunks(
+                    query=learning_goal,
+                    material_id=material_id,
+                    supabase=supabase,
+                    top_k=top_k,
+                    chunk_count=chunk_count,
+                    chunk_generation=chunk_generation,
+                )
 
         if not chunks:
             raise ValueError(
                 f"No relevant chunks found for material {material_id}"
             )
 
-        # 13.4c: Generate questions via LLM
-        result = await asyncio.to_thread(
-            llm_client.generate_questions,
-            specification,
-            chunks,
+        # 13.4c-e: Generate, store and validate questions (see GENERATION_MODES)
+        generation_mode = specification.get("generation_mode") or (
+            "sharded" if specification.get("count", 5) > SHARD_SIZE else "stream"
         )
-
-        # 13.4d: Write generated questions to questions table
-        question_ids = []
-        for i, gen_q in enumerate(result.questions):
-            options = [
-                {
-                    "text": opt.text,
-                    "position": opt.position,
-                    "is_correct": opt.is_correct,
-                }
-                for opt in gen_q.options
-            ]
-            correct_index = next(
-                (j for j, opt in enumerate(gen_q.options) if opt.is_correct),
-                0,
+        if generation_mode not in GENERATION_MODES:
+            raise ValueError(f"Unknown generation_mode {generation_mode!r}")
+        if generation_mode == "stream":
+            question_ids = await _generate_streamed(
+                llm_client, specification, chunks, exam_id, supabase, bank
             )
+        else:
+            if generation_mode == "sharded":
+                result = await generate_sharded(llm_client, specification, chunks)
+            else:
+                result = await asyncio.to_thread(
+                    llm_client.generate_questions,
+                    specification,
+                    chunks,
+                )
 
-            question_row = {
-                "exam_id": exam_id,
-                "position": i + 1,
-                "stem": gen_q.stem,
-                "options": options,
-                "correct_option": correct_index,
-                "bloom_level": gen_q.bloom_level.value,
-                "learning_goal": specification.get("learning_goal", ""),
-                "source": "generated",
-            }
+            questions = result.questions
+            if bank is not None:
+                with stage("generation", "dedup"):
+                    questions, embeddings = await drop_near_duplicates(questions, bank)
 
-            inserted = (
-                supabase.table("questions")
-                .insert(question_row)
-                .execute()
-            )
-            question_ids.append(inserted.data[0]["id"])
+            # 13.4d: Write generated questions to questions table
+            question_ids = []
+            with stage("generation", "db_write"):
+                for i, gen_q in enumerate(questions):
+                    inserted = (
+                        supabase.table("questions")
+                        .insert(_question_row(gen_q, i + 1, exam_id, specification))
+                        .execute()
+                    )
+                    question_ids.append(inserted.data[0]["id"])
+                    if bank is not None:
+                        bank.add(
+                            question_ids[-1], gen_q.stem, gen_q.options, exam_id, embeddings[i]
+                        )
 
-        # 13.4e: Run validation pipeline on the generated questions
-        await run_validation(exam_id, supabase, llm_client)
+            # 13.4e: Run validation pipeline on the generated questions
+            await run_validation(exam_id, supabase, llm_client)
 
-        # 13.4f: Update generation job status
-        supabase.table("generation_jobs").update(
-            {
-                "status": "completed",
-                "result_question_ids": question_ids,
-                "completed_at": "now()",
-            }
-        ).eq("id", job_id).execute()
+        ITEMS.labels("generation", "questions").inc(len(question_ids))
+
+        # 13.4f: Update generation job status. Fewer questions than asked
+        # (failed shards, truncation, repeats of the bank) is reported on
+        # the job rather than failing it.
+        job_update = {
+            "status": "completed",
+            "result_question_ids": question_ids,
+            "completed_at": "now()",
+        }
+        requested = specification.get("count", 5)
+        if len(question_ids) < requested:
+            logger.warning(
+                f"Generation job {job_id} produced {len(question_ids)} "
+                f"of {requested} questions"
+            )
+            job_update["warning"] = (
+                f"Er zijn {len(question_ids)} van de {requested} gevraagde "
+                f"vragen gegenereerd."
+            )
+        supabase.table("generation_jobs").update(job_update).eq("id", job_id).execute()
 
         logger.info(
             f"Generation pipeline complete for job {job_id}: "
@@ -0,0 +1,180 @@
+import logging
+
+from llm.schemas import RepairPlan, RepairProposal
+
+logger = logging.getLogger(__name__)
+
+OPTION_LABELS = "ABCD"
+
+
+def _question_id(questions: list[dict], index: int) -> str:
+    """The ID validate_questions uses for a question."""
+    return questions[index].get("question_id") or str(index + 1)
+
+
+def _is_asterisk_marked(option: dict) -> bool:
+    """Marked with an asterisk in the source file, or still carrying one."""
+    text = (option.get("text") or "").strip()
+    return (
+        option.get("marked_with") == "asterisk"
+        or text.startswith("*")
+        or text.endswith("*")
+    )
+
+
+def _renumber(questions: list[dict], duplicates: list[int]) -> list[RepairProposal]:
+    """Give every repeated question ID after its first use a fresh one.
+
+    Numeric IDs continue after the highest one; other IDs get a suffix.
+    """
+    used = {_question_id(questions, i) for i in range(len(questions))}
+    next_number = max((int(qid) for qid in used if qid.isdigit()), default=0) + 1
+    seen: set[str] = set()
+    proposals = []
+    for i in duplicates:
+        qid = _question_id(questions, i)
+        if qid not in seen:
+            seen.add(qid)
+            continue
+        if qid.isdigit():
+            new_id, next_number = str(next_number), next_number + 1
+        else:
+            suffix = 2
+            while f"{qid}-{suffix}" in used:
+                suffix += 1
+            new_id = f"{qid}-{suffix}"
+        used.add(new_id)
+        proposals.append(
+            RepairProposal(
+                question_index=i,
+                field="question_id",
+                current_value=qid,
+                proposed_value=new_id,
+                explanation=f"Vraag-ID '{qid}' is al in gebruik; de vraag krijgt een nieuw ID.",
+            )
+        )
+    return proposals
+
+
+def _resolve_correct(question: dict, index: int) -> RepairProposal | None:
+    """Pick the one correct option marked with an asterisk, if exactly one is."""
+    options = question.get("options", [])
+    correct = [j for j, o in enumerate(options) if o.get("is_correct")]
+    marked = [j for j in correct if _is_asterisk_marked(options[j])]
+    if len(marked) != 1 or marked[0] >= len(OPTION_LABELS):
+        return None
+    return RepairProposal(
+        question_index=index,
+        field="correct_option",
+        current_value=", ".join(OPTION_LABELS[j] for j in correct if j < len(OPTION_LABELS)),
+        proposed_value=OPTION_LABELS[marked[0]],
+        explanation=(
+            "Alleen deze optie is met een asterisk (*) als correct gemarkeerd; "
+            "de andere markering komt van opmaak."
+        ),
+    )
+
+
+def _infer_categories(questions: list[dict], indices: list[int]) -> list[RepairProposal]:
+    """Fill an empty category from the rows around it.
+
+    A category is proposed when the nearest filled-in rows before and after
+    the question agree, or when there is only one of them.
+    """
+    categories = [(q.get("category") or "").strip() for q in questions]
+    before: list[str] = []
+    last = ""
+    for category in categories:
+        before.append(last)
+        last = category or last
+    after: list[str] = [""] * len(categories)
+    last = ""
+    for i in range(len(categories) - 1, -1, -1):
+        after[i] = last
+        last = categories[i] or last
+
+    proposals = []
+    for i in indices:
+        if categories[i] or (before[i] and after[i] and before[i] != after[i]):
+            continue
+        category = before[i] or after[i]
+        if not category:
+            continue
+        proposals.append(
+            RepairProposal(
+                question_index=i,
+                field="category",
+                proposed_value=category,
+                explanation="Overgenomen van de omliggende vragen.",
+            )
+        )
+    return proposals
+
+
+def repair_with_rules(questions: list[dict], validation: dict) -> tuple[RepairPlan, dict]:
+    """Resolve mechanical validation findings without the LLM.
+
+    Handles repeated question IDs, several correct options when exactly one
+    of them carries an asterisk, and empty categories that follow from the
+    neighbouring rows. Returns the rule-based plan and the validation that is
+    left for the LLM: only the results with errors the rules could not fix,
+    stripped of the fixed errors.
+    """
+    results = [r for r in validation.get("results", []) if r["question_index"] < len(questions)]
+
+    duplicates = [
+        r["question_index"]
+        for r in results
+        if any(e["code"] == "duplicate_id" for e in r.get("errors", []))
+    ]
+    proposals = _renumber(questions, duplicates)
+
+    resolved_correct = set()
+    for r in results:
+        if any(e["code"] == "multiple_correct" for e in r.get("errors", [])):
+            proposal = _resolve_correct(questions[r["question_index"]], r["question_index"])
+            if proposal:
+                proposals.append(proposal)
+                resolved_correct.add(r["question_index"])
+
+    empty_category = [
+        r["question_index"]
+        for r in results
+        if any(w["code"] == "empty_category" for w in r.get("warnings", []))
+    ]
+    proposals.extend(_infer_categories(questions, empty_category))
+    proposals.sort(key=lambda p: p.question_index)
+
+    remainder = []
+    for r in results:
+        if r.get("is_valid", True):
+            continue
+        errors = [
+            e
+            for e in r.get("errors", [])
+            if e["code"] != "duplicate_id"
+            and not (e["code"] == "multiple_correct" and r["question_index"] in resolved_correct)
+        ]
+        if errors:
+            remainder.append({**r, "errors": errors})
+
+    logger.info(
+        f"Rule-based repair: {len(proposals)} proposals, "
+        f"{len(remainder)} questions left for the LLM"
+    )
+    summary = ""
+    if proposals:
+        noun = "reparatie" if len(proposals) == 1 else "reparaties"
+        summary = f"{len(proposals)} {noun} automatisch bepaald."
+    return RepairPlan(proposals=proposals, summary=summary), {**validation, "results": remainder}
+
+
+def merge_plans(rules: RepairPlan, llm: RepairPlan) -> RepairPlan:
+    """Combine both plans in question order; rule proposals win per field."""
+    covered = {(p.question_index, p.field) for p in rules.proposals}
+    proposals = rules.proposals + [
+        p for p in llm.proposals if (p.question_index, p.field) not in covered
+    ]
+    proposals.sort(key=lambda p: p.question_index)
+    summary = " ".join(s for s in (rules.summary, llm.summary) if s)
+    return RepairPlan(proposals=proposals, summary=summary)
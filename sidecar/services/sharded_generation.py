@@ -0,0 +1,161 @@
+import asyncio
+import logging
+import math
+
+import numpy as np
+
+from llm.client import LLMClient
+from llm.schemas import GeneratedQuestion, GenerationResult
+from rag.chunker import Chunk
+from rag.embedder import embed_queries
+
+logger = logging.getLogger(__name__)
+
+SHARD_SIZE = 5
+MAX_CONCURRENT_SHARDS = 8
+# Shards get disjoint chunk subsets when each can have at least this many
+MIN_CHUNKS_PER_SHARD = 3
+# Cosine similarity above which two stems count as the same question
+DUPLICATE_STEM_SIMILARITY = 0.92
+
+
+def plan_shards(
+    count: int,
+    chunks: list[Chunk],
+    shard_size: int = SHARD_SIZE,
+) -> list[tuple[int, list[int]]]:
+    """Split a job into (question count, chunk indices) shards.
+
+    With enough chunks every shard gets a disjoint, interleaved subset (so
+    each still sees some of the best-scoring chunks); otherwise each shard
+    gets a window that rotates over the chunk list.
+    """
+    shard_count = max(1, math.ceil(count / shard_size))
+    counts = [
+        count // shard_count + (1 if i < count % shard_count else 0)
+        for i in range(shard_count)
+    ]
+
+    n = len(chunks)
+    if n >= shard_count * MIN_CHUNKS_PER_SHARD:
+        subsets = [list(range(i, n, shard_count)) for i in range(shard_count)]
+    else:
+        window = min(n, max(MIN_CHUNKS_PER_SHARD, math.ceil(n / shard_count)))
+        subsets = [
+            [(i * n // shard_count + j) % n for j in range(window)]
+            for i in range(shard_count)
+        ]
+    return list(zip(counts, subsets))
+
+
+def _remap_chunk_ids(
+    question: GeneratedQuestion, subset: list[int]
+) -> GeneratedQuestion:
+    """Translate shard-local chunk ids back to indices in the full chunk list.
+
+    LLMClient.generate_questions returns ids as indices into the chunks it
+    was given (the shard's subset), whatever order the prompt packed them
+    in. Ids outside the subset are dropped.
+    """
+    chunk_ids = []
+    for chunk_id in question.chunk_ids:
+        try:
+            chunk_ids.append(str(subset[int(chunk_id)]))
+        except (ValueError, IndexError):
+            logger.warning(f"Dropped unknown shard chunk id {chunk_id!r}")
+    return question.model_copy(update={"chunk_ids": chunk_ids})
+
+
+async def deduplicate_questions(
+    questions: list[GeneratedQuestion],
+    threshold: float = DUPLICATE_STEM_SIMILARITY,
+) -> list[GeneratedQuestion]:
+    """Drop questions whose stem is nearly identical to an earlier one."""
+    if len(questions) < 2:
+        return questions
+
+    embeddings = await embed_queries([q.stem for q in questions])
+    similarity = embeddings @ embeddings.T
+    kept: list[int] = []
+    for i in range(len(questions)):
+        if kept and float(np.max(similarity[i, kept])) >= threshold:
+            continue
+        kept.append(i)
+
+    if len(kept) < len(questions):
+        logger.info(
+            f"Dropped {len(questions) - len(kept)} near-duplicate generated questions"
+        )
+    return [questions[i] for i in kept]
+
+
+async def generate_sharded(
+    llm_client: LLMClient,
+    specification: dict,
+    chunks: list[Chunk],
+    shard_size: int = SHARD_SIZE,
+    max_concurrency: int = MAX_CONCURRENT_SHARDS,
+) -> GenerationResult:
+    """Generate ``specification["count"]`` questions in concurrent shards.
+
+    Each shard asks for at most ``shard_size`` questions over its own chunk
+    subset, so wall-clock time is that of one small request rather than one
+    long one. Results are merged in shard order, chunk ids are mapped back to
+    the full chunk list and near-duplicate stems are removed. Questions lost
+    to failed shards or deduplication are requested once more in a top-up
+    round; the result can still be short if that round fails too. The call
+    fails if every shard of the first round fails.
+    """
+    count = specification.get("count", 5)
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def run_shard(shard_count: int, subset: list[int]) -> list[GeneratedQuestion]:
+        shard_spec = {**specification, "count": shard_count}
+        async with semaphore:
+            result = await asyncio.to_thread(
+                llm_client.generate_questions,
+                shard_spec,
+                [chunks[i] for i in subset],
+            )
+        return [_remap_chunk_ids(q, subset) for q in result.questions]
+
+    async def run_round(
+        round_count: int,
+    ) -> tuple[int, list[GeneratedQuestion], list[BaseException]]:
+        shards = plan_shards(round_count, chunks, shard_size)
+        results = await asyncio.gather(
+            *(run_shard(c, subset) for c, subset in shards),
+            return_exceptions=True,
+        )
+        questions: list[GeneratedQuestion] = []
+        errors: list[BaseException] = []
+        for shard_result in results:
+            if isinstance(shard_result, BaseException):
+                logger.warning(f"Generation shard failed: {shard_result}")
+                errors.append(shard_result)
+            else:
+                questions.extend(shard_result)
+        return len(shards), questions, errors
+
+    shard_count, questions, errors = await run_round(count)
+    if errors and not questions:
+        raise errors[0]
+    questions = await deduplicate_questions(questions)
+
+    missing = count - len(questions)
+    if missing > 0:
+        logger.info(f"Sharded generation is {missing} questions short; topping up")
+        extra_shards, extra, extra_errors = await run_round(missing)
+        shard_count += extra_shards
+        errors += extra_errors
+        questions = await deduplicate_questions(questions + extra)
+
+    logger.info(
+        f"Sharded generation: {shard_count} shards, {len(errors)} failed, "
+        f"{len(questions)} questions"
+    )
+    if len(questions) < count:
+        logger.warning(
+            f"Sharded generation returned {len(questions)} of {count} questions"
+        )
+    return GenerationResult(questions=questions[:count])
@@ -0,0 +1,239 @@
+"""Ledger of LLM usage: one llm_usage row per Messages API call.
+
+Rows carry token counts, model, latency, retries and an estimated cost, and
+are tagged with the exam and generation job the call was made for. Tags
+are set per background job or request with ``usage_scope`` and reach calls
+made from worker threads and tasks through a context variable.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from collections import defaultdict
+from collections.abc import Coroutine, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import date, timedelta
+from typing import Any
+
+from config.settings import settings
+from services.supabase_client import get_supabase_client
+
+logger = logging.getLogger(__name__)
+
+# USD per million tokens (input, output). Cache reads are billed at 10% and
+# cache writes at 125% of the input price.
+MODEL_PRICES = {
+    "claude-haiku-4-5-20251001": (1.0, 5.0),
+    "claude-sonnet-4-5-20250929": (3.0, 15.0),
+    "claude-opus-4-6": (5.0, 25.0),
+}
+CACHE_READ_FACTOR = 0.1
+CACHE_WRITE_FACTOR = 1.25
+
+# Buffered rows are written in one insert when either limit is reached,
+# and always when a usage scope ends
+FLUSH_ROWS = 20
+FLUSH_SECONDS = 30.0
+
+TOKEN_FIELDS = [
+    "input_tokens",
+    "output_tokens",
+    "cache_read_input_tokens",
+    "cache_creation_input_tokens",
+]
+SUM_FIELDS = ["calls", *TOKEN_FIELDS, "retries", "http_retries", "cost_usd"]
+
+_tags: ContextVar[dict | None] = ContextVar("usage_tags", default=None)
+
+# Inserts handed off from an event loop. Not tied to any loop, so a write
+# started on one loop can be awaited from another.
+_writer = ThreadPoolExecutor(max_workers=2, thread_name_prefix="usage-ledger")
+
+
+def estimate_cost(model: str, usage: dict[str, int]) -> float | None:
+    """Estimated cost in USD, or None for a model without known prices."""
+    prices = MODEL_PRICES.get(model)
+    if prices is None:
+        return None
+    input_price, output_price = prices
+    cost = (
+        usage.get("input_tokens", 0) * input_price
+        + usage.get("cache_read_input_tokens", 0) * input_price * CACHE_READ_FACTOR
+        + usage.get("cache_creation_input_tokens", 0) * input_price * CACHE_WRITE_FACTOR
+        + usage.get("output_tokens", 0) * output_price
+    )
+    return round(cost / 1_000_000, 6)
+
+
+@contextmanager
+def usage_scope(**tags: str | None) -> Iterator[dict]:
+    """Tag LLM calls made inside the block; flushes the ledger on exit."""
+    token = _tags.set({**(_tags.get() or {}), **tags})
+    try:
+        yield _tags.get()
+    finally:
+        _tags.reset(token)
+        ledger.flush()
+
+
+def tag_usage(**tags: str | None) -> None:
+    """Add tags to the current scope once they are known (e.g. a job's exam)."""
+    current = _tags.get()
+    if current is not None:
+        current.update(tags)
+
+
+async def usage_tagged(coro: Coroutine[Any, Any, Any], **tags: str | None) -> Any:
+    """Await ``coro`` inside a usage scope (for background jobs).
+
+    The ledger is flushed in a worker thread once the job is done.
+    """
+    token = _tags.set({**(_tags.get() or {}), **tags})
+    try:
+        return await coro
+    finally:
+        _tags.reset(token)
+        await ledger.aflush()
+
+
+class UsageLedger:
+    """Buffers usage rows and writes them to the llm_usage table."""
+
+    def __init__(self, flush_rows: int = FLUSH_ROWS, flush_seconds: float = FLUSH_SECONDS):
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self._rows: list[dict] = []
+        self._oldest = 0.0
+        self._lock = threading.Lock()
+        # Writes handed off to _writer, until done (guarded by _lock)
+        self._writes: set[Future] = set()
+
+    def record(
+        self,
+        operation: str,
+        model: str,
+        response: Any,
+        latency_seconds: float,
+        retries: int = 0,
+        http_retries: int = 0,
+    ) -> dict:
+        """Add a row for one Messages API response and return it."""
+        usage = getattr(response, "usage", None)
+        tokens = {}
+        for name in TOKEN_FIELDS:
+            value = getattr(usage, name, None)
+            tokens[name] = value if isinstance(value, int) else 0
+        tags = _tags.get() or {}
+        row = {
+            "exam_id": tags.get("exam_id"),
+            "job_id": tags.get("job_id"),
+            "operation": operation,
+            "model": model,
+            **tokens,
+            "latency_ms": round(latency_seconds * 1000),
+            "retries": retries,
+            "http_retries": http_retries,
+            "stop_reason": str(getattr(response, "stop_reason", None)),
+            "cost_usd": estimate_cost(model, tokens),
+        }
+        with self._lock:
+            if not self._rows:
+                self._oldest = time.monotonic()
+            self._rows.append(row)
+            due = (
+                len(self._rows) >= self.flush_rows
+                or time.monotonic() - self._oldest >= self.flush_seconds
+            )
+        if due:
+            self.flush()
+        return row
+
+    def flush(self) -> None:
+        """Write buffered rows. Failures are logged; they never fail a call.
+
+        Called on an event loop thread, the blocking insert is handed off
+        to a worker thread instead of being made in place.
+        """
+        rows = self._take()
+        if not rows:
+            return
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            self._write(rows)
+            return
+        self._submit(rows)
+
+    async def aflush(self) -> None:
+        """Write buffered rows from a worker thread and wait for all writes."""
+        rows = self._take()
+        if rows:
+            self._submit(rows)
+        with self._lock:
+            writes = list(self._writes)
+        if writes:
+            await asyncio.gather(*(asyncio.wrap_future(w) for w in writes))
+
+    def _submit(self, rows: list[dict]) -> None:
+        write = _writer.submit(self._write, rows)
+        with self._lock:
+            self._writes.add(write)
+        write.add_done_callback(self._done)
+
+    def _done(self, write: Future) -> None:
+        with self._lock:
+            self._writes.discard(write)
+
+    def _take(self) -> list[dict]:
+        with self._lock:
+            rows, self._rows = self._rows, []
+        return rows
+
+    def _write(self, rows: list[dict]) -> None:
+        if not settings.supabase_url:
+            logger.debug(f"Supabase not configured; dropping {len(rows)} usage rows")
+            return
+        try:
+            get_supabase_client().table("llm_usage").insert(rows).execute()
+        except Exception as e:
+            logger.warning(f"Could not write {len(rows)} usage rows: {e}")
+
+
+ledger = UsageLedger()
+
+
+def usage_summary(supabase, exam_id: str | None = None, days: int = 30) -> dict:
+    """Usage totals and breakdowns per day, exam and model from llm_usage_daily."""
+    since = date.today() - timedelta(days=days - 1)
+    query = supabase.table("llm_usage_daily").select("*").gte("day", since.isoformat())
+    if exam_id:
+        query = query.eq("exam_id", exam_id)
+    rows = query.order("day").execute().data or []
+
+    totals = dict.fromkeys(SUM_FIELDS, 0)
+    groups: dict[str, dict[Any, dict]] = {
+        "by_day": defaultdict(lambda: dict.fromkeys(SUM_FIELDS, 0)),
+        "by_exam": defaultdict(lambda: dict.fromkeys(SUM_FIELDS, 0)),
+        "by_model": defaultdict(lambda: dict.fromkeys(SUM_FIELDS, 0)),
+    }
+    for row in rows:
+        keys = {"by_day": row["day"], "by_exam": row["exam_id"], "by_model": row["model"]}
+        for field in SUM_FIELDS:
+            value = row.get(field) or 0
+            totals[field] += value
+            for group, key in keys.items():
+                groups[group][key][field] += value
+
+    key_names = {"by_day": "day", "by_exam": "exam_id", "by_model": "model"}
+    return {
+        "since": since.isoformat(),
+        "exam_id": exam_id,
+        "totals": totals,
+        **{
+            group: [{key_names[group]: key, **sums} for key, sums in entries.items()]
+            for group, entries in groups.items()
+        },
+    }
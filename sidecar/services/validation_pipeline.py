@@ -1,19 +1,43 @@
 import asyncio
 import logging
 from datetime import datetime, timezone
+from dataclasses import dataclass
 from typing import Any
 
+import anthropic
+from opentelemetry import trace
 from supabase import Client
 
 from analyzers.deterministic import analyze as deterministic_analyze
 from analyzers.schemas import QuestionInput
 from llm.client import LLMClient, LLMValidationError
+from observability.metrics import ITEMS, stage
+from observability.tracing import tracer
 
 logger = logging.getLogger(__name__)
 
 MAX_CONCURRENCY = 5
+MAX_ERROR_LENGTH = 1000
 
 
+@dataclass(frozen=True)
+class RetryPolicy:
+    """How often a question is retried within a run, and on which errors."""
+
+    max_attempts: int = 3
+    backoff_seconds: float = 2.0
+    retry_on: tuple[type[BaseException], ...] = (
+        anthropic.APIConnectionError,
+        anthropic.RateLimitError,
+        anthropic.InternalServerError,
+    )
+
+
+# Transient API errors are retried; anything else fails the question at once
+DEFAULT_RETRY_POLICY = RetryPolicy()
+
+
+@tracer.start_as_current_span("validation.question")
 async def _validate_single_question(
     question_row: dict[str, Any],
     llm_client: LLMClient,
@@ -21,8 +45,14 @@ async def _validate_single_question(
     semaphore: asyncio.Semaphore,
     *,
     update_progress: bool = True,
+    deterministic_only: bool = False,
 ) -> None:
-    """Validate a single question: deterministic + LLM analysis, then write assessment."""
+    """Validate a single question: deterministic + LLM analysis, then write assessment.
+
+    With ``deterministic_only`` (admission control over budget) the LLM layer
+    is skipped and only the tech_kwant_* fields are written.
+    """
+    trace.get_current_span().set_attribute("question.id", question_row["id"])
     async with semaphore:
         question_id = question_row["id"]
         question_version = question_row["version"]
@@ -40,7 +70,27 @@ async def _validate_single_question(
         )
 
         # Layer 1: Deterministic analysis
-        det_result = deterministic_analyze(question_input)
+        with stage("validation", "deterministic"):
+            det_result = deterministic_analyze(question_input)
+
+        if deterministic_only:
+            with stage("validation", "db_write"):
+                supabase.table("assessments").upsert(
+                    {
+                        "question_id": question_id,
+                        "question_version": question_version,
+                        "assessed_at": datetime.now(timezone.utc).isoformat(),
+                        **det_result.model_dump(),
+                    },
+                    on_conflict="question_id,question_version",
+                ).execute()
+                if update_progress:
+                    supabase.rpc(
+                        "increment_questions_analyzed",
+                        {"p_exam_id": question_row["exam_id"]},
+                    ).execute()
+            ITEMS.labels("validation", "questions").inc()
+            return
 
         # Layer 2: LLM analysis
         question_dict = {
@@ -85,24 +135,27 @@ async def _validate_single_question(
             ],
         }
 
-        supabase.table("assessments").upsert(
-            assessment,
-            on_conflict="question_id,question_version",
-        ).execute()
-
-        # Update progress counter (atomic increment via SQL function)
-        if update_progress:
-            supabase.rpc(
-                "increment_questions_analyzed",
-                {"p_exam_id": question_row["exam_id"]},
+        with stage("validation", "db_write"):
+            supabase.table("assessments").upsert(
+                assessment,
+                on_conflict="question_id,question_version",
             ).execute()
 
+            # Update progress counter (atomic increment via SQL function)
+            if update_progress:
+                supabase.rpc(
+                    "increment_questions_analyzed",
+                    {"p_exam_id": question_row["exam_id"]},
+                ).execute()
+        ITEMS.labels("validation", "questions").inc()
+
 
 async def run_single_validation(
     exam_id: str,
     question_id: str,
     supabase: Client,
     llm_client: LLMClient,
+    deterministic_only: bool = False,
 ) -> None:
     """Re-validate a single question without changing exam-level status."""
     try:
@@ -121,7 +174,12 @@ async def run_single_validation(
 
         semaphore = asyncio.Semaphore(1)
         await _validate_single_question(
-            question_row, llm_client, supabase, semaphore, update_progress=False
+            question_row,
+            llm_client,
+            supabase,
+            semaphore,
+            update_progress=False,
+            deterministic_only=deterministic_only,
         )
 
     except Exception as e:
@@ -131,17 +189,159 @@ async def run_single_validation(
         raise
 
 
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _update_run_item(
+    supabase: Client, run_id: str, question_id: str, fields: dict[str, Any]
+) -> None:
+    supabase.table("validation_run_items").update(
+        {**fields, "updated_at": _now()}
+    ).eq("run_id", run_id).eq("question_id", question_id).execute()
+
+
+async def _validate_run_item(
+    run_id: str,
+    question_row: dict[str, Any],
+    llm_client: LLMClient,
+    supabase: Client,
+    semaphore: asyncio.Semaphore,
+    retry_policy: RetryPolicy,
+    previous_attempts: int = 0,
+    deterministic_only: bool = False,
+) -> None:
+    """Validate one question of a run, retrying transient errors."""
+    question_id = question_row["id"]
+    for attempt in range(1, retry_policy.max_attempts + 1):
+        try:
+            await _validate_single_question(
+                question_row,
+                llm_client,
+                supabase,
+                semaphore,
+                deterministic_only=deterministic_only,
+            )
+        except retry_policy.retry_on as e:
+            if attempt == retry_policy.max_attempts:
+                error = e
+                break
+            delay = retry_policy.backoff_seconds * (2 ** (attempt - 1))
+            logger.warning(
+                f"Validation of question {question_id} failed "
+                f"(attempt {attempt}/{retry_policy.max_attempts}): {e}; "
+                f"retrying in {delay:.1f}s"
+            )
+            await asyncio.sleep(delay)
+        except Exception as e:
+            error = e
+            break
+        else:
+            _update_run_item(
+                supabase,
+                run_id,
+                question_id,
+                {
+                    "status": "done",
+                    "attempts": previous_attempts + attempt,
+                    "last_error": None,
+                },
+            )
+            return
+
+    _update_run_item(
+        supabase,
+        run_id,
+        question_id,
+        {
+            "status": "failed",
+            "attempts": previous_attempts + attempt,
+            "last_error": str(error)[:MAX_ERROR_LENGTH],
+        },
+    )
+    raise error
+
+
+async def _process_run(
+    run_id: str,
+    exam_id: str,
+    questions: list[dict[str, Any]],
+    already_done: int,
+    supabase: Client,
+    llm_client: LLMClient,
+    retry_policy: RetryPolicy,
+    previous_attempts: dict[str, int] | None = None,
+    deterministic_only: bool = False,
+) -> None:
+    """Validate the given questions of a run and record the outcome.
+
+    Every question is attempted even if others fail; the run (and the exam)
+    only completes when all of them are done.
+    """
+    previous_attempts = previous_attempts or {}
+    semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+
+    tasks = [
+        _validate_run_item(
+            run_id,
+            q,
+            llm_client,
+            supabase,
+            semaphore,
+            retry_policy,
+            previous_attempts.get(q["id"], 0),
+            deterministic_only,
+        )
+        for q in questions
+    ]
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    failures = [
+        (q["id"], r)
+        for q, r in zip(questions, results)
+        if isinstance(r, Exception)
+    ]
+
+    supabase.table("validation_runs").update(
+        {
+            "status": "failed" if failures else "completed",
+            "updated_at": _now(),
+            "completed_at": None if failures else _now(),
+        }
+    ).eq("id", run_id).execute()
+
+    if failures:
+        for question_id, error in failures:
+            logger.error(f"Validation failed for question {question_id}: {error}")
+        raise failures[0][1]
+
+    # Mark exam as completed with final progress count
+    supabase.table("exams").update(
+        {
+            "analysis_status": "completed",
+            "questions_analyzed": already_done + len(questions),
+        }
+    ).eq("id", exam_id).execute()
+
+
 async def run_validation(
     exam_id: str,
     supabase: Client,
     llm_client: LLMClient,
+    retry_policy: RetryPolicy = DEFAULT_RETRY_POLICY,
+    deterministic_only: bool = False,
 ) -> None:
     """Run the full validation pipeline for all questions in an exam.
 
     1. Fetch questions from Supabase
-    2. For each question: deterministic analysis + LLM validation
-    3. Write combined assessments
-    4. Update exam status
+    2. Record a validation run with one pending item per question
+    3. For each question: deterministic analysis + LLM validation, retried
+       per ``retry_policy``; the item is marked done or failed
+    4. Update run and exam status
+
+    A failing question does not stop the others. A failed or interrupted run
+    can be continued with ``resume_validation``. With ``deterministic_only``
+    only the deterministic layer runs (see _validate_single_question) and the
+    run is marked degraded.
     """
     try:
         # Update exam status to processing
@@ -150,12 +350,13 @@ async def run_validation(
         ).eq("id", exam_id).execute()
 
         # Fetch questions
-        response = (
-            supabase.table("questions")
-            .select("*")
-            .eq("exam_id", exam_id)
-            .execute()
-        )
+        with stage("validation", "supabase_fetch"):
+            response = (
+                supabase.table("questions")
+                .select("*")
+                .eq("exam_id", exam_id)
+                .execute()
+            )
         questions = response.data
 
         if not questions:
@@ -165,26 +366,134 @@ async def run_validation(
             ).eq("id", exam_id).execute()
             return
 
+        run = (
+            supabase.table("validation_runs")
+            .insert(
+                {"exam_id": exam_id, "status": "running", "degraded": deterministic_only}
+            )
+            .execute()
+        )
+        run_id = run.data[0]["id"]
+        supabase.table("validation_run_items").insert(
+            [
+                {
+                    "run_id": run_id,
+                    "question_id": q["id"],
+                    "question_version": q["version"],
+                    "status": "pending",
+                }
+                for q in questions
+            ]
+        ).execute()
+
         # Set question_count and reset progress
         supabase.table("exams").update(
             {"question_count": len(questions), "questions_analyzed": 0}
         ).eq("id", exam_id).execute()
 
-        semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+        await _process_run(
+            run_id,
+            exam_id,
+            questions,
+            0,
+            supabase,
+            llm_client,
+            retry_policy,
+            deterministic_only=deterministic_only,
+        )
 
-        tasks = [
-            _validate_single_question(q, llm_client, supabase, semaphore)
-            for q in questions
-        ]
-        await asyncio.gather(*tasks)
+    except Exception as e:
+        logger.error(f"Validation pipeline failed for exam {exam_id}: {e}")
+        supabase.table("exams").update(
+            {"analysis_status": "failed"}
+        ).eq("id", exam_id).execute()
+        raise
+
+
+async def resume_validation(
+    exam_id: str,
+    supabase: Client,
+    llm_client: LLMClient,
+    run_id: str | None = None,
+    retry_policy: RetryPolicy = DEFAULT_RETRY_POLICY,
+    deterministic_only: bool = False,
+) -> None:
+    """Continue a validation run, re-processing only unfinished questions.
 
-        # Mark exam as completed with final progress count
+    Without ``run_id`` the exam's latest unfinished run is resumed; if there
+    is none, a new run is started.
+    """
+    try:
+        if run_id is None:
+            latest = (
+                supabase.table("validation_runs")
+                .select("id")
+                .eq("exam_id", exam_id)
+                .neq("status", "completed")
+                .order("created_at", desc=True)
+                .limit(1)
+                .execute()
+            )
+            if not latest.data:
+                logger.info(
+                    f"No unfinished validation run for exam {exam_id}; starting a new one"
+                )
+                await run_validation(
+                    exam_id, supabase, llm_client, retry_policy, deterministic_only
+                )
+                return
+            run_id = latest.data[0]["id"]
+
+        items = (
+            supabase.table("validation_run_items")
+            .select("*")
+            .eq("run_id", run_id)
+            .execute()
+        ).data or []
+        unfinished = [item for item in items if item["status"] != "done"]
+        already_done = len(items) - len(unfinished)
+
+        run_update = {"status": "running", "updated_at": _now()}
+        if deterministic_only:
+            # Stays set when a later resume runs in full: items done now keep
+            # their deterministic-only assessments
+            run_update["degraded"] = True
+        supabase.table("validation_runs").update(run_update).eq("id", run_id).execute()
         supabase.table("exams").update(
-            {"analysis_status": "completed", "questions_analyzed": len(questions)}
+            {
+                "analysis_status": "processing",
+                "question_count": len(items),
+                "questions_analyzed": already_done,
+            }
         ).eq("id", exam_id).execute()
 
+        questions = []
+        if unfinished:
+            questions = (
+                supabase.table("questions")
+                .select("*")
+                .in_("id", [item["question_id"] for item in unfinished])
+                .execute()
+            ).data or []
+
+        logger.info(
+            f"Resuming validation run {run_id} for exam {exam_id}: "
+            f"{already_done} done, {len(questions)} to process"
+        )
+        await _process_run(
+            run_id,
+            exam_id,
+            questions,
+            already_done,
+            supabase,
+            llm_client,
+            retry_policy,
+            {item["question_id"]: item.get("attempts") or 0 for item in unfinished},
+            deterministic_only,
+        )
+
     except Exception as e:
-        logger.error(f"Validation pipeline failed for exam {exam_id}: {e}")
+        logger.error(f"Resumed validation failed for exam {exam_id}: {e}")
         supabase.table("exams").update(
             {"analysis_status": "failed"}
         ).eq("id", exam_id).execute()
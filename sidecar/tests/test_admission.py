@@ -0,0 +1,190 @@
+"""Admission control for LLM work (services/admission.py)."""
+
+import asyncio
+import threading
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from main import app
+from services.admission import (
+    ADMIT,
+    DEGRADE,
+    QUEUE,
+    REJECT,
+    AdmissionController,
+    Decision,
+    Estimate,
+    Reservation,
+    admitted,
+    decide,
+    estimate_generation,
+    estimate_validation,
+)
+
+
+def _question(stem: str = "Wat is de dekkingsbijdrage?") -> dict:
+    return {
+        "stem": stem,
+        "options": [
+            {"text": "Omzet min variabele kosten", "position": 0, "is_correct": True},
+            {"text": "Omzet min vaste kosten", "position": 1, "is_correct": False},
+        ],
+    }
+
+
+@pytest.fixture
+def limits():
+    with patch.multiple(
+        "services.admission.settings",
+        admission_max_inflight_tokens=1000,
+        admission_user_max_inflight_tokens=600,
+        admission_user_daily_budget_usd=1.0,
+        admission_exam_daily_budget_usd=0,
+    ):
+        yield
+
+
+def _spent(cost_usd: float) -> MagicMock:
+    """Supabase mock whose llm_usage_daily rows add up to ``cost_usd`` today."""
+    supabase = MagicMock()
+    query = supabase.table.return_value.select.return_value.eq.return_value.eq.return_value
+    query.execute.return_value.data = [{"cost_usd": cost_usd}]
+    return supabase
+
+
+class TestEstimates:
+    def test_validation_scales_with_questions(self):
+        one = estimate_validation([_question()])
+        hundred = estimate_validation([_question()] * 100)
+
+        assert one.calls == 1
+        assert hundred.input_tokens == 100 * one.input_tokens
+        assert hundred.cost_usd == pytest.approx(100 * one.cost_usd, rel=1e-3)
+        # The criteria in the prompt dominate the input
+        assert one.input_tokens > 1000
+
+    def test_generation_includes_shards_and_validation(self):
+        estimate = estimate_generation({"count": 12, "num_options": 4})
+
+        # 3 shards of generation, then 12 validations
+        assert estimate.calls == 15
+        assert estimate.cost_usd > estimate_validation([_question()] * 12).cost_usd
+
+
+class TestAdmissionController:
+    def test_large_job_reserves_one_user_share(self, limits):
+        controller = AdmissionController()
+        big = Reservation(Estimate(input_tokens=5000), user_id="u1")
+        assert big.tokens == 600
+        assert controller.acquire(big, timeout=0)
+
+        # The same user waits; another user still fits next to it
+        assert not controller.fits(Reservation(Estimate(input_tokens=100), user_id="u1"))
+        assert controller.fits(Reservation(Estimate(input_tokens=300), user_id="u2"))
+        assert not controller.fits(Reservation(Estimate(input_tokens=500), user_id="u3"))
+
+    def test_queued_work_starts_after_release(self, limits):
+        controller = AdmissionController()
+        first = Reservation(Estimate(input_tokens=600), user_id="u1")
+        second = Reservation(Estimate(input_tokens=600), user_id="u1")
+        controller.acquire(first)
+        assert not controller.acquire(second, timeout=0)
+
+        started = threading.Event()
+        waiter = threading.Thread(
+            target=lambda: controller.acquire(second, timeout=5) and started.set()
+        )
+        waiter.start()
+        controller.release(first)
+        waiter.join(5)
+
+        assert started.is_set()
+
+    def test_wait_on_the_event_loop(self, limits):
+        controller = AdmissionController()
+        first = Reservation(Estimate(input_tokens=600), user_id="u1")
+        second = Reservation(Estimate(input_tokens=600), user_id="u1")
+        controller.acquire(first)
+
+        async def main():
+            assert not await controller.wait(second, timeout=0.01)
+            waiting = asyncio.create_task(controller.wait(second, timeout=5))
+            await asyncio.sleep(0)
+            # Released from another thread, as the sync jobs do
+            await asyncio.to_thread(controller.release, first)
+            return await waiting
+
+        assert asyncio.run(main())
+        assert not controller.fits(first)
+
+
+class TestAdmitted:
+    def test_job_queued_too_long_is_failed(self, limits):
+        busy = AdmissionController()
+        busy.acquire(Reservation(Estimate(input_tokens=600), user_id="u1"))
+        estimate = Estimate(input_tokens=100)
+        decision = Decision(QUEUE, "", estimate, Reservation(estimate, user_id="u1"))
+        job = AsyncMock()
+        on_timeout = MagicMock()
+
+        with (
+            patch("services.admission.controller", busy),
+            patch("services.admission.settings.admission_job_queue_timeout_seconds", 0.01),
+        ):
+            asyncio.run(admitted(job(), decision, on_timeout))
+
+        job.assert_not_awaited()
+        (reason,) = on_timeout.call_args.args
+        assert "te druk" in reason
+
+
+class TestDecide:
+    def test_admits_within_budget(self, limits):
+        decision = decide(_spent(0.2), Estimate(input_tokens=100, cost_usd=0.1), "u1")
+
+        assert decision.action == ADMIT
+
+    def test_over_budget_degrades_or_rejects(self, limits):
+        estimate = Estimate(input_tokens=100, cost_usd=0.5)
+
+        assert decide(_spent(0.8), estimate, "u1", degradable=True).action == DEGRADE
+        rejected = decide(_spent(0.8), estimate, "u1")
+        assert rejected.action == REJECT
+        assert "Dagbudget" in rejected.reason
+
+    def test_queues_when_capacity_is_taken(self, limits):
+        busy = AdmissionController()
+        busy.acquire(Reservation(Estimate(input_tokens=600), user_id="u1"))
+
+        with patch("services.admission.controller", busy):
+            decision = decide(_spent(0), Estimate(input_tokens=100), "u1")
+
+        assert decision.action == QUEUE
+
+
+class TestEndpoints:
+    def test_generate_over_budget_is_rejected(self, limits):
+        supabase = _spent(0.99)
+        jobs = MagicMock()
+        jobs.select.return_value.eq.return_value.single.return_value.execute.return_value.data = {
+            "created_by": "u1",
+            "exam_id": "exam-1",
+            "specification": {"count": 10, "num_options": 4},
+        }
+        supabase.table.side_effect = lambda name: (
+            jobs if name == "generation_jobs" else supabase.table.return_value
+        )
+
+        with (
+            patch("main.get_supabase_client", return_value=supabase),
+            patch("main.run_generation") as run_generation,
+        ):
+            response = TestClient(app).post("/generate", json={"job_id": "job-1"})
+
+        assert response.status_code == 429
+        run_generation.assert_not_called()
+        update = jobs.update.call_args.args[0]
+        assert update["status"] == "failed"
+        assert update["error_message"] == response.json()["detail"]
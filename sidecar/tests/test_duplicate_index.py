@@ -0,0 +1,221 @@
+"""Near-duplicate question index (services/duplicate_index.py)."""
+
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from llm.schemas import BloomLevel, GeneratedQuestion, QuestionOption
+from main import app
+from parsers.schemas import ParsedOption, ParsedQuestion
+from parsers.validation import validate_questions
+from services.duplicate_index import (
+    DuplicateIndex,
+    QuestionBankCache,
+    check_near_duplicates,
+    drop_near_duplicates,
+)
+
+OPTIONS = [
+    {"text": "Omzet min variabele kosten", "position": 0, "is_correct": True},
+    {"text": "Omzet min vaste kosten", "position": 1, "is_correct": False},
+    {"text": "Vaste kosten min variabele kosten", "position": 2, "is_correct": False},
+]
+STEM = "Hoe bereken je de dekkingsbijdrage van een product?"
+
+
+def _unit(i: int) -> np.ndarray:
+    vector = np.zeros(768, dtype=np.float32)
+    vector[i] = 1.0
+    return vector
+
+
+def _parsed(stem: str, options: list[dict] = OPTIONS) -> ParsedQuestion:
+    return ParsedQuestion(stem=stem, options=[ParsedOption(**o) for o in options])
+
+
+class TestDuplicateIndex:
+    def test_finds_lexical_near_duplicate(self):
+        index = DuplicateIndex()
+        index.add("q-1", STEM, OPTIONS, exam_id="exam-1")
+        index.add("q-2", "Wat is het break-evenpunt?", [{"text": "Winst nul"}, {"text": "Omzet"}])
+
+        # Other wording of the stem, options in another order
+        (match,) = index.find(
+            "Hoe bereken je de dekkingsbijdrage van het product?", list(reversed(OPTIONS))
+        )
+
+        assert (match.key, match.exam_id, match.kind) == ("q-1", "exam-1", "lexical")
+        assert match.similarity >= 0.7
+        assert index.find("Welke kosten zijn vast?", [{"text": "Huur"}, {"text": "Grondstof"}]) == []
+
+    def test_finds_semantic_near_duplicate(self):
+        index = DuplicateIndex()
+        index.add("q-1", STEM, OPTIONS, embedding=_unit(0))
+        near = _unit(0) + 0.1 * _unit(1)
+        near /= np.linalg.norm(near)
+
+        (match,) = index.find("Wat levert elk verkocht stuk op?", [{"text": "x"}], near)
+
+        assert (match.key, match.kind) == ("q-1", "semantic")
+        assert index.find("Wat levert elk verkocht stuk op?", [{"text": "x"}], _unit(1)) == []
+
+    def test_lookup_scales_to_a_large_bank(self):
+        index = DuplicateIndex()
+        for i in range(5000):
+            index.add(f"q-{i}", f"Vraag {i}: bereken artikel {i * 7919} uit hoofdstuk {i % 13}", [])
+
+        matches = index.find("Vraag 4321: bereken artikel 34218599 uit hoofdstuk 5", [])
+
+        assert [m.key for m in matches][:1] == ["q-4321"]
+
+
+class TestQuestionBankCache:
+    def test_adds_only_new_questions_on_refresh(self):
+        supabase = MagicMock()
+        supabase.table.return_value.select.return_value.eq.return_value.execute.return_value.data = [
+            {"id": "exam-1"}
+        ]
+        questions = supabase.table.return_value.select.return_value.in_.return_value
+        first = [{"id": "q-1", "exam_id": "exam-1", "stem": STEM, "options": OPTIONS, "created_at": "t1"}]
+        second = [
+            *first,
+            {"id": "q-2", "exam_id": "exam-1", "stem": "Wat is omzet?", "options": [], "created_at": "t1"},
+        ]
+        questions.order.return_value.range.return_value.execute.return_value.data = first
+        questions.gte.return_value.order.return_value.range.return_value.execute.return_value.data = second
+        embed = AsyncMock(side_effect=lambda texts: np.stack([_unit(i) for i in range(len(texts))]))
+
+        cache = QuestionBankCache()
+        with patch("services.duplicate_index.embed_queries", embed):
+            index = asyncio.run(cache.get(supabase, "user-1"))
+            again = asyncio.run(cache.get(supabase, "user-1"))
+
+        assert again is index
+        assert len(index) == 2
+        questions.gte.assert_called_with("created_at", "t1")
+        # q-1 was embedded once, q-2 on the refresh
+        assert [len(c.args[0]) for c in embed.call_args_list] == [1, 1]
+
+    def test_refresh_outlives_a_caller_that_stops_waiting(self):
+        supabase = MagicMock()
+        supabase.table.return_value.select.return_value.eq.return_value.execute.return_value.data = [
+            {"id": "exam-1"}
+        ]
+        questions = supabase.table.return_value.select.return_value.in_.return_value
+        questions.order.return_value.range.return_value.execute.return_value.data = [
+            {"id": "q-1", "exam_id": "exam-1", "stem": STEM, "options": OPTIONS, "created_at": "t1"}
+        ]
+
+        async def slow_embed(texts):
+            await asyncio.sleep(0.05)
+            return np.stack([_unit(i) for i in range(len(texts))])
+
+        embed = AsyncMock(side_effect=slow_embed)
+        cache = QuestionBankCache()
+
+        async def main():
+            with pytest.raises(TimeoutError):
+                await asyncio.wait_for(cache.get(supabase, "user-1"), 0.01)
+            # The next lookup joins the refresh that kept running
+            return await cache.get(supabase, "user-1")
+
+        with patch("services.duplicate_index.embed_queries", embed):
+            index = asyncio.run(main())
+
+        assert len(index) == 1
+        embed.assert_awaited_once()
+
+
+class TestChecks:
+    def test_validation_warns_about_repeated_question(self):
+        questions = [
+            _parsed(STEM),
+            _parsed("Wat is het break-evenpunt?"),
+            _parsed("Hoe bereken je de dekkingsbijdrage van het product?"),
+        ]
+
+        response = asyncio.run(check_near_duplicates(validate_questions(questions), questions))
+
+        (warning,) = [w for w in response.results[2].warnings if w.code == "near_duplicate"]
+        assert "vraag 1" in warning.message
+        assert not any(w.code == "near_duplicate" for w in response.results[0].warnings)
+        assert "1 van 3 vragen lijken sterk op een andere vraag" in response.warnings
+
+    def test_validate_endpoint_checks_the_bank(self):
+        bank = DuplicateIndex()
+        bank.add("q-9", STEM, OPTIONS, exam_id="exam-0", embedding=_unit(0))
+
+        with (
+            patch("main.get_supabase_client"),
+            patch("main.question_banks.for_exam", AsyncMock(return_value=bank)),
+            patch(
+                "services.duplicate_index.embed_queries",
+                AsyncMock(return_value=np.stack([_unit(0), _unit(1)])),
+            ),
+        ):
+            response = TestClient(app).post(
+                "/validate",
+                json={
+                    "questions": [
+                        {"stem": "Wat levert een verkocht stuk op?", "options": OPTIONS[:2]},
+                        {"stem": "Wat zijn vaste kosten?", "options": OPTIONS[:2]},
+                    ],
+                    "exam_id": "exam-1",
+                },
+            )
+
+        (warning,) = response.json()["results"][0]["warnings"][-1:]
+        assert warning["code"] == "near_duplicate"
+        assert "uit de vraagbank" in warning["message"]
+        assert response.json()["results"][1]["warnings"][-1]["code"] != "near_duplicate"
+
+    def test_validate_endpoint_does_not_wait_for_a_slow_bank(self):
+        async def building(supabase, exam_id):
+            await asyncio.sleep(1)
+
+        with (
+            patch("main.get_supabase_client"),
+            patch("main.BANK_WAIT_SECONDS", 0.01),
+            patch("main.question_banks.for_exam", building),
+        ):
+            response = TestClient(app).post(
+                "/validate",
+                json={
+                    "questions": [
+                        {"stem": STEM, "options": OPTIONS[:2]},
+                        {"stem": "Hoe bereken je de dekkingsbijdrage van het product?", "options": OPTIONS[:2]},
+                    ],
+                    "exam_id": "exam-1",
+                },
+            )
+
+        # Checked against the upload only
+        (warning,) = response.json()["results"][1]["warnings"][-1:]
+        assert warning["code"] == "near_duplicate"
+        assert "vraag 1" in warning["message"]
+
+    def test_generation_filter_drops_bank_repeats(self):
+        def generated(stem: str) -> GeneratedQuestion:
+            return GeneratedQuestion(
+                stem=stem,
+                options=[QuestionOption(**o) for o in OPTIONS],
+                bloom_level=BloomLevel.toepassen,
+                chunk_ids=[],
+            )
+
+        bank = DuplicateIndex()
+        bank.add("q-1", STEM, OPTIONS, embedding=_unit(0))
+        questions = [generated("Nieuwe vraag A"), generated("Herhaalde vraag"), generated("Nieuwe vraag B")]
+
+        with patch(
+            "services.duplicate_index.embed_queries",
+            AsyncMock(return_value=np.stack([_unit(1), _unit(0), _unit(1)])),
+        ):
+            kept, embeddings = asyncio.run(drop_near_duplicates(questions, bank))
+
+        # The second repeats the bank, the third repeats the first
+        assert [q.stem for q in kept] == ["Nieuwe vraag A"]
+        assert embeddings.shape == (1, 768)
@@ -3,6 +3,7 @@
 import asyncio
 from unittest.mock import AsyncMock, MagicMock, patch
 
+import numpy as np
 import pytest
 
 from rag.chunker import Chunk
@@ -40,7 +41,7 @@ class TestRetrieveChunks:
             "rag.retriever.embed_query",
             new_callable=AsyncMock,
         ) as mock_embed:
-            mock_embed.return_value = [0.1] * 768
+            mock_embed.return_value = np.full(768, 0.1, dtype=np.float32)
 
             chunks = await retrieve_chunks(
                 query="Leerdoel over toetsing",
@@ -52,11 +53,11 @@ class TestRetrieveChunks:
         # Embedding was called with the query
         mock_embed.assert_called_once_with("Leerdoel over toetsing")
 
-        # RPC was called with correct parameters
+        # RPC was called with correct parameters (pgvector text literal)
         mock_supabase.rpc.assert_called_once_with(
             "match_chunks",
             {
-                "query_embedding": [0.1] * 768,
+                "query_embedding": "[" + ",".join(["0.1"] * 768) + "]",
                 "match_count": 5,
                 "filter_material_id": "mat-1",
             },
@@ -93,6 +94,396 @@ class TestRetrieveChunks:
         assert len(chunks) == 0
 
 
+# ── Local vector index (retrieval fast path) ─────────────────────────────────
+
+def _unit_vectors(count: int, seed: int = 0) -> np.ndarray:
+    vectors = np.random.default_rng(seed).standard_normal((count, 768)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _mock_chunk_table(vectors: np.ndarray) -> MagicMock:
+    """Supabase mock whose chunks table returns one row per vector."""
+    from rag.vectors import to_pgvectors
+
+    rows = [
+        {
+            "content": f"Chunk {i}",
+            "page": i + 1,
+            "position": i,
+            "metadata": {"material_id": "mat-1"},
+            "embedding": literal,
+        }
+        for i, literal in enumerate(to_pgvectors(vectors))
+    ]
+    mock_supabase = MagicMock()
+    query = mock_supabase.table.return_value.select.return_value.eq.return_value.order.return_value
+    query.range.return_value.execute.return_value = MagicMock(data=rows)
+    return mock_supabase
+
+
+class TestLocalIndex:
+    def test_search_ranks_by_similarity(self, tmp_path):
+        from rag.local_index import LocalIndexCache
+
+        vectors = _unit_vectors(20)
+        cache = LocalIndexCache(index_dir=str(tmp_path))
+        index = cache.get("mat-1", 20, _mock_chunk_table(vectors))
+
+        # A query close to chunk 7, a bit less close to chunk 3
+        query = vectors[7] + 0.5 * vectors[3]
+        query /= np.linalg.norm(query)
+        hits = index.search(query, top_k=2, threshold=0.0)
+
+        assert [c.position for c in hits] == [7, 3]
+        assert hits[0].text == "Chunk 7"
+        assert hits[0].page == 8
+        assert hits[0].score > hits[1].score
+
+    def test_loaded_from_disk_without_database(self, tmp_path):
+        from rag.local_index import LocalIndexCache
+
+        vectors = _unit_vectors(5)
+        LocalIndexCache(index_dir=str(tmp_path)).get("mat-1", 5, _mock_chunk_table(vectors))
+
+        fresh = LocalIndexCache(index_dir=str(tmp_path))
+        untouched = MagicMock()
+        index = fresh.get("mat-1", 5, untouched)
+
+        untouched.table.assert_not_called()
+        assert isinstance(index.embeddings, np.memmap)
+        assert index.search(vectors[2], top_k=1)[0].position == 2
+
+    def test_rebuilt_when_chunk_generation_changes(self, tmp_path):
+        from rag.local_index import LocalIndexCache
+
+        cache = LocalIndexCache(index_dir=str(tmp_path))
+        cache.get("mat-1", 1, _mock_chunk_table(_unit_vectors(5)))
+
+        updated = _mock_chunk_table(_unit_vectors(8, seed=1))
+        index = cache.get("mat-1", 2, updated)
+
+        updated.table.assert_called_with("chunks")
+        assert len(index.chunks) == 8
+
+    def test_same_chunk_count_new_generation_is_not_stale(self, tmp_path):
+        """A re-embed with as many chunks as before must not serve old vectors."""
+        from rag.local_index import LocalIndexCache
+
+        old, new = _unit_vectors(5), _unit_vectors(5, seed=1)
+        LocalIndexCache(index_dir=str(tmp_path)).get("mat-1", 1, _mock_chunk_table(old))
+        cache = LocalIndexCache(index_dir=str(tmp_path))
+        cache.get("mat-1", 1, MagicMock())
+
+        index = cache.get("mat-1", 2, _mock_chunk_table(new))
+
+        assert np.allclose(index.embeddings, new)
+        assert [p.name for p in (tmp_path / "mat-1").iterdir()] == ["2"]
+
+    def test_lru_eviction(self, tmp_path):
+        from rag.local_index import LocalIndexCache
+
+        cache = LocalIndexCache(index_dir=str(tmp_path), max_materials=2)
+        for material_id in ("mat-1", "mat-2", "mat-1", "mat-3"):
+            cache.get(material_id, 3, _mock_chunk_table(_unit_vectors(3)))
+
+        assert list(cache._entries) == ["mat-1", "mat-3"]
+
+    @pytest.mark.asyncio
+    async def test_retriever_uses_local_index(self, tmp_path):
+        from rag import retriever
+        from rag.local_index import LocalIndexCache
+
+        vectors = _unit_vectors(10)
+        mock_supabase = _mock_chunk_table(vectors)
+
+        with patch.object(
+            retriever, "local_index_cache", LocalIndexCache(index_dir=str(tmp_path))
+        ), patch(
+            "rag.retriever.embed_query",
+            new_callable=AsyncMock,
+            return_value=vectors[4],
+        ):
+            chunks = await retriever.retrieve_chunks(
+                query="Leerdoel",
+                material_id="mat-1",
+                supabase=mock_supabase,
+                top_k=3,
+                chunk_count=10,
+                chunk_generation=1,
+                hybrid=False,
+            )
+
+        mock_supabase.rpc.assert_not_called()
+        assert chunks[0].position == 4
+        assert chunks[0].score == pytest.approx(1.0, abs=1e-4)
+
+
+# ── Hybrid BM25 + vector retrieval ───────────────────────────────────────────
+
+class TestHybridRetrieval:
+    def test_tokenize_keeps_article_numbers(self):
+        from rag.bm25 import tokenize
+
+        terms = tokenize("Volgens art. 7:658 BW is de werkgever aansprakelijk.")
+
+        assert "7:658" in terms
+        assert "658" in terms
+        assert "werkgever" in terms
+        assert "de" not in terms
+
+    def test_bm25_ranks_exact_terms_first(self):
+        from rag.bm25 import BM25Index
+
+        index = BM25Index([
+            "De werkgever zorgt voor een veilige werkplek.",
+            "Artikel 7:658 BW regelt de zorgplicht van de werkgever.",
+            "Toetsing en beoordeling in het hoger onderwijs.",
+        ])
+
+        hits = index.search("zorgplicht 7:658", top_k=3)
+
+        assert hits[0][0] == 1
+        assert [doc for doc, _ in hits] == [1]
+        assert index.search("onbekendwoord", top_k=3) == []
+
+    def test_reciprocal_rank_fusion(self):
+        from rag.bm25 import RRF_K, reciprocal_rank_fusion
+
+        a, b, c = (Chunk(text=t, position=i) for i, t in enumerate("abc"))
+        fused = reciprocal_rank_fusion([[a, b], [c, b]], top_k=2)
+
+        # b is ranked second in both lists, so it beats a and c
+        assert [chunk.position for chunk in fused] == [1, 0]
+        assert fused[0].score == pytest.approx(2 / (RRF_K + 2))
+        assert fused[0].text == "b"
+
+    @pytest.mark.asyncio
+    async def test_retriever_fuses_vector_and_keyword_hits(self, tmp_path):
+        from rag import retriever
+        from rag.local_index import LocalIndexCache
+
+        vectors = _unit_vectors(10)
+        mock_supabase = _mock_chunk_table(vectors)
+        cache = LocalIndexCache(index_dir=str(tmp_path))
+        index = cache.get("mat-1", 1, mock_supabase)
+        index.chunks[8].text = "Artikel 7:658 BW over de zorgplicht"
+
+        with patch.object(retriever, "local_index_cache", cache), patch(
+            "rag.retriever.embed_query",
+            new_callable=AsyncMock,
+            return_value=vectors[4],
+        ):
+            chunks = await retriever.retrieve_chunks(
+                query="zorgplicht artikel 7:658",
+                material_id="mat-1",
+                supabase=mock_supabase,
+                top_k=2,
+                chunk_count=10,
+                chunk_generation=1,
+                hybrid=True,
+            )
+
+        mock_supabase.rpc.assert_not_called()
+        # Chunk 4 only matches the vector leg, chunk 8 only the keyword leg
+        assert sorted(c.position for c in chunks) == [4, 8]
+
+
+# ── Multi-query retrieval ────────────────────────────────────────────────────
+
+class TestMultiQueryRetrieval:
+    def test_expand_queries(self):
+        from rag.multi_query import expand_queries
+
+        queries = expand_queries(
+            "Studenten passen artikel 7:658 BW toe op arbeidsongevallen",
+            bloom_level="toepassen",
+        )
+
+        assert queries[0] == "Studenten passen artikel 7:658 BW toe op arbeidsongevallen"
+        assert queries[1].startswith("Toepassing van")
+        assert any("7:658" in q for q in queries[2:])
+        assert len(queries) == len(set(queries))
+        assert expand_queries("   ") == []
+
+    def test_mmr_prefers_diverse_chunks(self):
+        from rag.multi_query import mmr_select
+
+        base = _unit_vectors(2)
+        near_duplicate = base[0] + 0.05 * base[1]
+        near_duplicate /= np.linalg.norm(near_duplicate)
+        embeddings = np.stack([base[0], near_duplicate, base[1]])
+        relevance = np.array([0.90, 0.89, 0.80], dtype=np.float32)
+
+        assert mmr_select(embeddings, relevance, top_k=2, mmr_lambda=0.5) == [0, 2]
+        assert mmr_select(embeddings, relevance, top_k=2, mmr_lambda=1.0) == [0, 1]
+
+    @pytest.mark.asyncio
+    async def test_embeds_once_and_deduplicates(self, tmp_path):
+        from rag import retriever
+        from rag.local_index import LocalIndexCache
+
+        vectors = _unit_vectors(10)
+        mock_supabase = _mock_chunk_table(vectors)
+
+        with patch.object(
+            retriever, "local_index_cache", LocalIndexCache(index_dir=str(tmp_path))
+        ), patch(
+            "rag.retriever.embed_queries",
+            new_callable=AsyncMock,
+            return_value=np.stack([vectors[2], vectors[2], vectors[6]]),
+        ) as mock_embed:
+            chunks = await retriever.retrieve_chunks_multi(
+                queries=["a", "b", "c"],
+                material_id="mat-1",
+                supabase=mock_supabase,
+                top_k=5,
+                chunk_count=10,
+                chunk_generation=1,
+                hybrid=False,
+            )
+
+        mock_embed.assert_awaited_once_with(["a", "b", "c"])
+        mock_supabase.rpc.assert_not_called()
+        assert sorted(c.position for c in chunks) == [2, 6]
+        assert all(c.score == pytest.approx(1.0, abs=1e-4) for c in chunks)
+
+    @pytest.mark.asyncio
+    async def test_rpc_path_fetches_candidate_embeddings(self):
+        from rag.retriever import retrieve_chunks_multi
+        from rag.vectors import to_pgvectors
+
+        vectors = _unit_vectors(3)
+        literals = to_pgvectors(vectors)
+        mock_supabase = MagicMock()
+        mock_supabase.rpc.return_value.execute.return_value = MagicMock(
+            data=[
+                {"content": f"Chunk {i}", "position": i, "similarity": 0.8}
+                for i in range(3)
+            ]
+        )
+        mock_supabase.table.return_value.select.return_value.eq.return_value.in_.return_value.execute.return_value = MagicMock(
+            data=[{"position": i, "embedding": literals[i]} for i in (2, 0, 1)]
+        )
+
+        with patch(
+            "rag.retriever.embed_queries",
+            new_callable=AsyncMock,
+            return_value=vectors[[1, 0]],
+        ):
+            chunks = await retrieve_chunks_multi(
+                queries=["a", "b"],
+                material_id="mat-1",
+                supabase=mock_supabase,
+                top_k=2,
+            )
+
+        assert mock_supabase.rpc.call_count == 2
+        assert {c.position for c in chunks} == {0, 1}
+
+    @pytest.mark.asyncio
+    async def test_pipeline_uses_multi_query_mode(self):
+        from services.generation_pipeline import run_generation
+
+        mock_supabase = MagicMock()
+        mock_supabase.table.return_value.select.return_value.eq.return_value.single.return_value.execute.return_value = MagicMock(
+            data={
+                "id": "job-1",
+                "material_id": "mat-1",
+                "exam_id": "exam-1",
+                "chunk_count": 4,
+                "specification": {
+                    "count": 3,
+                    "bloom_level": "analyseren",
+                    "learning_goal": "Betrouwbaarheid van toetsen",
+                    "retrieval_mode": "multi_query",
+                },
+            }
+        )
+
+        with patch(
+            "services.generation_pipeline.get_supabase_client",
+            return_value=mock_supabase,
+        ), patch(
+            "services.generation_pipeline.retrieve_chunks_multi",
+            new_callable=AsyncMock,
+            return_value=[],
+        ) as mock_multi, patch(
+            "services.generation_pipeline.retrieve_chunks",
+            new_callable=AsyncMock,
+        ) as mock_single, patch("services.generation_pipeline.LLMClient"):
+            with pytest.raises(ValueError):
+                await run_generation("job-1")
+
+        mock_single.assert_not_called()
+        queries = mock_multi.call_args.kwargs["queries"]
+        assert queries[0] == "Betrouwbaarheid van toetsen"
+        assert len(queries) > 1
+
+
+# ── Retrieval result cache ───────────────────────────────────────────────────
+
+class TestRetrievalCache:
+    def test_ttl_expiry(self):
+        from rag.retrieval_cache import RetrievalCache
+
+        now = [0.0]
+        cache = RetrievalCache(max_entries=10, ttl_seconds=60, clock=lambda: now[0])
+        key = cache.key("mat-1", 1, "single", "leerdoel", 5, True)
+        cache.put(key, [Chunk(text="a", position=0)])
+
+        now[0] = 59.0
+        assert [c.text for c in cache.get(key)] == ["a"]
+        now[0] = 61.0
+        assert cache.get(key) is None
+
+    def test_lru_and_invalidate(self):
+        from rag.retrieval_cache import RetrievalCache
+
+        cache = RetrievalCache(max_entries=2, ttl_seconds=60)
+        keys = [cache.key(m, 1, "single", "q", 5, True) for m in ("mat-1", "mat-2", "mat-3")]
+        cache.put(keys[0], [])
+        cache.put(keys[1], [])
+        cache.get(keys[0])
+        cache.put(keys[2], [])
+
+        assert cache.get(keys[1]) is None
+        assert cache.get(keys[0]) == []
+
+        cache.invalidate("mat-1")
+        assert cache.get(keys[0]) is None
+        assert cache.get(keys[2]) == []
+
+    @pytest.mark.asyncio
+    async def test_hit_skips_encoder_and_search(self):
+        from rag import retriever
+        from rag.retrieval_cache import RetrievalCache
+
+        mock_supabase = MagicMock()
+        mock_supabase.rpc.return_value.execute.return_value = MagicMock(
+            data=[{"content": "Chunk", "position": 0, "similarity": 0.9}]
+        )
+
+        with patch.object(
+            retriever, "retrieval_cache", RetrievalCache(max_entries=10, ttl_seconds=60)
+        ), patch(
+            "rag.retriever.embed_query",
+            new_callable=AsyncMock,
+            return_value=np.zeros(768, dtype=np.float32),
+        ) as mock_embed:
+            for generation in (3, 3, 4):
+                chunks = await retriever.retrieve_chunks(
+                    query="Leerdoel",
+                    material_id="mat-1",
+                    supabase=mock_supabase,
+                    chunk_generation=generation,
+                )
+                assert chunks[0].text == "Chunk"
+
+        # Second call was a cache hit; a new generation misses
+        assert mock_embed.await_count == 2
+        assert mock_supabase.rpc.call_count == 2
+
+
 # ── T13.2: build_generation_prompt ───────────────────────────────────────────
 
 class TestBuildGenerationPrompt:
@@ -191,6 +582,7 @@ class TestGenerationPipeline:
                     "bloom_level": "begrijpen",
                     "learning_goal": "Studenten begrijpen toetstheorie.",
                     "num_options": 4,
+                    "generation_mode": "single",
                 },
             }
         )
@@ -325,3 +717,598 @@ class TestGenerationPipeline:
             if c.args and isinstance(c.args[0], dict) and c.args[0].get("status") == "failed"
         ]
         assert len(failed_updates) >= 1
+
+    @pytest.mark.asyncio
+    async def test_pipeline_reports_shortfall_on_job(self):
+        from llm.schemas import GenerationResult
+        from services.generation_pipeline import run_generation
+
+        mock_supabase = MagicMock()
+        mock_supabase.table.return_value.select.return_value.eq.return_value.single.return_value.execute.return_value = MagicMock(
+            data={
+                "id": "job-1",
+                "material_id": "mat-1",
+                "exam_id": "exam-1",
+                "specification": {"count": 3, "learning_goal": "Test", "generation_mode": "single"},
+            }
+        )
+        mock_supabase.table.return_value.insert.return_value.execute.return_value = MagicMock(
+            data=[{"id": "q-gen-1"}]
+        )
+
+        with patch(
+            "services.generation_pipeline.get_supabase_client",
+            return_value=mock_supabase,
+        ), patch(
+            "services.generation_pipeline.retrieve_chunks",
+            new_callable=AsyncMock,
+            return_value=[Chunk(text="Bron", position=0)],
+        ), patch("services.generation_pipeline.LLMClient") as MockLLMClient, patch(
+            "services.generation_pipeline.run_validation", new_callable=AsyncMock
+        ):
+            MockLLMClient.return_value.generate_questions.return_value = GenerationResult(
+                questions=[_generated("Vraag 1"), _generated("Vraag 2")]
+            )
+            await run_generation("job-1")
+
+        (completed,) = [
+            c.args[0]
+            for c in mock_supabase.table.return_value.update.call_args_list
+            if c.args[0].get("status") == "completed"
+        ]
+        assert completed["warning"] == "Er zijn 2 van de 3 gevraagde vragen gegenereerd."
+
+
+# ── Context packing for the generation prompt ────────────────────────────────
+
+class TestContextPacking:
+    def test_orders_by_score_within_budget(self):
+        from llm.context_packer import estimate_tokens, pack_context
+
+        chunks = [
+            Chunk(text="a" * 350, position=0, score=0.71),
+            Chunk(text="b" * 350, position=5, score=0.95),
+            Chunk(text="c" * 3500, position=9, score=0.90),
+            Chunk(text="d" * 350, position=12, score=0.80),
+        ]
+
+        packed = pack_context(chunks, budget_tokens=3 * estimate_tokens("a" * 350))
+
+        # The large chunk does not fit and is skipped for the smaller ones
+        assert [c.position for c in packed] == [5, 12, 0]
+
+    def test_removes_chunking_overlap(self):
+        from llm.context_packer import pack_context
+        from rag.chunker import chunk_text
+
+        text = " ".join(f"Zin nummer {i} over toetsing." for i in range(200))
+        chunks = chunk_text(text, chunk_size=500, chunk_overlap=100)
+        assert len(chunks) > 3
+
+        packed = pack_context(chunks, budget_tokens=100_000)
+        joined = " ".join(" ".join(c.text for c in packed).split())
+
+        assert len(packed) == len(chunks)
+        assert len(joined) < sum(len(c.text) for c in chunks)
+        for i in range(200):
+            assert joined.count(f"Zin nummer {i} over") == 1
+
+    def test_truncates_single_oversized_chunk(self):
+        from llm.context_packer import pack_context
+
+        packed = pack_context([Chunk(text="x" * 10_000, position=0)], budget_tokens=100)
+
+        assert len(packed) == 1
+        assert len(packed[0].text) <= 350
+
+    def test_prompt_respects_input_budget(self):
+        from llm.context_packer import estimate_tokens
+        from llm.prompts.generation import build_generation_prompt
+
+        spec = {"count": 2, "bloom_level": "begrijpen", "learning_goal": "Test"}
+        chunks = [
+            Chunk(text=f"Chunk {i} " + "tekst " * 300, position=i * 10, score=1 - i / 100)
+            for i in range(40)
+        ]
+
+        messages = build_generation_prompt(spec, chunks, input_token_budget=6000)
+        total = estimate_tokens(messages[0]["content"] + messages[1]["content"])
+
+        assert total <= 6000 + 100
+        assert '<chunk id="0">\nChunk 0 ' in messages[1]["content"]
+        assert "Chunk 39 " not in messages[1]["content"]
+
+    def test_prompt_maps_chunk_ids_to_sources(self):
+        from llm.prompts.generation import build_generation_prompt_with_sources
+
+        chunks = [
+            Chunk(text="Laag", position=0, score=0.71),
+            Chunk(text="Hoog", position=5, score=0.95),
+            Chunk(text="x" * 100_000, position=9, score=0.90),
+            Chunk(text="Midden", position=12, score=0.80),
+        ]
+
+        messages, sources = build_generation_prompt_with_sources(
+            {"count": 2}, chunks, input_token_budget=6000
+        )
+
+        # Reordered by score, the oversized chunk dropped
+        assert sources == [1, 3, 0]
+        assert '<chunk id="0">\nHoog' in messages[1]["content"]
+
+    def test_max_tokens_scales_with_count(self):
+        from llm.context_packer import (
+            MAX_OUTPUT_TOKENS,
+            MIN_OUTPUT_TOKENS,
+            generation_max_tokens,
+        )
+
+        assert generation_max_tokens(1) == MIN_OUTPUT_TOKENS
+        assert generation_max_tokens(10) > generation_max_tokens(5) > 4096 / 2
+        assert generation_max_tokens(500) == MAX_OUTPUT_TOKENS
+
+
+# ── Sharded generation ───────────────────────────────────────────────────────
+
+def _generated(stem: str, chunk_ids: list[str] | None = None):
+    from llm.schemas import BloomLevel, GeneratedQuestion, QuestionOption
+
+    return GeneratedQuestion(
+        stem=stem,
+        options=[
+            QuestionOption(text="Juist", position=0, is_correct=True),
+            QuestionOption(text="Onjuist", position=1, is_correct=False),
+        ],
+        bloom_level=BloomLevel.begrijpen,
+        chunk_ids=chunk_ids or ["0"],
+    )
+
+
+class TestShardedGeneration:
+    def test_plan_disjoint_subsets(self):
+        from services.sharded_generation import plan_shards
+
+        chunks = [Chunk(text=str(i), position=i) for i in range(20)]
+        shards = plan_shards(12, chunks, shard_size=5)
+
+        assert [c for c, _ in shards] == [4, 4, 4]
+        all_indices = [i for _, subset in shards for i in subset]
+        assert sorted(all_indices) == list(range(20))
+
+    def test_plan_rotating_subsets_for_few_chunks(self):
+        from services.sharded_generation import plan_shards
+
+        chunks = [Chunk(text=str(i), position=i) for i in range(4)]
+        shards = plan_shards(40, chunks, shard_size=5)
+
+        assert sum(c for c, _ in shards) == 40
+        assert len(shards) == 8
+        assert all(len(subset) == 3 for _, subset in shards)
+        assert len({tuple(subset) for _, subset in shards}) == 4
+
+    @pytest.mark.asyncio
+    async def test_runs_shards_concurrently_and_merges(self):
+        import threading
+
+        from llm.schemas import GenerationResult
+        from services.sharded_generation import generate_sharded
+
+        barrier = threading.Barrier(3, timeout=5)
+        calls = []
+
+        def fake_generate(spec, shard_chunks):
+            calls.append((spec["count"], [c.position for c in shard_chunks]))
+            barrier.wait()  # Fails unless all three shards run at once
+            first = shard_chunks[0].position
+            return GenerationResult(
+                questions=[
+                    _generated(f"Vraag {first}-{i}", chunk_ids=["1"])
+                    for i in range(spec["count"])
+                ]
+            )
+
+        llm_client = MagicMock()
+        llm_client.generate_questions.side_effect = fake_generate
+        chunks = [Chunk(text=str(i), position=i) for i in range(9)]
+
+        with patch(
+            "services.sharded_generation.embed_queries",
+            new_callable=AsyncMock,
+            side_effect=lambda stems: _unit_vectors(len(stems)),
+        ):
+            result = await generate_sharded(
+                llm_client, {"count": 15, "learning_goal": "Test"}, chunks
+            )
+
+        assert len(calls) == 3
+        assert len(result.questions) == 15
+        # Shard-local chunk id "1" is mapped back to the full chunk list
+        assert result.questions[0].chunk_ids == ["3"]
+        assert result.questions[5].chunk_ids == ["4"]
+
+    @pytest.mark.asyncio
+    async def test_deduplicates_similar_stems(self):
+        from services.sharded_generation import deduplicate_questions
+
+        vectors = _unit_vectors(2)
+        near = vectors[0] + 0.01 * vectors[1]
+        near /= np.linalg.norm(near)
+
+        with patch(
+            "services.sharded_generation.embed_queries",
+            new_callable=AsyncMock,
+            return_value=np.stack([vectors[0], near, vectors[1]]),
+        ):
+            questions = await deduplicate_questions(
+                [_generated("Wat is X?"), _generated("Wat is X precies?"), _generated("Wat is Y?")]
+            )
+
+        assert [q.stem for q in questions] == ["Wat is X?", "Wat is Y?"]
+
+    @pytest.mark.asyncio
+    async def test_failed_shard_is_isolated(self):
+        from llm.client import LLMValidationError
+        from llm.schemas import GenerationResult
+        from services.sharded_generation import generate_sharded
+
+        def fake_generate(spec, shard_chunks):
+            if shard_chunks[0].position == 0:
+                raise LLMValidationError("truncated")
+            return GenerationResult(
+                questions=[_generated(f"Vraag {i}") for i in range(spec["count"])]
+            )
+
+        llm_client = MagicMock()
+        llm_client.generate_questions.side_effect = fake_generate
+        chunks = [Chunk(text=str(i), position=i) for i in range(6)]
+
+        with patch(
+            "services.sharded_generation.embed_queries",
+            new_callable=AsyncMock,
+            side_effect=lambda stems: _unit_vectors(len(stems)),
+        ):
+            result = await generate_sharded(llm_client, {"count": 10}, chunks)
+
+            assert len(result.questions) == 5
+
+            llm_client.generate_questions.side_effect = LLMValidationError("down")
+            with pytest.raises(LLMValidationError):
+                await generate_sharded(llm_client, {"count": 10}, chunks)
+
+    @pytest.mark.asyncio
+    async def test_tops_up_questions_lost_to_a_failed_shard(self):
+        from llm.client import LLMValidationError
+        from llm.schemas import GenerationResult
+        from services.sharded_generation import generate_sharded
+
+        calls = []
+
+        def fake_generate(spec, shard_chunks):
+            calls.append(spec["count"])
+            if len(calls) == 1:
+                raise LLMValidationError("overloaded")
+            return GenerationResult(
+                questions=[_generated(f"Vraag {len(calls)}-{i}") for i in range(spec["count"])]
+            )
+
+        llm_client = MagicMock()
+        llm_client.generate_questions.side_effect = fake_generate
+        chunks = [Chunk(text=str(i), position=i) for i in range(6)]
+
+        with patch(
+            "services.sharded_generation.embed_queries",
+            new_callable=AsyncMock,
+            side_effect=lambda stems: _unit_vectors(len(stems)),
+        ):
+            result = await generate_sharded(
+                llm_client, {"count": 10}, chunks, max_concurrency=1
+            )
+
+        # Two shards of 5, the first failed; one top-up shard of 5
+        assert calls == [5, 5, 5]
+        assert len(result.questions) == 10
+
+    @pytest.mark.asyncio
+    async def test_chunk_ids_follow_packing_order(self):
+        """Packing puts the best-scoring chunk first; ids map back to it."""
+        from services.sharded_generation import generate_sharded
+        from tests.test_llm_client import _client, _question, _stream
+
+        def respond(**kwargs):
+            prompt = kwargs["messages"][0]["content"]
+            first = prompt.index("<chunk id=\"0\">")
+            stem = prompt[first:].split("\n")[1]
+            questions = [_question(f"{stem} vraag {i}") for i in range(3)]
+            return _stream("tool_use", "generation_result", {"questions": questions})
+
+        client = _client()
+        client.client.messages.stream.side_effect = respond
+        # Ascending scores: packing reverses each shard's chunks
+        chunks = [
+            Chunk(text=f"Bron {i}", position=i * 10, score=0.7 + i / 100) for i in range(6)
+        ]
+
+        with patch(
+            "services.sharded_generation.embed_queries",
+            new_callable=AsyncMock,
+            side_effect=lambda stems: _unit_vectors(len(stems)),
+        ):
+            result = await generate_sharded(client, {"count": 6}, chunks, shard_size=3)
+
+        # Shards get chunks [0, 2, 4] and [1, 3, 5]; prompt id 0 is 4 and 5
+        assert {q.stem.split(" vraag")[0]: q.chunk_ids for q in result.questions} == {
+            "Bron 4": ["4"],
+            "Bron 5": ["5"],
+        }
+
+
+# ── Streamed generation ──────────────────────────────────────────────────────
+
+def _question_json(stem: str) -> str:
+    import json
+
+    return json.dumps(_generated(stem).model_dump(mode="json"))
+
+
+def _stream_events(fragments: list[str]) -> list[MagicMock]:
+    events = []
+    for fragment in fragments:
+        event = MagicMock(type="content_block_delta")
+        event.delta.type = "input_json_delta"
+        event.delta.partial_json = fragment
+        events.append(event)
+    return events
+
+
+class TestToolArrayStreamParser:
+    def test_yields_items_as_they_complete(self):
+        from llm.streaming import ToolArrayStreamParser
+
+        document = (
+            '{"questions": [{"stem": "Wat is {x}?", "n": [1, 2]}, '
+            '{"stem": "Zegt \\"hij\\" ]?"}]}'
+        )
+        parser = ToolArrayStreamParser("questions")
+        completed = []
+        for i, ch in enumerate(document):
+            for item in parser.feed(ch):
+                completed.append((i, item))
+
+        assert [item["stem"] for _, item in completed] == ["Wat is {x}?", 'Zegt "hij" ]?']
+        # The first item is emitted as soon as its closing brace arrives
+        assert completed[0][0] == document.index("]}, ") + 1
+        assert parser.done
+
+    def test_complete_items_from_truncated_json(self):
+        from llm.streaming import complete_array_items
+
+        truncated = '{"questions": [{"stem": "A"}, {"stem": "B"}, {"stem": "C", "opt'
+
+        assert complete_array_items(truncated, "questions") == [
+            {"stem": "A"},
+            {"stem": "B"},
+        ]
+
+
+class TestStreamedGeneration:
+    def test_client_yields_questions_incrementally(self):
+        from llm.client import LLMClient
+
+        first, second = _question_json("Vraag 1"), _question_json("Vraag 2")
+        document = '{"questions": [' + first + ", " + second + "]}"
+        split = len('{"questions": [') + len(first) + 1
+        consumed = []
+
+        def events():
+            for event in _stream_events([document[:split], document[split:]]):
+                consumed.append(event)
+                yield event
+
+        client = LLMClient(api_key="test")
+        client.client = MagicMock()
+        stream = client.client.messages.stream.return_value.__enter__.return_value
+        stream.__iter__.side_effect = lambda: events()
+        stream.get_final_message.return_value = MagicMock(stop_reason="tool_use")
+
+        questions = client.stream_generate_questions({"count": 2}, [Chunk(text="x", position=0)])
+        assert next(questions).stem == "Vraag 1"
+        assert len(consumed) == 1
+        assert [q.stem for q in questions] == ["Vraag 2"]
+
+    def test_client_raises_after_truncation(self):
+        from llm.client import LLMClient, LLMValidationError
+
+        client = LLMClient(api_key="test")
+        client.client = MagicMock()
+        stream = client.client.messages.stream.return_value.__enter__.return_value
+        stream.__iter__.side_effect = lambda: iter(
+            _stream_events(['{"questions": [' + _question_json("Vraag 1") + ', {"st'])
+        )
+        stream.get_final_message.return_value = MagicMock(stop_reason="max_tokens")
+
+        received = []
+        with pytest.raises(LLMValidationError):
+            for question in client.stream_generate_questions({"count": 2}, []):
+                received.append(question.stem)
+        assert received == ["Vraag 1"]
+
+    @pytest.mark.asyncio
+    async def test_validation_overlaps_generation(self):
+        import threading
+
+        from services.generation_pipeline import run_generation
+
+        tables = {
+            name: MagicMock()
+            for name in (
+                "generation_jobs", "materials", "exams", "questions",
+                "validation_runs", "validation_run_items",
+            )
+        }
+        mock_supabase = MagicMock()
+        mock_supabase.table.side_effect = lambda name: tables[name]
+        tables["generation_jobs"].select.return_value.eq.return_value.single.return_value.execute.return_value = MagicMock(
+            data={
+                "id": "job-1",
+                "material_id": "mat-1",
+                "exam_id": "exam-1",
+                # Up to one shard of questions is streamed by default
+                "specification": {"count": 2, "learning_goal": "Toetsing"},
+            }
+        )
+        tables["questions"].insert.return_value.execute.side_effect = [
+            MagicMock(data=[{"id": "q-1", "version": 1}]),
+            MagicMock(data=[{"id": "q-2", "version": 1}]),
+        ]
+        tables["validation_runs"].insert.return_value.execute.return_value = MagicMock(
+            data=[{"id": "run-1"}]
+        )
+        first_validated = threading.Event()
+
+        def fake_stream(spec, chunks):
+            yield _generated("Vraag 1")
+            # The second question only arrives once the first was validated
+            assert first_validated.wait(timeout=5)
+            yield _generated("Vraag 2")
+
+        async def fake_validate(question_row, *args, **kwargs):
+            first_validated.set()
+
+        with patch(
+            "services.generation_pipeline.get_supabase_client",
+            return_value=mock_supabase,
+        ), patch(
+            "services.generation_pipeline.retrieve_chunks",
+            new_callable=AsyncMock,
+            return_value=[Chunk(text="Toetsing", position=0)],
+        ), patch("services.generation_pipeline.LLMClient") as MockLLMClient, patch(
+            "services.validation_pipeline._validate_single_question",
+            side_effect=fake_validate,
+        ) as mock_validate, patch(
+            "services.generation_pipeline.run_validation", new_callable=AsyncMock
+        ) as mock_run_validation:
+            MockLLMClient.return_value.stream_generate_questions.side_effect = fake_stream
+            await run_generation("job-1")
+
+        mock_run_validation.assert_not_called()
+        assert [c.args[0]["id"] for c in mock_validate.call_args_list] == ["q-1", "q-2"]
+
+        assert {
+            "analysis_status": "completed",
+            "question_count": 2,
+            "questions_analyzed": 2,
+        } in [c.args[0] for c in tables["exams"].update.call_args_list]
+        job_update = tables["generation_jobs"].update.call_args_list[-1].args[0]
+        assert job_update["result_question_ids"] == ["q-1", "q-2"]
+
+        # Recorded as a validation run, so resume_validation can finish it
+        items = [c.args[0] for c in tables["validation_run_items"].insert.call_args_list]
+        assert [item["question_id"] for item in items] == ["q-1", "q-2"]
+        item_updates = tables["validation_run_items"].update.call_args_list
+        assert [c.args[0]["status"] for c in item_updates] == ["done", "done"]
+        assert tables["validation_runs"].update.call_args.args[0]["status"] == "completed"
+
+    @pytest.mark.asyncio
+    async def test_truncated_stream_is_topped_up(self):
+        from llm.client import LLMClient
+        from llm.schemas import GenerationResult
+        from services.generation_pipeline import run_generation
+
+        tables = {
+            name: MagicMock()
+            for name in (
+                "generation_jobs", "materials", "exams", "questions",
+                "validation_runs", "validation_run_items",
+            )
+        }
+        mock_supabase = MagicMock()
+        mock_supabase.table.side_effect = lambda name: tables[name]
+        tables["generation_jobs"].select.return_value.eq.return_value.single.return_value.execute.return_value = MagicMock(
+            data={
+                "id": "job-1",
+                "material_id": "mat-1",
+                "exam_id": "exam-1",
+                "specification": {"count": 4, "learning_goal": "Toetsing"},
+            }
+        )
+        tables["questions"].insert.return_value.execute.side_effect = [
+            MagicMock(data=[{"id": f"q-{i}", "version": 1}]) for i in range(1, 5)
+        ]
+        tables["validation_runs"].insert.return_value.execute.return_value = MagicMock(
+            data=[{"id": "run-1"}]
+        )
+
+        # The stream is cut off after 2 of 4 questions
+        client = LLMClient(api_key="test")
+        client.client = MagicMock()
+        stream = client.client.messages.stream.return_value.__enter__.return_value
+        stream.__iter__.side_effect = lambda: iter(
+            _stream_events([
+                '{"questions": [' + _question_json("Vraag 1") + ", "
+                + _question_json("Vraag 2") + ', {"st'
+            ])
+        )
+        stream.get_final_message.return_value = MagicMock(stop_reason="max_tokens")
+        client.generate_questions = MagicMock(
+            return_value=GenerationResult(
+                questions=[_generated("Vraag 3"), _generated("Vraag 4")]
+            )
+        )
+
+        with patch(
+            "services.generation_pipeline.get_supabase_client",
+            return_value=mock_supabase,
+        ), patch(
+            "services.generation_pipeline.retrieve_chunks",
+            new_callable=AsyncMock,
+            return_value=[Chunk(text="Toetsing", position=0)],
+        ), patch(
+            "services.generation_pipeline.LLMClient", return_value=client
+        ), patch(
+            "services.validation_pipeline._validate_single_question",
+            new_callable=AsyncMock,
+        ):
+            await run_generation("job-1")
+
+        (spec, _), _ = client.generate_questions.call_args
+        assert spec["count"] == 2
+        stems = [c.args[0]["stem"] for c in tables["questions"].insert.call_args_list]
+        assert stems == ["Vraag 1", "Vraag 2", "Vraag 3", "Vraag 4"]
+        job_update = tables["generation_jobs"].update.call_args_list[-1].args[0]
+        assert job_update["status"] == "completed"
+        assert job_update["result_question_ids"] == ["q-1", "q-2", "q-3", "q-4"]
+        assert tables["validation_runs"].update.call_args.args[0]["status"] == "completed"
+
+    @pytest.mark.asyncio
+    async def test_truncated_stream_keeps_questions_when_top_up_fails(self):
+        from llm.client import LLMValidationError
+        from services.generation_pipeline import _generate_streamed
+
+        supabase = MagicMock()
+        supabase.table.return_value.insert.return_value.execute.side_effect = [
+            MagicMock(data=[{"id": "run-1"}]),
+            MagicMock(data=[{"id": "q-1", "version": 1}]),
+            MagicMock(),
+            MagicMock(data=[{"id": "q-2", "version": 1}]),
+            MagicMock(),
+        ]
+
+        def fake_stream(spec, chunks):
+            yield _generated("Vraag 1")
+            yield _generated("Vraag 2")
+            raise LLMValidationError("LLM response was truncated (max_tokens reached).")
+
+        llm = MagicMock()
+        llm.stream_generate_questions.side_effect = fake_stream
+        llm.generate_questions.side_effect = LLMValidationError("Nog steeds afgekapt")
+
+        with patch(
+            "services.validation_pipeline._validate_single_question",
+            new_callable=AsyncMock,
+        ):
+            question_ids = await _generate_streamed(
+                llm, {"count": 4}, [Chunk(text="x", position=0)], "exam-1", supabase
+            )
+
+        # The shortfall is reported on the job by run_generation
+        assert question_ids == ["q-1", "q-2"]
@@ -1,3 +1,5 @@
+from unittest.mock import MagicMock
+
 import pytest
 from fastapi.testclient import TestClient
 
@@ -14,3 +16,33 @@ class TestHealthEndpoint:
         response = client.get("/health")
         assert response.status_code == 200
         assert response.json() == {"status": "ok"}
+
+
+class TestMetricsEndpoint:
+    """/metrics exposes stage latencies and LLM token counters."""
+
+    def test_metrics_in_prometheus_format(self):
+        from observability.metrics import record_llm_response, stage
+
+        with stage("validation", "deterministic"):
+            pass
+        response_stub = MagicMock(stop_reason="tool_use")
+        response_stub.usage.input_tokens = 1200
+        response_stub.usage.output_tokens = 300
+        response_stub.usage.cache_read_input_tokens = 800
+        response_stub.usage.cache_creation_input_tokens = None
+        record_llm_response("validation", "test-model", response_stub)
+
+        response = client.get("/metrics")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        body = response.text
+        assert (
+            'sidecar_stage_duration_seconds_count{pipeline="validation",stage="deterministic"}'
+            in body
+        )
+        assert (
+            'sidecar_llm_tokens_total{kind="cache_read",model="test-model",operation="validation"}'
+            in body
+        )
+        assert 'kind="cache_creation",model="test-model"' not in body
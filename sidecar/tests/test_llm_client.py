@@ -0,0 +1,181 @@
+"""LLMClient retry, truncation and salvage behaviour (mocked Messages API)."""
+
+import json
+from unittest.mock import MagicMock
+
+import pytest
+from prometheus_client import REGISTRY
+
+from llm.client import LLMClient, LLMTruncatedError, LLMValidationError
+from llm.context_packer import MAX_OUTPUT_TOKENS
+
+
+def _stream(stop_reason: str, tool_name: str | None = None, tool_input=None, partial: str = ""):
+    """One mocked messages.stream() context with the given outcome."""
+    content = []
+    if tool_name:
+        block = MagicMock(type="tool_use", input=tool_input)
+        block.name = tool_name
+        content.append(block)
+
+    event = MagicMock(type="content_block_delta")
+    event.delta.type = "input_json_delta"
+    event.delta.partial_json = partial
+
+    manager = MagicMock()
+    stream = manager.__enter__.return_value
+    stream.__iter__.side_effect = lambda: iter([event] if partial else [])
+    stream.get_final_message.return_value = MagicMock(
+        stop_reason=stop_reason, content=content
+    )
+    return manager
+
+
+def _client(*streams) -> LLMClient:
+    client = LLMClient(api_key="test")
+    client.client = MagicMock()
+    client.client.messages.stream.side_effect = list(streams)
+    return client
+
+
+def _question(stem: str) -> dict:
+    return {
+        "stem": stem,
+        "options": [
+            {"text": "Juist", "position": 0, "is_correct": True},
+            {"text": "Onjuist", "position": 1, "is_correct": False},
+        ],
+        "bloom_level": "begrijpen",
+        "chunk_ids": ["0"],
+    }
+
+
+def _proposal(index: int) -> dict:
+    return {
+        "question_index": index,
+        "field": "category",
+        "proposed_value": "Toetsing",
+        "explanation": "Afgeleid uit de vraag.",
+    }
+
+
+class TestCallTool:
+    def test_retries_truncation_with_larger_max_tokens(self):
+        client = _client(
+            _stream("max_tokens"),
+            _stream("tool_use", "repair_plan", {"proposals": [], "summary": "ok"}),
+        )
+
+        plan = client.repair_questions([], {"results": []})
+
+        assert plan.summary == "ok"
+        calls = client.client.messages.stream.call_args_list
+        assert [c.kwargs["max_tokens"] for c in calls] == [4096, 8192]
+
+    def test_retries_missing_tool_block_once(self):
+        client = _client(_stream("end_turn"), _stream("end_turn"))
+
+        with pytest.raises(LLMValidationError, match="Unexpected response"):
+            client.repair_questions([], {"results": []})
+        assert client.client.messages.stream.call_count == 2
+
+    def test_records_usage_tokens_and_latency(self):
+        def sample(name, **labels):
+            return REGISTRY.get_sample_value(name, labels) or 0.0
+
+        tokens = dict(operation="repair", model="usage-model")
+        before_input = sample("sidecar_llm_tokens_total", **tokens, kind="input")
+        before_cached = sample("sidecar_llm_tokens_total", **tokens, kind="cache_read")
+        before_calls = sample(
+            "sidecar_stage_duration_seconds_count", pipeline="repair", stage="llm_call"
+        )
+
+        manager = _stream("tool_use", "repair_plan", {"proposals": [], "summary": "ok"})
+        usage = manager.__enter__.return_value.get_final_message.return_value.usage
+        usage.input_tokens = 900
+        usage.output_tokens = 120
+        usage.cache_read_input_tokens = 700
+        usage.cache_creation_input_tokens = 0
+        client = _client(manager)
+
+        client.repair_questions([], {"results": []}, model="usage-model")
+
+        assert sample("sidecar_llm_tokens_total", **tokens, kind="input") == before_input + 900
+        assert (
+            sample("sidecar_llm_tokens_total", **tokens, kind="cache_read")
+            == before_cached + 700
+        )
+        assert (
+            sample(
+                "sidecar_stage_duration_seconds_count",
+                pipeline="repair",
+                stage="llm_call",
+            )
+            == before_calls + 1
+        )
+
+
+class TestSalvage:
+    def test_generation_keeps_complete_questions_and_requests_rest(self):
+        partial = (
+            '{"questions": ['
+            + json.dumps(_question("Vraag 1"))
+            + ", "
+            + json.dumps(_question("Vraag 2"))
+            + ', {"stem": "Vraag 3", "opt'
+        )
+
+        def respond(**kwargs):
+            if "Genereer exact 3 MC-vragen" in kwargs["messages"][0]["content"]:
+                return _stream("max_tokens", partial=partial)
+            return _stream(
+                "tool_use", "generation_result", {"questions": [_question("Vraag 3")]}
+            )
+
+        client = _client()
+        client.client.messages.stream.side_effect = respond
+
+        result = client.generate_questions({"count": 3}, [])
+
+        assert [q.stem for q in result.questions] == ["Vraag 1", "Vraag 2", "Vraag 3"]
+        calls = client.client.messages.stream.call_args_list
+        # Retried with growing max_tokens before salvaging
+        assert calls[-2].kwargs["max_tokens"] == MAX_OUTPUT_TOKENS
+        assert "Genereer exact 1 MC-vragen" in calls[-1].kwargs["messages"][0]["content"]
+
+    def test_generation_raises_when_nothing_is_salvageable(self):
+        client = _client()
+        client.client.messages.stream.side_effect = lambda **kwargs: _stream(
+            "max_tokens", partial='{"questions": [{"st'
+        )
+
+        with pytest.raises(LLMTruncatedError):
+            client.generate_questions({"count": 3}, [])
+
+    def test_repair_splits_truncated_batch(self):
+        validation = {
+            "results": [
+                {"question_index": i, "is_valid": False, "errors": []} for i in range(4)
+            ]
+        }
+        truncated = [_stream("max_tokens") for _ in range(3)]
+        client = _client(
+            *truncated,
+            _stream("tool_use", "repair_plan", {"proposals": [_proposal(0), _proposal(1)], "summary": "A."}),
+            _stream("tool_use", "repair_plan", {"proposals": [_proposal(2), _proposal(3)], "summary": "B."}),
+        )
+
+        plan = client.repair_questions([{"stem": f"V{i}"} for i in range(4)], validation)
+
+        assert [p.question_index for p in plan.proposals] == [0, 1, 2, 3]
+        assert plan.summary == "A. B."
+
+    def test_single_question_repair_keeps_complete_proposals(self):
+        validation = {"results": [{"question_index": 0, "is_valid": False, "errors": []}]}
+        partial = '{"proposals": [' + json.dumps(_proposal(0)) + ', {"question_index": 0, "fi'
+        client = _client(*[_stream("max_tokens", partial=partial) for _ in range(3)])
+
+        plan = client.repair_questions([{"stem": "V0"}], validation)
+
+        assert len(plan.proposals) == 1
+        assert plan.summary.startswith("Gedeeltelijk")
@@ -88,3 +88,49 @@ class TestValidationResultInvalid:
         ]
         with pytest.raises(ValidationError):
             ValidationResult(**data)
+
+
+class TestRequestTemplates:
+    def test_tool_schema_matches_model(self):
+        from llm.request_templates import VALIDATION_TEMPLATE
+
+        tool = VALIDATION_TEMPLATE.tools[0]
+        schema = ValidationResult.model_json_schema()
+
+        assert tool["name"] == "validation_result"
+        assert tool["input_schema"]["required"] == tuple(schema["required"])
+        assert set(tool["input_schema"]["properties"]) == set(schema["properties"])
+
+    def test_template_is_immutable(self):
+        from llm.request_templates import GENERATION_TEMPLATE
+
+        with pytest.raises(TypeError):
+            GENERATION_TEMPLATE.tools[0]["name"] = "other"
+        with pytest.raises(TypeError):
+            GENERATION_TEMPLATE.tool_choice["name"] = "other"
+
+    def test_calls_share_the_template(self):
+        from unittest.mock import MagicMock
+
+        from llm.client import LLMClient
+        from llm.request_templates import VALIDATION_TEMPLATE
+
+        client = LLMClient(api_key="test")
+        client.client = MagicMock()
+        tool_block = MagicMock(type="tool_use", input=_valid_data())
+        tool_block.name = "validation_result"
+        stream = client.client.messages.stream.return_value.__enter__.return_value
+        stream.__iter__.side_effect = lambda: iter([])
+        stream.get_final_message.return_value = MagicMock(
+            stop_reason="tool_use", content=[tool_block]
+        )
+
+        question = {"stam": "Vraag", "opties": [], "leerdoel": ""}
+        for _ in range(2):
+            result = client.validate_question(question, {})
+            assert result.bet_score == 4
+
+        calls = client.client.messages.stream.call_args_list
+        assert calls[0].kwargs["tools"] is VALIDATION_TEMPLATE.tools
+        assert calls[1].kwargs["tools"] is VALIDATION_TEMPLATE.tools
+        assert calls[0].kwargs["max_tokens"] == 2048
@@ -153,6 +153,124 @@ class TestXlsxParser:
         assert not any(o.is_correct for o in questions[0].options)
 
 
+def _docx(build) -> bytes:
+    from docx import Document
+
+    doc = Document()
+    build(doc)
+    buf = io.BytesIO()
+    doc.save(buf)
+    return buf.getvalue()
+
+
+def _append_run(paragraph, *children: tuple[str, dict, str | None]):
+    """Add a raw w:r with the given (tag, attributes, text) children."""
+    from docx.oxml import OxmlElement
+    from docx.oxml.ns import qn
+
+    run = OxmlElement("w:r")
+    for tag, attributes, text in children:
+        child = OxmlElement(tag)
+        for name, value in attributes.items():
+            child.set(qn(name), value)
+        if text is not None:
+            child.text = text
+        run.append(child)
+    paragraph._p.append(run)
+
+
+def _docx_tables(doc) -> None:
+    doc.add_paragraph("1. Vraag voor de tabel")
+    table = doc.add_table(rows=2, cols=2)
+    table.cell(0, 0).text = "A. In een cel *"
+    table.cell(0, 1).paragraphs[0].add_run("B. Vet in een cel").bold = True
+    table.cell(1, 0).add_table(rows=1, cols=1).cell(0, 0).text = "Geneste tabel"
+    doc.add_paragraph("2. Vraag na de tabel")
+
+
+def _docx_empty_paragraphs(doc) -> None:
+    doc.add_paragraph("")
+    doc.add_paragraph("1. Eerste vraag")
+    doc.add_paragraph("   ")
+    doc.add_paragraph().add_run("")
+    doc.add_paragraph("\t")
+    doc.add_paragraph("A. Antwoord")
+    doc.add_paragraph("")
+
+
+def _docx_split_runs(doc) -> None:
+    from docx.enum.text import WD_BREAK
+
+    p = doc.add_paragraph("1. Wat is de hoofd")
+    p.add_run("stad").bold = True
+    p.add_run(" van ")
+    p.add_run("Neder").bold = False
+    p.add_run("land?").italic = True
+    p = doc.add_paragraph()
+    p.add_run("A. ").bold = True
+    p.add_run("Amster").bold = True
+    p.add_run("dam").bold = True
+    run = doc.add_paragraph().add_run("B. Regel")
+    run.add_break()
+    run.add_text("twee")
+    run.add_break(WD_BREAK.PAGE)
+    run.add_break(WD_BREAK.COLUMN)
+    run.add_tab()
+    run.add_text("drie")
+    p = doc.add_paragraph("C. ")
+    _append_run(
+        p,
+        ("w:rPr", {}, None),
+        ("w:t", {}, "niet"),
+        ("w:noBreakHyphen", {}, None),
+        ("w:t", {}, "afbreekbaar"),
+        ("w:cr", {}, None),
+        ("w:ptab", {"w:relativeTo": "margin", "w:alignment": "right", "w:leader": "none"}, None),
+        ("w:lastRenderedPageBreak", {}, None),
+        ("w:t", {}, "einde"),
+    )
+    _append_run(p, ("w:rPr", {}, None), ("w:t", {}, " los"))
+    bold = doc.add_paragraph()
+    _append_run(bold, ("w:t", {}, "D. "))
+    bold._p.r_lst[0].get_or_add_rPr().append(_bold_off())
+
+
+def _bold_off():
+    from docx.oxml import OxmlElement
+    from docx.oxml.ns import qn
+
+    b = OxmlElement("w:b")
+    b.set(qn("w:val"), "0")
+    return b
+
+
+def _docx_hyperlinks_and_controls(doc) -> None:
+    from docx.oxml import OxmlElement
+
+    p = doc.add_paragraph("1. Zie ")
+    link, link_run, link_text = (OxmlElement(t) for t in ("w:hyperlink", "w:r", "w:t"))
+    link_text.text = "de bron"
+    link_run.append(link_text)
+    link.append(link_run)
+    p._p.append(link)
+    p.add_run(" voor meer.")
+    sdt, content = OxmlElement("w:sdt"), OxmlElement("w:sdtContent")
+    inner = doc.add_paragraph("In een inhoudsbesturingselement")._p
+    content.append(inner)
+    sdt.append(content)
+    doc.element.body.insert(len(doc.element.body) - 1, sdt)
+    doc.add_paragraph("A. Na het besturingselement")
+
+
+# Documents on which the streamed reader must match python-docx exactly
+DOCX_DOCUMENTS = {
+    "tables": _docx_tables,
+    "empty_paragraphs": _docx_empty_paragraphs,
+    "split_runs": _docx_split_runs,
+    "hyperlinks_and_controls": _docx_hyperlinks_and_controls,
+}
+
+
 class TestDocxParser:
     """T8.4: DOCX parser tests."""
 
@@ -197,6 +315,85 @@ class TestDocxParser:
         assert questions[1].stem == "Welk dier is een zoogdier?"
         assert questions[1].options[2].is_correct  # C = Hond
 
+    def test_parse_docx_records_marker(self, docx_bytes: bytes):
+        """The marker of the correct option is kept for rule-based repair."""
+        questions = parse_docx(docx_bytes)
+
+        assert [o.marked_with for o in questions[0].options] == [None, "bold", None, None]
+        assert [o.marked_with for o in questions[1].options] == [None, None, "asterisk", None]
+
+    def test_streamed_paragraphs_match_python_docx(self):
+        """Body paragraphs only, with hyperlink text, breaks and run bold flags."""
+        from docx import Document
+        from docx.enum.text import WD_BREAK
+        from docx.oxml import OxmlElement
+
+        from parsers.docx_xml import iter_paragraphs
+
+        doc = Document()
+        doc.add_paragraph("1. Welke\tstad?")
+        doc.add_table(rows=1, cols=1).cell(0, 0).text = "A. In een tabel *"
+        p = doc.add_paragraph("A. ")
+        p.add_run("Amster").bold = True
+        p.add_run("dam").bold = False
+        run = doc.add_paragraph().add_run("B. Regel")
+        run.add_break()
+        run.add_text("twee")
+        run.add_break(WD_BREAK.PAGE)
+        p = doc.add_paragraph()
+        link, link_run, link_text = (OxmlElement(t) for t in ("w:hyperlink", "w:r", "w:t"))
+        link_text.text = "C. Via link"
+        link_run.append(link_text)
+        link.append(link_run)
+        p._p.append(link)
+        buf = io.BytesIO()
+        doc.save(buf)
+
+        paragraphs = list(iter_paragraphs(buf.getvalue()))
+
+        assert [p.text for p in paragraphs] == [
+            "1. Welke\tstad?",
+            "A. Amsterdam",
+            "B. Regel\ntwee",
+            "C. Via link",
+        ]
+        assert paragraphs[1].runs == [("A. ", None), ("Amster", True), ("dam", False)]
+        # Hyperlink runs are text, not runs of the paragraph itself
+        assert paragraphs[3].runs == []
+
+    @pytest.mark.parametrize("build", DOCX_DOCUMENTS.values(), ids=DOCX_DOCUMENTS.keys())
+    def test_streamed_reader_equals_python_docx(self, build):
+        """The old python-docx extraction is the reference for the streamed one."""
+        from docx import Document
+
+        from parsers.docx_xml import iter_paragraphs
+        from rag.extractor import extract_docx
+
+        content = _docx(build)
+        reference = Document(io.BytesIO(content)).paragraphs
+
+        streamed = list(iter_paragraphs(content))
+
+        assert [p.text for p in streamed] == [p.text for p in reference]
+        assert [p.runs for p in streamed] == [
+            [(r.text, r.bold) for r in p.runs] for p in reference
+        ]
+        assert extract_docx(content) == "\n\n".join(
+            p.text for p in reference if p.text.strip()
+        )
+
+    def test_parse_docx_rejects_other_office_files(self):
+        """An Excel file renamed to .docx is not a Word document."""
+        from openpyxl import Workbook
+
+        wb = Workbook()
+        wb.active.append(["stam", "optie_a", "optie_b", "correct"])
+        buf = io.BytesIO()
+        wb.save(buf)
+
+        with pytest.raises(ValueError, match="geen Word-document"):
+            parse_docx(buf.getvalue())
+
 
 class TestParseEndpoint:
     """T8.7: Sidecar /parse integration test."""
@@ -0,0 +1,61 @@
+"""Opt-in request profiling (observability/profiling.py)."""
+
+import pstats
+from contextlib import ExitStack
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from config.settings import settings
+from main import app
+
+
+@pytest.fixture
+def profiling(tmp_path):
+    """Returns configure(mode, min_seconds) -> directory profiles are written to."""
+    with ExitStack() as stack:
+
+        def configure(mode: str, min_seconds: float = 0.0):
+            stack.enter_context(
+                patch.multiple(
+                    settings,
+                    profiling_mode=mode,
+                    profiling_dir=str(tmp_path),
+                    profiling_min_seconds=min_seconds,
+                )
+            )
+            return tmp_path
+
+        yield configure
+
+
+class TestProfilingMiddleware:
+    def test_off_by_default(self, profiling):
+        profile_dir = profiling("")
+
+        response = TestClient(app).get("/health", headers={"X-Profile": "1"})
+
+        assert response.status_code == 200
+        assert list(profile_dir.iterdir()) == []
+
+    def test_header_mode_profiles_only_requested(self, profiling):
+        profile_dir = profiling("header")
+        client = TestClient(app)
+
+        client.get("/health")
+        assert list(profile_dir.iterdir()) == []
+
+        client.get("/health", headers={"X-Profile": "1"})
+        (dump,) = profile_dir.iterdir()
+        assert "-GET-health-" in dump.name
+        assert dump.suffix == ".prof"
+        # The dump is a regular pstats file
+        assert pstats.Stats(str(dump)).total_calls > 0
+
+    def test_fast_requests_are_not_dumped(self, profiling):
+        profile_dir = profiling("all", min_seconds=60)
+
+        TestClient(app).get("/health")
+
+        assert list(profile_dir.iterdir()) == []
@@ -2,12 +2,91 @@
 
 import io
 import json
+import re
 from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
 
-from rag.chunker import Chunk, chunk_pages, chunk_text
-from rag.extractor import PageText, extract_docx, extract_text
+from rag.chunker import (
+    CHUNKER_VERSION,
+    Chunk,
+    TokenChunkStats,
+    chunk_pages,
+    chunk_text,
+    chunk_text_by_tokens,
+    iter_page_chunks,
+)
+from rag.extractor import PageText, extract_docx, extract_pdf, extract_text
+
+
+class WordTokenizer:
+    """Stand-in for a fast tokenizer: one token per word or punctuation mark."""
+
+    _pattern = re.compile(r"\w+|[^\w\s]")
+
+    def num_special_tokens_to_add(self, pair: bool = False) -> int:
+        return 2
+
+    def _encode(self, text: str) -> tuple[list[int], list[tuple[int, int]]]:
+        spans = [m.span() for m in self._pattern.finditer(text)]
+        return list(range(len(spans))), spans
+
+    def __call__(self, text, add_special_tokens=True, return_offsets_mapping=False):
+        encodings = [self._encode(t) for t in text] if isinstance(text, list) else None
+        if encodings is None:
+            ids, spans = self._encode(text)
+            result = {"input_ids": ids}
+            if return_offsets_mapping:
+                result["offset_mapping"] = spans
+            return result
+        result = {"input_ids": [ids for ids, _ in encodings]}
+        if return_offsets_mapping:
+            result["offset_mapping"] = [spans for _, spans in encodings]
+        return result
+
+
+@pytest.fixture(autouse=True)
+def _word_tokenizer():
+    """Keep the embedding pipeline from loading the real E5 tokenizer."""
+    with patch(
+        "services.embedding_pipeline.get_tokenizer", return_value=WordTokenizer()
+    ):
+        yield
+
+
+def _make_pdf(page_texts: list[str]) -> bytes:
+    """Build a minimal multi-page PDF with one line of Helvetica per page."""
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # Pages tree, filled in below
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    kids = []
+    for text in page_texts:
+        content = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET".encode("latin-1") if text else b""
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(content), content))
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % (len(objects))
+        )
+        kids.append(b"%d 0 R" % len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(kids), len(kids))
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for i, obj in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(b"%d 0 obj\n%s\nendobj\n" % (i, obj))
+    xref = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for offset in offsets:
+        out.write(b"%010d 00000 n \n" % offset)
+    out.write(
+        b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+        % (len(objects) + 1, xref)
+    )
+    return out.getvalue()
 
 
 # ── T12.2: extract_docx ──────────────────────────────────────────────────────
@@ -32,6 +111,59 @@ class TestExtractDocx:
         assert "Derde paragraaf over kwaliteit." in result
 
 
+# ── extract_pdf (streamed per page) ──────────────────────────────────────────
+
+class TestExtractPdf:
+    def test_extracts_pages_in_order_and_skips_empty(self):
+        file_bytes = _make_pdf(["Pagina een over toetsing", "", "Pagina drie over Bloom"])
+
+        pages = extract_pdf(file_bytes)
+
+        assert [p.page_number for p in pages] == [1, 3]
+        assert "Pagina een over toetsing" in pages[0].text
+        assert "Pagina drie over Bloom" in pages[1].text
+
+    def test_parallel_extraction_matches_sequential(self):
+        """Page ranges extracted in a process pool come back in page order."""
+        from rag import extractor
+
+        texts = [f"Pagina {n} over toetsconstructie" for n in range(1, 8)]
+        texts[3] = ""  # Blank page is skipped in both modes
+        file_bytes = _make_pdf(texts)
+
+        with patch.object(extractor, "PARALLEL_MIN_PAGES", 0):
+            parallel = list(
+                extractor.iter_pdf_pages_parallel(
+                    file_bytes, max_workers=2, pages_per_task=2
+                )
+            )
+
+        assert parallel == extract_pdf(file_bytes)
+        assert [p.page_number for p in parallel] == [1, 2, 3, 5, 6, 7]
+
+    def test_short_document_skips_pool(self):
+        from rag import extractor
+
+        with patch.object(extractor, "ProcessPoolExecutor") as mock_pool:
+            pages = list(extractor.iter_pdf_pages_parallel(_make_pdf(["Kort"])))
+
+        mock_pool.assert_not_called()
+        assert len(pages) == 1
+
+    def test_text_documents_skip_pool(self):
+        from rag import extractor
+
+        with patch.object(extractor, "ProcessPoolExecutor") as mock_pool:
+            pages = list(extractor.iter_pages("Korte tekst".encode(), "text/plain"))
+
+        mock_pool.assert_not_called()
+        assert [p.text for p in pages] == ["Korte tekst"]
+
+    def test_pdf_dispatch(self):
+        pages = extract_text(_make_pdf(["Inhoud"]), "application/pdf")
+        assert len(pages) == 1
+
+
 # ── T12.3/T12.4: chunk_text ──────────────────────────────────────────────────
 
 class TestChunkText:
@@ -98,6 +230,98 @@ class TestChunkText:
         assert len(page1_chunks) > 0
         assert len(page2_chunks) > 0
 
+    def test_iter_page_chunks_is_lazy(self):
+        """Chunks of page 1 are produced before page 2 is requested."""
+        consumed = []
+
+        def pages():
+            for n in (1, 2):
+                consumed.append(n)
+                yield PageText(page_number=n, text=f"Pagina {n}. " * 300)
+
+        stream = iter_page_chunks(pages(), chunk_size=500, chunk_overlap=50)
+        first = next(stream)
+
+        assert first.page == 1
+        assert consumed == [1]
+        rest = list(stream)
+        assert [c.position for c in [first, *rest]] == list(range(len(rest) + 1))
+
+
+# ── Token-budgeted chunking ──────────────────────────────────────────────────
+
+class TestChunkTextByTokens:
+    def test_chunks_respect_token_budget(self):
+        tokenizer = WordTokenizer()
+        text = " ".join(f"Zin {i} gaat over toetsing en validiteit." for i in range(300))
+
+        chunks = chunk_text_by_tokens(text, tokenizer, max_tokens=60, overlap_tokens=10)
+
+        assert len(chunks) > 1
+        for chunk in chunks:
+            assert len(tokenizer(chunk.text)["input_ids"]) <= 60
+        assert [c.position for c in chunks] == list(range(len(chunks)))
+
+    def test_cuts_on_sentence_boundaries(self):
+        tokenizer = WordTokenizer()
+        text = " ".join(f"Zin nummer {i} beschrijft een begrip." for i in range(100))
+
+        chunks = chunk_text_by_tokens(text, tokenizer, max_tokens=50, overlap_tokens=0)
+
+        for chunk in chunks:
+            assert chunk.text.endswith(".")
+
+    def test_prefers_paragraph_boundary(self):
+        tokenizer = WordTokenizer()
+        first = " ".join(["alinea een"] * 15) + "."
+        second = " ".join(["alinea twee"] * 15) + "."
+        text = f"{first}\n\n{second}"
+
+        chunks = chunk_text_by_tokens(text, tokenizer, max_tokens=40, overlap_tokens=0)
+
+        assert chunks[0].text == first
+
+    def test_hard_cut_without_boundaries(self):
+        tokenizer = WordTokenizer()
+        text = "-".join(["x"] * 500)  # No whitespace or sentence ends at all
+
+        chunks = chunk_text_by_tokens(text, tokenizer, max_tokens=100, overlap_tokens=0)
+
+        assert all(len(tokenizer(c.text)["input_ids"]) <= 100 for c in chunks)
+        assert "".join(c.text for c in chunks) == text
+
+    def test_stats_count_truncated_char_chunks(self):
+        """Dense text (many tokens per character) overflows 2000-char chunks."""
+        tokenizer = WordTokenizer()
+        text = " ".join(f"{i}." for i in range(2000))
+        stats = TokenChunkStats(compare_char_chunks=True)
+
+        chunks = chunk_text_by_tokens(text, tokenizer, max_tokens=500, stats=stats)
+
+        assert stats.chunks == len(chunks)
+        assert stats.max_chunk_tokens <= 500
+        assert stats.char_chunks > 0
+        # All but the (shorter) last character-based chunk overflow the budget
+        assert stats.char_chunks_truncated >= stats.char_chunks - 1
+
+    def test_stats_skip_char_comparison_by_default(self):
+        tokenizer = MagicMock(wraps=WordTokenizer())
+        stats = TokenChunkStats()
+
+        chunk_text_by_tokens(" ".join(f"{i}." for i in range(2000)), tokenizer, 500, stats=stats)
+
+        assert stats.chunks > 0
+        assert (stats.char_chunks, tokenizer.call_count) == (0, 1)
+
+    def test_empty_text(self):
+        assert chunk_text_by_tokens("  ", WordTokenizer(), max_tokens=100) == []
+
+    def test_passage_token_budget(self):
+        from rag.embedder import MAX_SEQ_TOKENS, passage_token_budget
+
+        # 2 special tokens + "passage", ":"
+        assert passage_token_budget(WordTokenizer()) == MAX_SEQ_TOKENS - 4
+
 
 # ── T12.5: embed_chunks (multilingual-e5-base in-container) ──────────────────
 
@@ -120,11 +344,52 @@ class TestEmbedChunks:
         with patch("rag.embedder._get_model", return_value=mock_model):
             result = await embed_chunks(["Text chunk 1", "Text chunk 2"])
 
-        assert len(result) == 2
-        assert all(len(v) == EMBEDDING_DIMENSIONS for v in result)
+        assert result.shape == (2, EMBEDDING_DIMENSIONS)
+        assert result.dtype == np.float32
+        assert result.flags["C_CONTIGUOUS"]
         assert EMBEDDING_DIMENSIONS == 768
 
 
+# ── pgvector serialization ───────────────────────────────────────────────────
+
+class TestVectorSerialization:
+    def test_round_trip_precision(self):
+        """Text literals parse back to the original float32 values."""
+        import numpy as np
+
+        from rag.vectors import to_pgvectors
+
+        matrix = np.random.default_rng(0).standard_normal((3, 768)).astype(np.float32)
+        matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+
+        literals = to_pgvectors(matrix)
+
+        assert len(literals) == 3
+        for literal, row in zip(literals, matrix):
+            assert literal.startswith("[") and literal.endswith("]")
+            parsed = np.array(literal[1:-1].split(","), dtype=np.float32)
+            assert parsed.shape == (768,)
+            np.testing.assert_allclose(parsed, row, rtol=1e-5, atol=1e-7)
+
+    def test_smaller_than_json(self):
+        """The compact literal is substantially smaller than json.dumps(list)."""
+        import numpy as np
+
+        from rag.vectors import to_pgvector
+
+        vector = np.random.default_rng(1).random(768).astype(np.float32)
+        vector /= np.linalg.norm(vector)
+
+        assert len(to_pgvector(vector)) < 0.6 * len(json.dumps(vector.tolist()))
+
+    def test_empty_matrix(self):
+        import numpy as np
+
+        from rag.vectors import to_pgvectors
+
+        assert to_pgvectors(np.empty((0, 768), dtype=np.float32)) == []
+
+
 # ── T12.6: embedding_pipeline integration (mock Supabase + OpenAI) ────────────
 
 class TestEmbeddingPipeline:
@@ -198,6 +463,218 @@ class TestEmbeddingPipeline:
         assert len(update_calls) > 0
 
 
+# ── Batched chunk writer + resumable pipeline ────────────────────────────────
+
+def _chunk_rows(count: int) -> list[dict]:
+    return [
+        {"material_id": "mat-1", "content": f"chunk {i}", "position": i}
+        for i in range(count)
+    ]
+
+
+class TestChunkWriter:
+    @pytest.mark.asyncio
+    async def test_inserts_in_batches_and_advances_marker(self):
+        from services.chunk_writer import ChunkWriter
+
+        mock_supabase = MagicMock()
+        writer = ChunkWriter(mock_supabase, "mat-1", batch_size=2)
+
+        await writer.write(_chunk_rows(5))
+
+        insert_calls = mock_supabase.table.return_value.insert.call_args_list
+        assert [len(c.args[0]) for c in insert_calls] == [2, 2, 1]
+
+        markers = [
+            c.args[0]["chunks_embedded"]
+            for c in mock_supabase.table.return_value.update.call_args_list
+        ]
+        assert markers == [2, 4, 5]
+        assert writer.rows_written == 5
+
+    @pytest.mark.asyncio
+    async def test_retries_failed_batch(self):
+        from services.chunk_writer import ChunkWriter
+
+        mock_supabase = MagicMock()
+        mock_supabase.table.return_value.insert.return_value.execute.side_effect = [
+            Exception("payload too large"),
+            MagicMock(),
+        ]
+        writer = ChunkWriter(
+            mock_supabase, "mat-1", batch_size=10, retry_backoff=0
+        )
+
+        await writer.write(_chunk_rows(3))
+
+        assert mock_supabase.table.return_value.insert.call_count == 2
+        # Partial leftovers of the failed attempt are removed before retrying
+        mock_supabase.table.return_value.delete.return_value.eq.return_value.gte.assert_called_with(
+            "position", 0
+        )
+
+    @pytest.mark.asyncio
+    async def test_gives_up_after_max_retries(self):
+        from services.chunk_writer import ChunkWriter
+
+        mock_supabase = MagicMock()
+        mock_supabase.table.return_value.insert.return_value.execute.side_effect = (
+            Exception("down")
+        )
+        writer = ChunkWriter(
+            mock_supabase, "mat-1", max_retries=2, retry_backoff=0
+        )
+
+        with pytest.raises(Exception, match="down"):
+            await writer.write(_chunk_rows(3))
+
+        assert mock_supabase.table.return_value.insert.call_count == 3
+        mock_supabase.table.return_value.update.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_pipeline_resumes_from_marker(self):
+        """Chunks before materials.chunks_embedded are not embedded again."""
+        import numpy as np
+
+        from services.embedding_pipeline import run_embedding
+
+        mock_supabase = MagicMock()
+        mock_supabase.table.return_value.select.return_value.eq.return_value.single.return_value.execute.return_value = MagicMock(
+            data={
+                "id": "mat-1",
+                "storage_path": "materials/test.txt",
+                "mime_type": "text/plain",
+                "chunks_embedded": 3,
+                "chunker_version": CHUNKER_VERSION,
+            }
+        )
+        test_text = "Een zin over toetsconstructie en validiteit. " * 600
+        mock_supabase.storage.from_.return_value.download.return_value = (
+            test_text.encode("utf-8")
+        )
+
+        async def fake_embed(texts):
+            return np.zeros((len(texts), 768), dtype=np.float32)
+
+        with patch(
+            "services.embedding_pipeline.get_supabase_client",
+            return_value=mock_supabase,
+        ), patch(
+            "services.embedding_pipeline.embed_chunks",
+            side_effect=fake_embed,
+        ) as mock_embed:
+            await run_embedding("mat-1", batch_size=2)
+
+        from rag.embedder import passage_token_budget
+
+        tokenizer = WordTokenizer()
+        total = len(
+            chunk_text_by_tokens(test_text, tokenizer, passage_token_budget(tokenizer))
+        )
+        embedded = sum(len(c.args[0]) for c in mock_embed.call_args_list)
+        assert embedded == total - 3
+
+        inserted_positions = [
+            row["position"]
+            for c in mock_supabase.table.return_value.insert.call_args_list
+            for row in c.args[0]
+        ]
+        assert total > 5
+        assert inserted_positions == list(range(3, total))
+
+
+    @pytest.mark.asyncio
+    async def test_marker_of_another_chunker_is_ignored(self):
+        """Positions cut by an older chunker don't line up; start over."""
+        import numpy as np
+
+        from services.embedding_pipeline import run_embedding
+
+        mock_supabase = MagicMock()
+        mock_supabase.table.return_value.select.return_value.eq.return_value.single.return_value.execute.return_value = MagicMock(
+            data={
+                "id": "mat-1",
+                "storage_path": "materials/test.txt",
+                "mime_type": "text/plain",
+                "chunks_embedded": 3,
+                "chunker_version": CHUNKER_VERSION - 1,
+            }
+        )
+        mock_supabase.storage.from_.return_value.download.return_value = (
+            "Een zin over toetsconstructie en validiteit. " * 600
+        ).encode("utf-8")
+
+        async def fake_embed(texts):
+            return np.zeros((len(texts), 768), dtype=np.float32)
+
+        with patch(
+            "services.embedding_pipeline.get_supabase_client",
+            return_value=mock_supabase,
+        ), patch("services.embedding_pipeline.embed_chunks", side_effect=fake_embed):
+            await run_embedding("mat-1", batch_size=2)
+
+        discarded = mock_supabase.table.return_value.delete.return_value.eq.return_value.gte
+        discarded.assert_called_once_with("position", 0)
+        inserted_positions = [
+            row["position"]
+            for c in mock_supabase.table.return_value.insert.call_args_list
+            for row in c.args[0]
+        ]
+        assert inserted_positions[0] == 0
+        markers = [c.args[0] for c in mock_supabase.table.return_value.update.call_args_list]
+        assert all(m["chunker_version"] == CHUNKER_VERSION for m in markers)
+
+
+class TestStreamingEmbeddingPipeline:
+    @pytest.mark.asyncio
+    async def test_first_batch_stored_before_last_page_extracted(self):
+        import numpy as np
+
+        from services.embedding_pipeline import run_embedding
+
+        import threading
+
+        events = []
+        extract_threads = set()
+
+        def fake_pages(file_bytes, mime_type):
+            for n in range(1, 4):
+                events.append(f"extract {n}")
+                extract_threads.add(threading.current_thread())
+                yield PageText(page_number=n, text=f"Hoofdstuk {n} over toetsing. " * 80)
+
+        async def fake_embed(texts):
+            return np.zeros((len(texts), 768), dtype=np.float32)
+
+        mock_supabase = MagicMock()
+        mock_supabase.table.return_value.select.return_value.eq.return_value.single.return_value.execute.return_value = MagicMock(
+            data={"id": "mat-1", "storage_path": "m.pdf", "mime_type": "application/pdf"}
+        )
+        mock_supabase.table.return_value.insert.return_value.execute.side_effect = (
+            lambda: events.append("insert")
+        )
+
+        with patch(
+            "services.embedding_pipeline.get_supabase_client",
+            return_value=mock_supabase,
+        ), patch(
+            "services.embedding_pipeline.iter_pages", side_effect=fake_pages
+        ), patch(
+            "services.embedding_pipeline.embed_chunks", side_effect=fake_embed
+        ):
+            await run_embedding("mat-1", batch_size=2)
+
+        assert events.index("insert") < events.index("extract 3")
+        # Extraction is pulled from a worker thread, not the event loop
+        assert extract_threads and threading.main_thread() not in extract_threads
+
+        final_update = mock_supabase.table.return_value.update.call_args_list[-1].args[0]
+        assert final_update["chunk_count"] == final_update["chunks_embedded"]
+        assert final_update["content_text"].startswith("Hoofdstuk 1")
+        # Rewritten chunks retire cached retrieval results
+        assert final_update["chunk_generation"] == 1
+
+
 # ── extract_text dispatch ─────────────────────────────────────────────────────
 
 class TestExtractText:
@@ -1,9 +1,17 @@
 """Tests for AI repair prompt and schemas (Issue #3)."""
 
+import asyncio
+import json
+from unittest.mock import MagicMock, patch
+
 import pytest
+from fastapi.testclient import TestClient
 
 from llm.prompts.repair import build_repair_prompt
 from llm.schemas import RepairPlan, RepairProposal
+from main import app
+from services.batched_repair import plan_batches, repair_batched
+from services.rule_repair import merge_plans, repair_with_rules
 
 
 class TestBuildRepairPrompt:
@@ -165,3 +173,259 @@ class TestRepairSchemas:
         data = plan.model_dump()
         assert data["proposals"][0]["proposed_value"] == "Biologie"
         assert data["summary"] == "1 voorstel."
+
+
+def _invalid_validation(count: int) -> dict:
+    return {
+        "results": [
+            {
+                "question_index": i,
+                "is_valid": False,
+                "errors": [{"field": "stem", "code": "empty_stem", "message": "Vraagstam is leeg"}],
+            }
+            for i in range(count)
+        ]
+    }
+
+
+def _questions(count: int, **fields) -> list[dict]:
+    return [
+        {
+            "stem": "",
+            "question_id": str(i + 1),
+            "category": "Economie",
+            "options": [
+                {"text": "Omzet", "position": 0, "is_correct": True},
+                {"text": "Kosten", "position": 1, "is_correct": False},
+            ],
+            **fields,
+        }
+        for i in range(count)
+    ]
+
+
+def _proposing_client(fail_indices: frozenset[int] = frozenset()) -> MagicMock:
+    """LLM client proposing a category for each question in the batch.
+
+    Also proposes one for question 999, which is never in any batch.
+    """
+
+    def repair_questions(questions, validation):
+        indices = [r["question_index"] for r in validation["results"]]
+        if fail_indices & set(indices):
+            raise RuntimeError("overloaded")
+        return RepairPlan(
+            proposals=[
+                RepairProposal(question_index=i, field="category", proposed_value=f"C{i}", explanation="Past bij de stam.")
+                for i in [*indices, 999]
+            ],
+            summary=f"{len(indices)} categorieen voorgesteld.",
+        )
+
+    client = MagicMock()
+    client.repair_questions.side_effect = repair_questions
+    return client
+
+
+class TestBatchedRepair:
+    """Tests for repairing invalid questions in concurrent batches."""
+
+    def test_plan_batches_skips_valid_results(self):
+        validation = _invalid_validation(5)
+        validation["results"][2]["is_valid"] = True
+
+        batches = plan_batches(validation, batch_size=2)
+
+        assert [[r["question_index"] for r in b] for b in batches] == [[0, 1], [3, 4]]
+
+    def test_merges_batches_in_question_order(self):
+        client = _proposing_client()
+
+        plan = asyncio.run(repair_batched(client, [], _invalid_validation(25), batch_size=10))
+
+        assert client.repair_questions.call_count == 3
+        assert [p.question_index for p in plan.proposals] == list(range(25))
+
+    def test_partial_failure_keeps_other_batches(self):
+        client = _proposing_client(fail_indices=frozenset({12}))
+
+        plan = asyncio.run(repair_batched(client, [], _invalid_validation(25), batch_size=10))
+
+        assert [p.question_index for p in plan.proposals] == [*range(10), *range(20, 25)]
+        assert "Voor 10 vragen kon geen herstelvoorstel worden gemaakt." in plan.summary
+
+    def test_all_batches_failing_raises(self):
+        client = _proposing_client(fail_indices=frozenset({0}))
+
+        with pytest.raises(RuntimeError, match="overloaded"):
+            asyncio.run(repair_batched(client, [], _invalid_validation(3), batch_size=10))
+
+    def test_nothing_to_repair_makes_no_calls(self):
+        client = _proposing_client()
+
+        plan = asyncio.run(repair_batched(client, [], {"results": []}))
+
+        client.repair_questions.assert_not_called()
+        assert plan.proposals == []
+
+    def test_endpoint_streams_ndjson_per_batch(self):
+        client = _proposing_client(fail_indices=frozenset({0}))
+
+        with (
+            patch("main.LLMClient", return_value=client),
+            patch("services.batched_repair.REPAIR_BATCH_SIZE", 10),
+        ):
+            response = TestClient(app).post(
+                "/repair",
+                json={
+                    "questions": _questions(15),
+                    "validation": _invalid_validation(15),
+                    "stream": True,
+                },
+            )
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert sorted(line["type"] for line in lines[:-1]) == ["error", "proposals"]
+        assert lines[-1] == {
+            "type": "done",
+            "summary": "5 categorieen voorgesteld.",
+            "proposal_count": 5,
+        }
+
+
+def _result(index: int, *codes: str, warnings: tuple[str, ...] = ()) -> dict:
+    return {
+        "question_index": index,
+        "question_id": str(index + 1),
+        "is_valid": not codes,
+        "errors": [{"field": "x", "code": c, "message": c} for c in codes],
+        "warnings": [{"field": "x", "code": c, "message": c} for c in warnings],
+    }
+
+
+class TestRuleRepair:
+    """Tests for the deterministic repairs made before the LLM."""
+
+    def test_renumbers_repeated_ids_after_first_use(self):
+        questions = _questions(4)
+        questions[2]["question_id"] = "1"
+        questions[3]["question_id"] = "1"
+        validation = {
+            "results": [
+                _result(0, "duplicate_id"),
+                _result(1),
+                _result(2, "duplicate_id"),
+                _result(3, "duplicate_id"),
+            ]
+        }
+
+        plan, remainder = repair_with_rules(questions, validation)
+
+        assert [(p.question_index, p.field, p.proposed_value) for p in plan.proposals] == [
+            (2, "question_id", "3"),
+            (3, "question_id", "4"),
+        ]
+        assert remainder["results"] == []
+
+    def test_suffixes_non_numeric_ids(self):
+        questions = _questions(2, question_id="H1-a")
+
+        plan, _ = repair_with_rules(
+            questions, {"results": [_result(0, "duplicate_id"), _result(1, "duplicate_id")]}
+        )
+
+        assert [p.proposed_value for p in plan.proposals] == ["H1-a-2"]
+
+    def test_resolves_multiple_correct_by_asterisk(self):
+        questions = _questions(2)
+        for q in questions:
+            q["options"] = [
+                {"text": "Omzet", "position": 0, "is_correct": True, "marked_with": "bold"},
+                {"text": "Kosten", "position": 1, "is_correct": True, "marked_with": "asterisk"},
+            ]
+        questions[1]["options"][1]["marked_with"] = "bold"
+        validation = {
+            "results": [_result(0, "multiple_correct"), _result(1, "multiple_correct")]
+        }
+
+        plan, remainder = repair_with_rules(questions, validation)
+
+        (proposal,) = plan.proposals
+        assert (proposal.question_index, proposal.field) == (0, "correct_option")
+        assert (proposal.current_value, proposal.proposed_value) == ("A, B", "B")
+        # Two bold options are ambiguous: left to the LLM
+        assert [r["question_index"] for r in remainder["results"]] == [1]
+
+    def test_infers_category_from_agreeing_neighbours(self):
+        questions = _questions(6)
+        for i, category in enumerate(["Kosten", None, "Kosten", None, "Omzet", None]):
+            questions[i]["category"] = category
+        validation = {
+            "results": [
+                _result(i, warnings=("empty_category",)) for i in (1, 3, 5)
+            ]
+        }
+
+        plan, _ = repair_with_rules(questions, validation)
+
+        # Question 3 sits between Kosten and Omzet
+        assert [(p.question_index, p.proposed_value) for p in plan.proposals] == [
+            (1, "Kosten"),
+            (5, "Omzet"),
+        ]
+
+    def test_forwards_only_unfixed_errors(self):
+        questions = _questions(2)
+        validation = {
+            "results": [_result(0, "duplicate_id", "empty_stem"), _result(1, "duplicate_id")]
+        }
+
+        _, remainder = repair_with_rules(questions, validation)
+
+        (forwarded,) = remainder["results"]
+        assert forwarded["question_index"] == 0
+        assert [e["code"] for e in forwarded["errors"]] == ["empty_stem"]
+
+    def test_merge_prefers_rule_proposals(self):
+        rules = RepairPlan(
+            proposals=[
+                RepairProposal(question_index=2, field="category", proposed_value="Kosten", explanation="r")
+            ],
+            summary="1 reparatie automatisch bepaald.",
+        )
+        llm = RepairPlan(
+            proposals=[
+                RepairProposal(question_index=2, field="category", proposed_value="Omzet", explanation="l"),
+                RepairProposal(question_index=0, field="stem", proposed_value="Wat?", explanation="l"),
+            ],
+            summary="Stam hersteld.",
+        )
+
+        plan = merge_plans(rules, llm)
+
+        assert [(p.question_index, p.proposed_value) for p in plan.proposals] == [
+            (0, "Wat?"),
+            (2, "Kosten"),
+        ]
+        assert plan.summary == "1 reparatie automatisch bepaald. Stam hersteld."
+
+    def test_endpoint_skips_llm_when_rules_fix_everything(self):
+        client = _proposing_client()
+        questions = _questions(2, question_id="7")
+
+        with patch("main.LLMClient", return_value=client):
+            response = TestClient(app).post(
+                "/repair",
+                json={
+                    "questions": questions,
+                    "validation": {
+                        "results": [_result(0, "duplicate_id"), _result(1, "duplicate_id")]
+                    },
+                },
+            )
+
+        assert response.status_code == 200
+        client.repair_questions.assert_not_called()
+        assert [p["proposed_value"] for p in response.json()["proposals"]] == ["8"]
@@ -0,0 +1,118 @@
+"""Trace context propagation and span export (observability/tracing.py)."""
+
+import asyncio
+import json
+from unittest.mock import MagicMock
+
+import pytest
+from fastapi.testclient import TestClient
+from opentelemetry import trace
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import (
+    InMemorySpanExporter,
+)
+
+from llm.client import LLMClient
+from main import app
+from observability.metrics import stage
+from observability.tracing import (
+    OTLPFileSpanExporter,
+    extract_context,
+    traced_job,
+    tracer_provider,
+)
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+PARENT_ID = "00f067aa0ba902b7"
+TRACEPARENT = f"00-{TRACE_ID}-{PARENT_ID}-01"
+
+_exporter = InMemorySpanExporter()
+tracer_provider().add_span_processor(SimpleSpanProcessor(_exporter))
+
+
+@pytest.fixture
+def spans():
+    _exporter.clear()
+    yield _exporter.get_finished_spans
+    _exporter.clear()
+
+
+class TestTraceContext:
+    def test_request_continues_incoming_trace(self, spans):
+        response = TestClient(app).get("/health", headers={"traceparent": TRACEPARENT})
+
+        assert response.status_code == 200
+        (server,) = [s for s in spans() if s.kind == trace.SpanKind.SERVER]
+        assert server.name == "GET /health"
+        assert format(server.context.trace_id, "032x") == TRACE_ID
+        assert format(server.parent.span_id, "016x") == PARENT_ID
+        assert server.attributes["http.response.status_code"] == 200
+
+    def test_background_job_stays_in_callers_trace(self, spans):
+        loops = []
+
+        async def pipeline():
+            loops.append(asyncio.get_running_loop())
+            with stage("validation", "deterministic"):
+                pass
+
+        async def request():
+            ctx = extract_context({"traceparent": TRACEPARENT})
+            with trace.get_tracer(__name__).start_as_current_span("request", context=ctx):
+                job = traced_job("validation.run", pipeline(), {"exam.id": "exam-1"})
+            await job()
+            return asyncio.get_running_loop()
+
+        # The job runs on the caller's event loop, not a loop of its own
+        assert loops == [asyncio.run(request())]
+        by_name = {s.name: s for s in spans()}
+        run = by_name["validation.run"]
+        child = by_name["validation.deterministic"]
+        assert run.attributes["exam.id"] == "exam-1"
+        assert child.parent.span_id == run.context.span_id
+        assert {s.context.trace_id for s in spans()} == {int(TRACE_ID, 16)}
+
+    def test_llm_call_span_has_usage_attributes(self, spans):
+        block = MagicMock(type="tool_use", input={"proposals": [], "summary": "ok"})
+        block.name = "repair_plan"
+        manager = MagicMock()
+        stream = manager.__enter__.return_value
+        stream.__iter__.side_effect = lambda: iter([])
+        response = stream.get_final_message.return_value
+        response.stop_reason = "tool_use"
+        response.content = [block]
+        response.usage.input_tokens = 640
+        response.usage.output_tokens = 80
+        client = LLMClient(api_key="test")
+        client.client = MagicMock()
+        client.client.messages.stream.return_value = manager
+
+        client.repair_questions([], {"results": []}, model="span-model")
+
+        by_name = {s.name: s for s in spans()}
+        call = by_name["repair.llm_call"]
+        assert call.attributes["gen_ai.request.model"] == "span-model"
+        assert call.attributes["gen_ai.usage.input_tokens"] == 640
+        assert call.attributes["gen_ai.response.finish_reasons"] == ("tool_use",)
+        assert call.parent.span_id == by_name["llm.repair_questions"].context.span_id
+
+
+class TestOTLPFileExporter:
+    def test_writes_otlp_json_lines_with_hex_ids(self, tmp_path):
+        path = tmp_path / "traces.jsonl"
+        provider = TracerProvider()
+        provider.add_span_processor(SimpleSpanProcessor(OTLPFileSpanExporter(str(path))))
+        tracer = provider.get_tracer(__name__)
+
+        with tracer.start_as_current_span("outer") as outer:
+            with tracer.start_as_current_span("inner"):
+                pass
+
+        lines = path.read_text().splitlines()
+        assert len(lines) == 2
+        inner = json.loads(lines[0])["resourceSpans"][0]["scopeSpans"][0]["spans"][0]
+        assert inner["name"] == "inner"
+        assert inner["traceId"] == format(outer.get_span_context().trace_id, "032x")
+        assert inner["parentSpanId"] == format(outer.get_span_context().span_id, "016x")
+        assert inner["kind"] == 1
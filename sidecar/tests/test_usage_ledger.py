@@ -0,0 +1,206 @@
+"""LLM usage ledger (services/usage_ledger.py)."""
+
+import asyncio
+from unittest.mock import MagicMock, patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from main import app
+from services.usage_ledger import (
+    UsageLedger,
+    estimate_cost,
+    ledger,
+    tag_usage,
+    usage_scope,
+    usage_summary,
+    usage_tagged,
+)
+from tests.test_llm_client import _client, _stream
+
+
+@pytest.fixture
+def supabase():
+    """Supabase mock receiving ledger inserts; the shared buffer starts empty."""
+    with patch("services.usage_ledger.settings.supabase_url", ""):
+        ledger.flush()
+    client = MagicMock()
+    with (
+        patch("services.usage_ledger.settings.supabase_url", "http://supabase"),
+        patch("services.usage_ledger.get_supabase_client", return_value=client),
+    ):
+        yield client
+
+
+def _inserted(supabase) -> list[dict]:
+    return [
+        row
+        for call in supabase.table.return_value.insert.call_args_list
+        for row in call.args[0]
+    ]
+
+
+def _response(**usage):
+    response = MagicMock(stop_reason="tool_use")
+    response.usage = MagicMock(**usage)
+    return response
+
+
+class TestEstimateCost:
+    def test_prices_cache_reads_and_writes(self):
+        cost = estimate_cost(
+            "claude-haiku-4-5-20251001",
+            {
+                "input_tokens": 1_000_000,
+                "output_tokens": 100_000,
+                "cache_read_input_tokens": 1_000_000,
+                "cache_creation_input_tokens": 1_000_000,
+            },
+        )
+        # 1.00 input + 0.50 output + 0.10 cache read + 1.25 cache write
+        assert cost == pytest.approx(2.85)
+
+    def test_unknown_model_has_no_cost(self):
+        assert estimate_cost("local-model", {"input_tokens": 10}) is None
+
+
+class TestUsageLedger:
+    def test_scope_tags_rows_and_flushes_on_exit(self, supabase):
+        with usage_scope(exam_id="exam-1"):
+            tag_usage(job_id="job-1")
+            ledger.record("validation", "m", _response(input_tokens=10, output_tokens=5), 0.25)
+            assert _inserted(supabase) == []
+
+        (row,) = _inserted(supabase)
+        assert supabase.table.call_args.args == ("llm_usage",)
+        assert row["exam_id"] == "exam-1"
+        assert row["job_id"] == "job-1"
+        assert row["input_tokens"] == 10
+        assert row["latency_ms"] == 250
+
+    def test_tags_reach_worker_threads(self, supabase):
+        async def job():
+            await asyncio.to_thread(ledger.record, "generation", "m", _response(), 0.1)
+
+        asyncio.run(usage_tagged(job(), job_id="job-2"))
+
+        assert [r["job_id"] for r in _inserted(supabase)] == ["job-2"]
+
+    def test_flush_on_the_event_loop_writes_from_a_thread(self, supabase):
+        import threading
+
+        writers = []
+        supabase.table.return_value.insert.return_value.execute.side_effect = (
+            lambda: writers.append(threading.current_thread())
+        )
+
+        async def handler():
+            with usage_scope(exam_id="exam-1"):
+                ledger.record("repair", "m", _response(), 0.1)
+            assert writers == []  # Handed off, not written in place
+            await ledger.aflush()
+            return threading.current_thread()
+
+        loop_thread = asyncio.run(handler())
+
+        assert len(writers) == 1
+        assert writers[0] is not loop_thread
+        assert len(_inserted(supabase)) == 1
+
+    def test_aflush_waits_for_writes_started_on_another_loop(self, supabase):
+        import threading
+
+        flushed = threading.Event()
+        release = threading.Event()
+        written = threading.Event()
+
+        def insert():
+            release.wait(5)
+            written.set()
+
+        supabase.table.return_value.insert.return_value.execute.side_effect = insert
+
+        async def request():
+            # The main loop hands off a write and stays up while it runs
+            with usage_scope(exam_id="exam-1"):
+                ledger.record("repair", "m", _response(), 0.1)
+            flushed.set()
+            await asyncio.to_thread(written.wait, 5)
+
+        async def job():
+            asyncio.get_running_loop().call_later(0.05, release.set)
+            await ledger.aflush()
+            return written.is_set()
+
+        main_loop = threading.Thread(target=asyncio.run, args=(request(),))
+        main_loop.start()
+        flushed.wait(5)
+        try:
+            assert asyncio.run(job())
+        finally:
+            release.set()
+            main_loop.join(5)
+
+    def test_flushes_when_buffer_is_full(self, supabase):
+        small = UsageLedger(flush_rows=2)
+        small.record("repair", "m", _response(), 0.1)
+        small.record("repair", "m", _response(), 0.1)
+
+        assert supabase.table.return_value.insert.call_count == 1
+        assert len(_inserted(supabase)) == 2
+
+    def test_write_failure_does_not_raise(self, supabase):
+        supabase.table.return_value.insert.return_value.execute.side_effect = RuntimeError("down")
+
+        with usage_scope(exam_id="exam-1"):
+            ledger.record("repair", "m", _response(), 0.1)
+
+    def test_client_records_every_attempt(self, supabase):
+        truncated = _stream("max_tokens")
+        truncated.__enter__.return_value.response.request.headers = {
+            "x-stainless-retry-count": "2"
+        }
+        client = _client(
+            truncated,
+            _stream("tool_use", "repair_plan", {"proposals": [], "summary": "ok"}),
+        )
+
+        with usage_scope(exam_id="exam-1"):
+            client.repair_questions([], {"results": []})
+
+        rows = _inserted(supabase)
+        assert [(r["operation"], r["stop_reason"]) for r in rows] == [
+            ("repair", "max_tokens"),
+            ("repair", "tool_use"),
+        ]
+        assert [r["retries"] for r in rows] == [0, 1]
+        assert [r["http_retries"] for r in rows] == [2, 0]
+        assert {r["exam_id"] for r in rows} == {"exam-1"}
+
+
+class TestUsageSummary:
+    def test_aggregates_daily_rows(self):
+        rows = [
+            {"day": "2026-10-18", "exam_id": "e1", "model": "haiku", "calls": 3,
+             "input_tokens": 300, "output_tokens": 30, "cost_usd": 0.01},
+            {"day": "2026-10-19", "exam_id": "e1", "model": "sonnet", "calls": 1,
+             "input_tokens": 100, "output_tokens": 50, "cost_usd": 0.02},
+            {"day": "2026-10-19", "exam_id": "e2", "model": "haiku", "calls": 2,
+             "input_tokens": 200, "output_tokens": 20, "cost_usd": 0.01},
+        ]
+        supabase = MagicMock()
+        supabase.table.return_value.select.return_value.gte.return_value.order.return_value.execute.return_value.data = rows
+
+        summary = usage_summary(supabase, days=7)
+
+        assert summary["totals"]["calls"] == 6
+        assert summary["totals"]["input_tokens"] == 600
+        by_day = {d["day"]: d["calls"] for d in summary["by_day"]}
+        assert by_day == {"2026-10-18": 3, "2026-10-19": 3}
+        by_exam = {e["exam_id"]: e["cost_usd"] for e in summary["by_exam"]}
+        assert by_exam == {"e1": pytest.approx(0.03), "e2": pytest.approx(0.01)}
+
+    def test_endpoint_rejects_invalid_days(self):
+        response = TestClient(app).get("/usage", params={"days": 0})
+
+        assert response.status_code == 400
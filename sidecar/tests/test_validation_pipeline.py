@@ -1,7 +1,7 @@
 """T6.5: Validation pipeline test with mocked Supabase and LLM clients."""
 
 import asyncio
-from unittest.mock import MagicMock, patch, call
+from unittest.mock import ANY, MagicMock, patch, call
 
 import pytest
 
@@ -124,3 +124,193 @@ class TestValidationPipeline:
         update_calls = mock_supabase.table.return_value.update.call_args_list
         statuses = [c[0][0] for c in update_calls]
         assert {"analysis_status": "failed"} in statuses
+
+    def test_failing_question_does_not_stop_others(self):
+        """One failed LLM call still lets the other assessments be written."""
+        questions = [_make_question_row(i) for i in range(3)]
+
+        mock_supabase = MagicMock()
+        mock_select = MagicMock()
+        mock_select.execute.return_value = MagicMock(data=questions)
+        mock_supabase.table.return_value.select.return_value.eq = MagicMock(
+            return_value=mock_select
+        )
+
+        def validate(question, det):
+            if question["stam"] == "Vraag 1?":
+                raise Exception("LLM error")
+            return _make_validation_result()
+
+        mock_llm = MagicMock()
+        mock_llm.validate_question.side_effect = validate
+
+        with pytest.raises(Exception, match="LLM error"):
+            asyncio.run(run_validation("exam-1", mock_supabase, mock_llm))
+
+        assert mock_supabase.table.return_value.upsert.call_count == 2
+        statuses = [
+            c[0][0] for c in mock_supabase.table.return_value.update.call_args_list
+        ]
+        assert {"analysis_status": "failed"} in statuses
+
+
+def _tables() -> tuple[MagicMock, dict[str, MagicMock]]:
+    """Supabase mock with a separate MagicMock per table."""
+    tables: dict[str, MagicMock] = {}
+    mock_supabase = MagicMock()
+    mock_supabase.table.side_effect = lambda name: tables.setdefault(name, MagicMock())
+    return mock_supabase, tables
+
+
+def _item_updates(tables: dict[str, MagicMock]) -> list[dict]:
+    return [c.args[0] for c in tables["validation_run_items"].update.call_args_list]
+
+
+class TestValidationRuns:
+    def test_run_records_per_question_state(self):
+        from services.validation_pipeline import RetryPolicy
+
+        questions = [_make_question_row(i) for i in range(3)]
+        mock_supabase, tables = _tables()
+        tables["questions"] = MagicMock()
+        tables["questions"].select.return_value.eq.return_value.execute.return_value = (
+            MagicMock(data=questions)
+        )
+        tables["validation_runs"] = MagicMock()
+        tables["validation_runs"].insert.return_value.execute.return_value = MagicMock(
+            data=[{"id": "run-1"}]
+        )
+
+        def validate(question, det):
+            if question["stam"] == "Vraag 2?":
+                raise ValueError("Ongeldig antwoord")
+            return _make_validation_result()
+
+        mock_llm = MagicMock()
+        mock_llm.validate_question.side_effect = validate
+
+        with pytest.raises(ValueError):
+            asyncio.run(
+                run_validation(
+                    "exam-1", mock_supabase, mock_llm, RetryPolicy(backoff_seconds=0)
+                )
+            )
+
+        items = tables["validation_run_items"].insert.call_args.args[0]
+        assert [i["status"] for i in items] == ["pending"] * 3
+        assert sorted(u["status"] for u in _item_updates(tables)) == ["done", "done", "failed"]
+        failed = next(u for u in _item_updates(tables) if u["status"] == "failed")
+        assert failed["last_error"] == "Ongeldig antwoord"
+        # Non-transient errors are not retried
+        assert mock_llm.validate_question.call_count == 3
+        run_update = tables["validation_runs"].update.call_args.args[0]
+        assert run_update["status"] == "failed"
+
+    def test_deterministic_only_run_is_marked_degraded(self):
+        mock_supabase, tables = _tables()
+        tables["questions"] = MagicMock()
+        tables["questions"].select.return_value.eq.return_value.execute.return_value = (
+            MagicMock(data=[_make_question_row(0)])
+        )
+        tables["validation_runs"] = MagicMock()
+        tables["validation_runs"].insert.return_value.execute.return_value = MagicMock(
+            data=[{"id": "run-1"}]
+        )
+        mock_llm = MagicMock()
+
+        asyncio.run(
+            run_validation("exam-1", mock_supabase, mock_llm, deterministic_only=True)
+        )
+
+        mock_llm.validate_question.assert_not_called()
+        run = tables["validation_runs"].insert.call_args.args[0]
+        assert run["degraded"] is True
+        assert tables["validation_runs"].update.call_args.args[0]["status"] == "completed"
+
+    def test_transient_errors_are_retried(self):
+        import anthropic
+
+        from services.validation_pipeline import RetryPolicy
+
+        mock_supabase, tables = _tables()
+        tables["questions"] = MagicMock()
+        tables["questions"].select.return_value.eq.return_value.execute.return_value = (
+            MagicMock(data=[_make_question_row(0)])
+        )
+
+        mock_llm = MagicMock()
+        mock_llm.validate_question.side_effect = [
+            anthropic.APIConnectionError(request=MagicMock()),
+            _make_validation_result(),
+        ]
+
+        asyncio.run(
+            run_validation("exam-1", mock_supabase, mock_llm, RetryPolicy(backoff_seconds=0))
+        )
+
+        assert mock_llm.validate_question.call_count == 2
+        assert _item_updates(tables) == [
+            {"status": "done", "attempts": 2, "last_error": None, "updated_at": ANY}
+        ]
+
+    def test_resume_only_processes_unfinished_questions(self):
+        from services.validation_pipeline import resume_validation
+
+        mock_supabase, tables = _tables()
+        tables["validation_runs"] = MagicMock()
+        tables["validation_runs"].select.return_value.eq.return_value.neq.return_value.order.return_value.limit.return_value.execute.return_value = MagicMock(
+            data=[{"id": "run-1"}]
+        )
+        tables["validation_run_items"] = MagicMock()
+        tables["validation_run_items"].select.return_value.eq.return_value.execute.return_value = MagicMock(
+            data=[
+                {"question_id": "q-0", "status": "done", "attempts": 1},
+                {"question_id": "q-1", "status": "failed", "attempts": 3},
+                {"question_id": "q-2", "status": "pending", "attempts": 0},
+            ]
+        )
+        tables["questions"] = MagicMock()
+        tables["questions"].select.return_value.in_.return_value.execute.return_value = MagicMock(
+            data=[_make_question_row(1), _make_question_row(2)]
+        )
+
+        mock_llm = MagicMock()
+        mock_llm.validate_question.return_value = _make_validation_result()
+
+        asyncio.run(resume_validation("exam-1", mock_supabase, mock_llm))
+
+        tables["questions"].select.return_value.in_.assert_called_once_with("id", ["q-1", "q-2"])
+        assert mock_llm.validate_question.call_count == 2
+        assert sorted(u["attempts"] for u in _item_updates(tables)) == [1, 4]
+
+        exam_updates = [c.args[0] for c in tables["exams"].update.call_args_list]
+        assert exam_updates[0] == {
+            "analysis_status": "processing",
+            "question_count": 3,
+            "questions_analyzed": 1,
+        }
+        assert exam_updates[-1] == {"analysis_status": "completed", "questions_analyzed": 3}
+
+    def test_deterministic_only_skips_llm(self):
+        questions = [_make_question_row(i) for i in range(2)]
+        mock_supabase, tables = _tables()
+        tables["questions"] = MagicMock()
+        tables["questions"].select.return_value.eq.return_value.execute.return_value = (
+            MagicMock(data=questions)
+        )
+        tables["validation_runs"] = MagicMock()
+        tables["validation_runs"].insert.return_value.execute.return_value = MagicMock(
+            data=[{"id": "run-1"}]
+        )
+        mock_llm = MagicMock()
+
+        asyncio.run(
+            run_validation("exam-1", mock_supabase, mock_llm, deterministic_only=True)
+        )
+
+        mock_llm.validate_question.assert_not_called()
+        assessments = [c.args[0] for c in tables["assessments"].upsert.call_args_list]
+        assert len(assessments) == 2
+        assert all("tech_kwant_flags" in a for a in assessments)
+        assert not any("bet_score" in a for a in assessments)
+        assert [u["status"] for u in _item_updates(tables)] == ["done", "done"]
@@ -104,6 +104,7 @@ export interface GenerationJob {
   status: AnalysisStatus
   result_question_ids: string[]
   error_message: string | null
+  warning: string | null
   created_at: string
   completed_at: string | null
 }
@@ -7,6 +7,7 @@ interface ParsedOption {
   text: string
   position: number
   is_correct: boolean
+  marked_with?: string | null
 }
 
 interface ParsedQuestion {
@@ -192,7 +193,7 @@ export default function ExamParsing() {
       const response = await fetch(`${SIDECAR_URL}/validate`, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ questions: qs }),
+        body: JSON.stringify({ questions: qs, exam_id: examId }),
       })
 
       if (!response.ok) {
@@ -223,6 +224,7 @@ export default function ExamParsing() {
         body: JSON.stringify({
           questions,
           validation: validationResult,
+          exam_id: examId,
         }),
       })
 
@@ -260,6 +262,8 @@ export default function ExamParsing() {
 
         if (proposal.field === 'stem') {
           q.stem = proposal.proposed_value
+        } else if (proposal.field === 'question_id') {
+          q.question_id = proposal.proposed_value
         } else if (proposal.field === 'category') {
           q.category = proposal.proposed_value
         } else if (proposal.field === 'bloom_level') {
@@ -309,7 +313,11 @@ export default function ExamParsing() {
       const questionRows = qs.map((q, i) => ({
         exam_id: examId,
         stem: q.stem,
-        options: q.options,
+        options: q.options.map(({ text, position, is_correct }) => ({
+          text,
+          position,
+          is_correct,
+        })),
         correct_option: q.options.findIndex((o) => o.is_correct),
         position: i,
         version: 1,
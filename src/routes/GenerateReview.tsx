@@ -124,6 +124,12 @@ export default function GenerateReview() {
     <div className="max-w-3xl mx-auto">
       <h1 className="text-2xl font-bold mb-6">Gegenereerde vragen beoordelen</h1>
 
+      {job?.warning && (
+        <div className="mb-4 p-3 rounded-lg border bg-amber-50 border-amber-200 text-amber-800 text-sm">
+          {job.warning}
+        </div>
+      )}
+
       {loading ? (
         <p className="text-gray-500">Vragen laden...</p>
       ) : questions.length === 0 ? (
@@ -0,0 +1,15 @@
+const TRACEPARENT_PATTERN = /^00-[0-9a-f]{32}-[0-9a-f]{16}-[0-9a-f]{2}$/;
+
+// W3C trace context for the sidecar call: continue the caller's trace, or
+// start a new one so the sidecar's spans for this request share a trace id.
+export function traceparent(req: Request): string {
+  const incoming = req.headers.get("traceparent");
+  if (incoming && TRACEPARENT_PATTERN.test(incoming)) {
+    return incoming;
+  }
+  const hex = (bytes: number) =>
+    Array.from(crypto.getRandomValues(new Uint8Array(bytes)), (b) =>
+      b.toString(16).padStart(2, "0")
+    ).join("");
+  return `00-${hex(16)}-${hex(8)}-01`;
+}
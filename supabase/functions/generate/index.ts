@@ -1,11 +1,12 @@
 import "@supabase/functions-js/edge-runtime.d.ts";
 import { createClient } from "@supabase/supabase-js";
+import { traceparent } from "../_shared/tracing.ts";
 
 const SIDECAR_URL = Deno.env.get("SIDECAR_URL") ?? "http://localhost:8000";
 
 const corsHeaders = {
   "Access-Control-Allow-Origin": "*",
-  "Access-Control-Allow-Headers": "authorization, x-client-info, apikey, content-type",
+  "Access-Control-Allow-Headers": "authorization, x-client-info, apikey, content-type, traceparent, tracestate",
 };
 
 interface Specification {
@@ -174,7 +175,10 @@ Deno.serve(async (req) => {
   try {
     fetch(`${SIDECAR_URL}/generate`, {
       method: "POST",
-      headers: { "Content-Type": "application/json" },
+      headers: {
+        "Content-Type": "application/json",
+        traceparent: traceparent(req),
+      },
       body: JSON.stringify({ job_id: job.id }),
     });
   } catch {
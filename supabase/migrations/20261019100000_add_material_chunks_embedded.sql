@@ -0,0 +1,7 @@
+-- Resume marker for the embedding pipeline: number of chunks (by position)
+-- already embedded and stored. The sidecar advances it after every inserted
+-- batch so a re-run continues where an interrupted run stopped.
+ALTER TABLE materials ADD COLUMN chunks_embedded integer DEFAULT 0;
+
+-- Existing materials were written in a single insert and are complete
+UPDATE materials SET chunks_embedded = chunk_count WHERE chunk_count > 0;
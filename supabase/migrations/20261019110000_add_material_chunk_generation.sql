@@ -0,0 +1,4 @@
+-- Version of a material's stored chunks. The sidecar increments it whenever
+-- the embedding pipeline rewrites chunks, so cached retrieval results keyed
+-- on (material, chunk_generation) go stale automatically.
+ALTER TABLE materials ADD COLUMN chunk_generation integer NOT NULL DEFAULT 0;
@@ -0,0 +1,46 @@
+-- Validation runs with per-question state, so an interrupted run (e.g. a
+-- sidecar restart during a long exam) can be resumed without re-validating
+-- questions that already have an assessment from that run.
+create table validation_runs (
+  id uuid primary key default gen_random_uuid(),
+  exam_id uuid not null references exams(id) on delete cascade,
+  status text not null default 'running'
+    check (status in ('running', 'completed', 'failed')),
+  created_at timestamptz default now(),
+  updated_at timestamptz default now(),
+  completed_at timestamptz
+);
+
+create index idx_validation_runs_exam_id on validation_runs(exam_id);
+
+create table validation_run_items (
+  run_id uuid not null references validation_runs(id) on delete cascade,
+  question_id uuid not null references questions(id) on delete cascade,
+  question_version int not null,
+  status text not null default 'pending'
+    check (status in ('pending', 'done', 'failed')),
+  attempts int not null default 0,
+  last_error text,
+  updated_at timestamptz default now(),
+  primary key (run_id, question_id)
+);
+
+alter table validation_runs enable row level security;
+alter table validation_run_items enable row level security;
+
+-- Runs are written by the sidecar (service role); owners can follow them
+create policy "Users can view validation runs of own exams"
+  on validation_runs for select
+  to authenticated
+  using (exists (
+    select 1 from exams where exams.id = validation_runs.exam_id and exams.created_by = auth.uid()
+  ));
+
+create policy "Users can view validation run items of own exams"
+  on validation_run_items for select
+  to authenticated
+  using (exists (
+    select 1 from validation_runs r
+    join exams e on e.id = r.exam_id
+    where r.id = validation_run_items.run_id and e.created_by = auth.uid()
+  ));
@@ -0,0 +1,57 @@
+-- Ledger of LLM usage written by the sidecar: one row per Messages API call,
+-- tagged with the exam and generation job it was made for. Aggregated per
+-- day, exam, user and model in llm_usage_daily for budgets and quotas.
+create table llm_usage (
+  id uuid primary key default gen_random_uuid(),
+  created_at timestamptz not null default now(),
+  exam_id uuid references exams(id) on delete set null,
+  job_id uuid references generation_jobs(id) on delete set null,
+  operation text not null,
+  model text not null,
+  input_tokens int not null default 0,
+  output_tokens int not null default 0,
+  cache_read_input_tokens int not null default 0,
+  cache_creation_input_tokens int not null default 0,
+  latency_ms int not null,
+  -- Re-requests by the sidecar (truncation, malformed output) and by the
+  -- Anthropic SDK (429/5xx) before this response
+  retries int not null default 0,
+  http_retries int not null default 0,
+  stop_reason text,
+  -- Estimate from the sidecar's price table; null for unknown models
+  cost_usd numeric(12, 6)
+);
+
+create index idx_llm_usage_created_at on llm_usage(created_at);
+create index idx_llm_usage_exam_id on llm_usage(exam_id);
+
+create view llm_usage_daily
+with (security_invoker = true) as
+select
+  (u.created_at at time zone 'utc')::date as day,
+  u.exam_id,
+  coalesce(e.created_by, j.created_by) as user_id,
+  u.model,
+  count(*) as calls,
+  sum(u.input_tokens) as input_tokens,
+  sum(u.output_tokens) as output_tokens,
+  sum(u.cache_read_input_tokens) as cache_read_input_tokens,
+  sum(u.cache_creation_input_tokens) as cache_creation_input_tokens,
+  sum(u.retries) as retries,
+  sum(u.http_retries) as http_retries,
+  coalesce(sum(u.cost_usd), 0) as cost_usd,
+  round(avg(u.latency_ms)) as avg_latency_ms
+from llm_usage u
+left join exams e on e.id = u.exam_id
+left join generation_jobs j on j.id = u.job_id
+group by 1, 2, 3, 4;
+
+alter table llm_usage enable row level security;
+
+-- Usage is written by the sidecar (service role); owners can see their own
+create policy "Users can view LLM usage of own exams"
+  on llm_usage for select
+  to authenticated
+  using (exists (
+    select 1 from exams where exams.id = llm_usage.exam_id and exams.created_by = auth.uid()
+  ));
@@ -0,0 +1,4 @@
+-- A completed generation job can have fewer questions than requested (failed
+-- shards, truncated responses, questions that repeat the bank); the sidecar
+-- explains the shortfall here instead of failing the job.
+ALTER TABLE generation_jobs ADD COLUMN warning text;
@@ -0,0 +1,3 @@
+-- A run admitted over budget validates with the deterministic layer only;
+-- its assessments have no LLM fields, so the run records that it was degraded.
+ALTER TABLE validation_runs ADD COLUMN degraded boolean NOT NULL DEFAULT false;
@@ -0,0 +1,4 @@
+-- The chunks_embedded resume marker is a chunk position, which only lines
+-- up with chunks cut by the same chunker. The sidecar records its chunker
+-- version next to the marker and re-embeds from the start on a mismatch.
+ALTER TABLE materials ADD COLUMN chunker_version integer;